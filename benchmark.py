@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+马赛克性能基准工具
+
+用途：
+    在随机图片上测量 apply_mosaic（左上角像素、块平均色）与 apply_blur 在不同块大小下的耗时，
+    用于确认模糊的开销不随半径增长，并与马赛克对比。
+
+使用方法：
+    python benchmark.py
+    python benchmark.py --width 4000 --height 4000 --block-sizes 5 15 50 100 --repeat 3
+"""
+import argparse
+import random
+import time
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QRect
+from src.features.image_mosaic import apply_mosaic, apply_blur, MODE_SAMPLE, MODE_MEAN, get_default_engine
+
+
+def create_random_image(width, height):
+    """生成随机像素的 RGB32 图片（已安装 NumPy 时批量生成，否则逐行生成）"""
+    image = QImage(width, height, QImage.Format_RGB32)
+    try:
+        import numpy as np
+        pixels = np.frombuffer(image.bits(), dtype=np.uint32).reshape(height, image.bytesPerLine() // 4)
+        pixels[:, :width] = np.random.randint(0, 2 ** 24, size=(height, width), dtype=np.uint32) | 0xFF000000
+    except ImportError:
+        for y in range(height):
+            for x in range(width):
+                image.setPixel(x, y, 0xFF000000 | random.getrandbits(24))
+    return image
+
+
+def measure(function, repeat):
+    """执行 repeat 次，返回最短耗时（秒）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark(width, height, block_sizes, intensity, repeat):
+    """按块大小逐行输出各处理方式的耗时"""
+    image = create_random_image(width, height)
+    rect = QRect(0, 0, width, height)
+    print(f"=== {width} × {height}，引擎: {get_default_engine()}，强度: {intensity} ===")
+    print(f"{'块大小':>6} {'左上角像素':>10} {'块平均色':>10} {'模糊':>10} {'模糊/块平均':>10}")
+    for block_size in block_sizes:
+        sample = measure(lambda: apply_mosaic(image, rect, block_size, intensity, mode=MODE_SAMPLE), repeat)
+        mean = measure(lambda: apply_mosaic(image, rect, block_size, intensity, mode=MODE_MEAN), repeat)
+        blur = measure(lambda: apply_blur(image, rect, block_size, intensity), repeat)
+        print(f"{block_size:>6} {sample:>9.3f}s {mean:>9.3f}s {blur:>9.3f}s {blur / mean:>10.1f}")
+
+
+def main():
+    """解析命令行参数并运行基准"""
+    parser = argparse.ArgumentParser(description="马赛克与模糊性能基准")
+    parser.add_argument("--width", type=int, default=4000, help="图片宽度")
+    parser.add_argument("--height", type=int, default=4000, help="图片高度")
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[5, 15, 50, 100], help="块大小（模糊强度）列表")
+    parser.add_argument("--intensity", type=float, default=1.0, help="强度 (0.0-1.0)")
+    parser.add_argument("--repeat", type=int, default=1, help="每项重复次数（取最短耗时）")
+    args = parser.parse_args()
+    run_benchmark(args.width, args.height, args.block_sizes, args.intensity, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
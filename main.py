@@ -14,6 +14,7 @@ import os
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import QCoreApplication
 from src.gui.main_window import MainWindow
+from src.features.image_loader import apply_allocation_limit
 from src.constants.config import APP_NAME, ORGANIZATION_NAME, APP_VERSION, DEFAULT_LANGUAGE, LANGUAGE_CONFIG_FILE
 from src.localization import set_language, tr
 
@@ -51,6 +52,9 @@ def main():
     """
     app = QApplication(sys.argv)
     
+    # 放宽 Qt 默认 256 MB 的图片解码内存上限
+    apply_allocation_limit()
+    
     # 初始化本地化系统
     saved_language = load_language_config()
     set_language(saved_language)
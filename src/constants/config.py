@@ -13,6 +13,12 @@ DEFAULT_MOSAIC_BLOCK_SIZE = 15
 # 块大小可调范围
 MIN_MOSAIC_BLOCK_SIZE = 2
 MAX_MOSAIC_BLOCK_SIZE = 100 
+# 马赛克并行处理：工作线程数（0 表示按 CPU 核心数自动选择）与启用并行的最小像素数
+MOSAIC_WORKER_COUNT = 0
+MOSAIC_PARALLEL_MIN_PIXELS = 1024 * 1024
+MOSAIC_PROGRESS_STEPS = 20  # 后台处理时的进度报告次数（同时也是可取消的粒度）
+MOSAIC_BLUR_PASSES = 3  # 模糊核的盒式模糊次数（3 次即可较好地近似高斯模糊）
+MOSAIC_BLUR_CHUNK_ROWS = 256  # 模糊水平方向分块处理的行数（限制临时数组内存、保持缓存局部性）
 
 # 应用元数据
 APP_NAME = "Rectangular Mosaic"
@@ -39,6 +45,13 @@ SUPPORTED_LANGUAGES = [
 # 语言配置文件路径
 LANGUAGE_CONFIG_FILE = "language_config.json"
 
+# 图片加载配置
+IMAGE_LOAD_CHUNK_BYTES = 4 * 1024 * 1024  # 后台加载时每次读取的文件字节数（每块报告一次进度并检查取消）
+IMAGE_READER_ALLOCATION_LIMIT_MB = 2048  # QImageReader 单张图片的解码内存上限（MB，Qt 默认 256；0 表示不限制）
+LARGE_IMAGE_MEMORY_BUDGET = 512 * 1024 * 1024  # 超大图片的内存预算（字节）：完整解码超过该值时只解码缩小的预览图（仅 JPEG，其它格式拒绝打开），保存时按该值分条带处理
+LARGE_IMAGE_PREVIEW_MAX_BYTES = 64 * 1024 * 1024  # 预览图解码后的最大字节数
+LARGE_IMAGE_MIN_STRIPE_ROWS = 64  # 保存时每个条带的最少行数（预算容纳不下时报错，不会超出预算）
+
 # 支持的图像文件扩展名
 SUPPORTED_IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp', '.gif']
 SUPPORTED_SAVE_EXTENSIONS = ['.png', '.jpg', '.jpeg']
@@ -51,6 +64,10 @@ UI_BLOCK_SIZE_DEFAULT = 10  # 块大小默认值
 UI_INTENSITY_SPIN_RANGE = (1, 10)  # 强度微调框范围
 UI_INTENSITY_SLIDER_RANGE = (1, 10)  # 强度滑块范围
 UI_INTENSITY_DEFAULT = 5  # 强度默认值
+UI_MOSAIC_MODE_DEFAULT = "sample"  # 马赛克核默认值（sample：块左上角像素，mean：块平均色，blur：模糊，fill/noise 需要 NumPy）
+UI_LIVE_PREVIEW_DEFAULT = True  # 是否默认开启实时预览
+UI_GRID_ANCHORED_DEFAULT = False  # 马赛克块网格是否默认锚定到图片原点（否则以选区左上角为原点）
+STATUS_PROGRESS_WIDTH = 160  # 状态栏进度条最大宽度
 
 # 主窗口配置
 MAIN_WINDOW_WIDTH = 1000  # 主窗口宽度
@@ -63,9 +80,33 @@ IMAGE_VIEWER_MIN_WIDTH = 400  # 图像查看器最小宽度
 IMAGE_VIEWER_MIN_HEIGHT = 300  # 图像查看器最小高度
 IMAGE_VIEWER_BACKGROUND_COLOR = "#f0f0f0"  # 图像查看器背景色
 IMAGE_VIEWER_BORDER_STYLE = "1px solid #ccc"  # 图像查看器边框样式
+PREVIEW_INTERVAL_MS = 16  # 实时预览最短刷新间隔（毫秒），合并期间的多次变化，保证不低于 60 fps
+IMAGE_VIEWER_RESIZE_SETTLE_MS = 150  # 调整窗口大小停止多久（毫秒）后按新的窗口大小重新适应（拖动期间保持缩放比例）
+IMAGE_VIEWER_MAX_ZOOM = 32.0  # 最大缩放比例（屏幕像素 / 图片像素）
+IMAGE_VIEWER_ZOOM_STEP = 1.25  # 滚轮每格与放大/缩小命令的缩放倍数
+IMAGE_VIEWER_PREFETCH_TILES = 1  # 空闲时预先生成可见范围外几圈瓦片
+IMAGE_VIEWER_PAINT_BUDGET_MS = 8  # 一次重绘中生成瓦片的时间预算（毫秒），超出后其余瓦片先快速缩放显示
 
 # 编辑历史配置
 MAX_EDIT_HISTORY = 20  # 最大编辑历史记录数
+EDIT_HISTORY_MAX_BYTES = 512 * 1024 * 1024  # 编辑历史内存上限（字节），超出时淘汰最老的记录
+EDIT_HISTORY_RAW_STEPS = 3  # 距当前状态最近的若干步保持未压缩，撤销/重做无需解压
+EDIT_HISTORY_COMPRESS_LEVEL = 1  # 较早历史记录在后台压缩时使用的 zlib 压缩级别
+EDIT_HISTORY_RAM_BYTES = 256 * 1024 * 1024  # 差异块在内存中的占用超过该字节数时，最远的已压缩记录才转存到临时文件
+EDIT_HISTORY_MODE = "patches"  # 编辑历史模式："patches" 记录像素差异块，"operations" 记录操作并定期保存检查点
+OPERATION_HISTORY_CHECKPOINT_INTERVAL = 10  # 操作记录模式下每隔多少次操作保存一次完整检查点
+OPERATION_LOG_SUFFIX = ".mosaic.json"  # 随图片保存的操作记录文件后缀
+OPERATION_LOG_SAVE = False  # 是否随图片保存操作记录（记录了打码区域的位置，默认只在操作记录模式下保存）
+
+# 积分图缓存配置（块平均马赛克复用）
+INTEGRAL_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 积分图缓存内存上限（字节）
+INTEGRAL_CACHE_TILE_SIZE = 256  # 积分图分块边长（像素）
+BLOCK_COLOR_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 网格锚定模式块颜色缓存内存上限（字节）
+IMAGE_PYRAMID_MAX_BYTES = 128 * 1024 * 1024  # 显示用图像金字塔（逐级减半的缩小图）内存上限（字节）
+IMAGE_PYRAMID_TILE_SIZE = 256  # 图像金字塔编辑后按瓦片重建，每个瓦片覆盖的原图边长（像素）
+IMAGE_PYRAMID_MIN_TILE_SIZE = 16  # 图像金字塔各级瓦片的最小边长（级别像素）
+DISPLAY_TILE_SIZE = 256  # 显示瓦片边长（屏幕像素）
+DISPLAY_TILE_CACHE_MAX_BYTES = 96 * 1024 * 1024  # 显示瓦片缓存内存上限（字节）
 
 # 选择工具配置
 SELECTION_BORDER_COLOR = (255, 0, 0)  # 选择边框颜色 (RGB)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+块颜色缓存模块
+
+用途：
+    缓存网格锚定模式下每个网格单元的马赛克颜色（左上角像素或块平均色）。
+
+使用场景：
+    网格锚定到图片原点时，同一块大小下任意选区的块网格都相互对齐，
+    每个单元的颜色只取决于图片内容。由 ImageViewer 随当前图片持有：
+    与已处理过的选区（或预览过的选区）重叠的新选区直接复用已缓存的单元，
+    调整强度也无需重新计算；编辑后只作废与脏区域相交的单元。
+"""
+from collections import OrderedDict
+import threading
+from PySide6.QtGui import QRegion
+from PySide6.QtCore import QRect
+from src.constants.config import BLOCK_COLOR_CACHE_MAX_BYTES
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+
+class BlockColorCache:
+    """
+    网格单元颜色缓存。
+
+    按 (块大小, 取色模式) 分别保存覆盖整张图片的单元颜色表
+    （ceil(高/块大小) × ceil(宽/块大小) × 通道数）及其是否已计算的标记，
+    缓存以 (QImage.cacheKey(), 编辑代数) 标识所属图片状态，
+    超出内存上限时按最近最少使用顺序淘汰整张颜色表。
+    公开方法内部加锁，可在后台马赛克任务与界面线程之间共享。
+    """
+
+    def __init__(self, max_bytes=BLOCK_COLOR_CACHE_MAX_BYTES):
+        """
+        初始化块颜色缓存
+
+        Args:
+            max_bytes: 缓存占用内存上限（字节）
+        """
+        self.max_bytes = max_bytes
+        self.maps = OrderedDict()
+        self.image_key = None
+        self.generation = 0
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def is_available(self):
+        """检查当前环境是否支持块颜色缓存（需要 NumPy）"""
+        return np is not None
+
+    def bind(self, image, generation=0):
+        """
+        绑定新的图片状态并清空全部颜色表（加载新图片或整图替换时调用）
+        """
+        with self.lock:
+            self.clear()
+            self.image_key = image.cacheKey() if image is not None else None
+            self.generation = generation
+
+    def advance(self, image, generation, dirty_rect=None):
+        """
+        图片被编辑后推进到新的状态。
+
+        Args:
+            image: 编辑后的图片
+            generation: 新的编辑代数
+            dirty_rect: 发生变化的区域（图片坐标系，QRect 或 QRegion）；None 表示整图都可能变化
+        """
+        with self.lock:
+            if dirty_rect is None or self.image_key is None:
+                self.bind(image, generation)
+                return
+            self.invalidate(dirty_rect)
+            self.image_key = image.cacheKey()
+            self.generation = generation
+
+    def invalidate(self, rect):
+        """将与指定区域（QRect 或 QRegion）相交的单元标记为未计算"""
+        with self.lock:
+            if rect is None or rect.isEmpty():
+                return
+            region = QRegion(rect) if isinstance(rect, QRect) else rect
+            for (block_size, _mode), (_colors, known) in self.maps.items():
+                for dirty in region:
+                    known[max(dirty.top(), 0) // block_size:max(dirty.bottom(), 0) // block_size + 1,
+                          max(dirty.left(), 0) // block_size:max(dirty.right(), 0) // block_size + 1] = False
+
+    def clear(self):
+        """清空缓存（保留命中统计）"""
+        with self.lock:
+            self.maps.clear()
+            self.bytes_used = 0
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        Returns:
+            dict: hits/misses/evictions/maps/bytes/max_bytes/generation（命中与未命中按单元计数）
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "maps": len(self.maps),
+                "bytes": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "generation": self.generation,
+            }
+
+    def block_colors(self, image, block_size, mode, cells, compute):
+        """
+        获取一组网格单元的颜色，未缓存的单元由 compute 计算后存入缓存。
+
+        Args:
+            image: 与缓存绑定的图片（cacheKey 不一致时缓存会先被清空）
+            block_size: 块大小
+            mode: 取色模式
+            cells: 需要的单元范围（QRect，单位为单元，须位于图片范围内）
+            compute: 计算函数 compute(单元范围 QRect)，返回形状为 (行数, 列数, 通道数) 的颜色数组
+        Returns:
+            ndarray: 形状为 (cells.height(), cells.width(), 通道数) 的单元颜色
+        """
+        rows = slice(cells.top(), cells.bottom() + 1)
+        cols = slice(cells.left(), cells.right() + 1)
+        with self.lock:
+            if image.cacheKey() != self.image_key:
+                # 图片在缓存不知情的情况下被替换，已有颜色表全部作废
+                self.bind(image, self.generation)
+            entry = self.maps.get((block_size, mode))
+            if entry is not None:
+                self.maps.move_to_end((block_size, mode))
+                colors, known = entry
+                missing = ~known[rows, cols]
+                if not missing.any():
+                    self.hits += missing.size
+                    return colors[rows, cols].copy()
+                # 只重新计算未缓存单元的外接范围
+                missing_rows = np.flatnonzero(missing.any(axis=1))
+                missing_cols = np.flatnonzero(missing.any(axis=0))
+                self.hits += int(missing.size - missing.sum())
+                self.misses += int(missing.sum())
+                pending = QRect(cells.left() + int(missing_cols[0]), cells.top() + int(missing_rows[0]),
+                                int(missing_cols[-1] - missing_cols[0]) + 1,
+                                int(missing_rows[-1] - missing_rows[0]) + 1)
+            else:
+                self.misses += cells.width() * cells.height()
+                pending = cells
+
+        # 颜色计算不持有锁，多个条带可以并行计算；重复计算同一单元结果相同，先写入者生效即可
+        computed = compute(pending)
+        with self.lock:
+            if image.cacheKey() != self.image_key:
+                # 计算期间缓存被重新绑定，已缓存的部分不再可信，直接计算全部单元
+                return computed if pending == cells else compute(cells)
+            entry = self.maps.get((block_size, mode))
+            if entry is None:
+                entry = self._create_map(image, block_size, mode, computed.shape[2], computed.dtype)
+            colors, known = entry
+            colors[pending.top():pending.bottom() + 1, pending.left():pending.right() + 1] = computed
+            known[pending.top():pending.bottom() + 1, pending.left():pending.right() + 1] = True
+            if known[rows, cols].all():
+                return colors[rows, cols].copy()
+        # 计算期间颜色表被淘汰，只有本次计算的单元可用，补算其余单元
+        return self.block_colors(image, block_size, mode, cells, compute)
+
+    def _create_map(self, image, block_size, mode, channels, dtype):
+        """为 (块大小, 取色模式) 创建覆盖整张图片的颜色表，必要时淘汰最久未使用的颜色表"""
+        rows = (image.height() + block_size - 1) // block_size
+        cols = (image.width() + block_size - 1) // block_size
+        entry = (np.zeros((rows, cols, channels), dtype=dtype), np.zeros((rows, cols), dtype=bool))
+        self.maps[(block_size, mode)] = entry
+        self.bytes_used += entry[0].nbytes + entry[1].nbytes
+        while self.bytes_used > self.max_bytes and len(self.maps) > 1:
+            oldest = next(iter(self.maps))
+            colors, known = self.maps.pop(oldest)
+            self.bytes_used -= colors.nbytes + known.nbytes
+            self.evictions += 1
+        return entry
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+显示瓦片缓存模块
+
+用途：
+    把缩放后的图片按屏幕像素划分为固定大小的瓦片，按需由图像金字塔生成 QPixmap 并缓存。
+
+使用场景：
+    由 ImageViewer 随当前图片持有，ImageViewport 绘制时只取可见范围内的瓦片：
+    以 1:1 查看 1 亿像素的图片时，只生成窗口内的几十个瓦片，而不是整张放大后的 QPixmap。
+    瓦片按 (缩放比例, 列, 行) 缓存，超出内存上限时按最近最少使用顺序淘汰；
+    编辑后只丢弃与脏区域相交的瓦片。
+"""
+import math
+from collections import OrderedDict
+from PySide6.QtGui import QImage, QPixmap, QPainter, QRegion
+from PySide6.QtCore import Qt, QRect, QRectF, QSize, QPoint
+from src.constants.config import DISPLAY_TILE_CACHE_MAX_BYTES, DISPLAY_TILE_SIZE
+
+
+class DisplayTileCache:
+    """
+    显示瓦片缓存。
+
+    缩放 zoom 倍后图片的显示尺寸为原图尺寸 × zoom（四舍五入），显示坐标系的原点为图片左上角。
+    瓦片 (列, 行) 覆盖显示坐标 [列·T, (列+1)·T) × [行·T, (行+1)·T)，
+    由金字塔中尺寸不小于显示尺寸的最小级别缩放生成（缩小时平滑插值，放大时保持像素边界）。
+    """
+
+    def __init__(self, pyramid, max_bytes=DISPLAY_TILE_CACHE_MAX_BYTES, tile_size=DISPLAY_TILE_SIZE):
+        """
+        初始化显示瓦片缓存
+
+        Args:
+            pyramid: 当前图片的图像金字塔（ImagePyramid）
+            max_bytes: 缓存瓦片占用内存的上限（字节）
+            tile_size: 瓦片边长（屏幕像素）
+        """
+        self.pyramid = pyramid
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.image = None
+        self.generation = 0
+        self.tiles = OrderedDict()  # (缩放比例, 列, 行) -> QPixmap
+        self.bytes_used = 0
+        self.rendered = 0
+        self.evictions = 0
+
+    def bind(self, image, generation=0):
+        """绑定新的图片并清空全部瓦片（加载新图片或整图替换时调用）"""
+        self.image = image
+        self.generation = generation
+        self.tiles.clear()
+        self.bytes_used = 0
+
+    def advance(self, image, generation, dirty_rect=None):
+        """
+        图片被编辑后推进到新的状态。
+
+        Args:
+            image: 编辑后的图片
+            generation: 新的编辑代数
+            dirty_rect: 发生变化的区域（原图坐标系，QRect 或 QRegion）；None 表示整图都可能变化
+        """
+        if dirty_rect is None or self.image is None or image.size() != self.image.size():
+            self.bind(image, generation)
+            return
+        self.image = image
+        self.generation = generation
+        self.invalidate(dirty_rect)
+
+    def invalidate(self, rect):
+        """丢弃与指定区域（原图坐标系，QRect 或 QRegion）相交的瓦片"""
+        if rect is None or rect.isEmpty():
+            return
+        region = QRegion(rect) if isinstance(rect, QRect) else rect
+        dirty = {}  # 缩放比例 -> 显示坐标系中可能变化的区域
+        for key in list(self.tiles):
+            zoom, column, row = key
+            if zoom not in dirty:
+                dirty[zoom] = [self.map_dirty_rect(zoom, changed) for changed in region]
+            tile_rect = self.get_tile_rect(zoom, column, row)
+            if any(tile_rect.intersects(changed) for changed in dirty[zoom]):
+                self.bytes_used -= self._pixmap_bytes(self.tiles.pop(key))
+
+    def get_display_size(self, zoom):
+        """
+        获取缩放 zoom 倍后图片的显示尺寸
+
+        Args:
+            zoom: 缩放比例（屏幕像素 / 原图像素）
+        Returns:
+            QSize: 显示尺寸，没有图片时为空
+        """
+        if self.image is None:
+            return QSize()
+        return QSize(max(1, round(self.image.width() * zoom)), max(1, round(self.image.height() * zoom)))
+
+    def get_tile_rect(self, zoom, column, row):
+        """获取瓦片在显示坐标系中的范围（图片右边/下边的瓦片可能不足 tile_size）"""
+        display = QRect(QPoint(0, 0), self.get_display_size(zoom))
+        return QRect(column * self.tile_size, row * self.tile_size, self.tile_size, self.tile_size).intersected(display)
+
+    def map_dirty_rect(self, zoom, rect):
+        """
+        获取原图中 rect 范围变化后，缩放 zoom 倍的显示中可能随之变化的范围
+
+        Args:
+            zoom: 缩放比例
+            rect: 原图坐标系中发生变化的区域
+        Returns:
+            QRect: 显示坐标系中的范围（缩小时的插值会读到相邻的级别像素，按级别像素覆盖的原图范围向外扩展）
+        """
+        margin = 2 << self.pyramid.select_level(zoom)
+        left, top = math.floor((rect.left() - margin) * zoom), math.floor((rect.top() - margin) * zoom)
+        right = math.ceil((rect.right() + 1 + margin) * zoom)
+        bottom = math.ceil((rect.bottom() + 1 + margin) * zoom)
+        return QRect(left, top, right - left, bottom - top)
+
+    def get_tile_range(self, zoom, rect):
+        """
+        获取与显示坐标系中的区域相交的瓦片范围
+
+        Args:
+            zoom: 缩放比例
+            rect: 显示坐标系中的区域
+        Returns:
+            tuple: (首列, 末列, 首行, 末行)，均包含在内；没有相交的瓦片时为 None
+        """
+        rect = rect.intersected(QRect(QPoint(0, 0), self.get_display_size(zoom)))
+        if rect.isEmpty():
+            return None
+        return (rect.left() // self.tile_size, rect.right() // self.tile_size,
+                rect.top() // self.tile_size, rect.bottom() // self.tile_size)
+
+    def get_capacity(self):
+        """获取内存上限内最多能缓存的完整瓦片数"""
+        return self.max_bytes // (self.tile_size * self.tile_size * 4)
+
+    def has_tile(self, zoom, column, row):
+        """检查瓦片是否已缓存"""
+        return (zoom, column, row) in self.tiles
+
+    def get_tile(self, zoom, column, row):
+        """
+        获取瓦片（未缓存时由金字塔生成）
+
+        Args:
+            zoom: 缩放比例
+            column: 瓦片列号
+            row: 瓦片行号
+        Returns:
+            QPixmap: 瓦片，尺寸与 get_tile_rect 相同
+        """
+        key = (zoom, column, row)
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+        pixmap = QPixmap.fromImage(self._render(zoom, self.get_tile_rect(zoom, column, row)))
+        self.rendered += 1
+        self.tiles[key] = pixmap
+        self.bytes_used += self._pixmap_bytes(pixmap)
+        self._evict()
+        return pixmap
+
+    def draw_fast(self, painter, zoom, column, row, position):
+        """
+        不生成瓦片，直接由金字塔级别快速缩放（最近邻）绘制瓦片范围（瓦片生成前的临时显示）
+
+        Args:
+            painter: 目标 QPainter
+            zoom: 缩放比例
+            column: 瓦片列号
+            row: 瓦片行号
+            position: 瓦片左上角在目标中的位置
+        """
+        rect = self.get_tile_rect(zoom, column, row)
+        block, source = self._get_source_block(zoom, rect)
+        painter.drawImage(QRectF(QRect(position, rect.size())), block, source)
+
+    def compose(self, zoom, rect):
+        """
+        把显示坐标系中的区域由瓦片拼合为一张图像（实时预览在其上渲染）
+
+        Args:
+            zoom: 缩放比例
+            rect: 显示坐标系中的区域
+        Returns:
+            QImage: 区域的图像（ARGB32_Premultiplied，超出图片的部分为透明）
+        """
+        image = QImage(rect.size(), QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        tile_range = self.get_tile_range(zoom, rect)
+        if tile_range is None:
+            return image
+        first_column, last_column, first_row, last_row = tile_range
+        painter = QPainter(image)
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                position = QPoint(column * self.tile_size, row * self.tile_size) - rect.topLeft()
+                painter.drawPixmap(position, self.get_tile(zoom, column, row))
+        painter.end()
+        return image
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        Returns:
+            dict: tiles/bytes/max_bytes/rendered/evictions/generation
+        """
+        return {
+            "tiles": len(self.tiles),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "rendered": self.rendered,
+            "evictions": self.evictions,
+            "generation": self.generation,
+        }
+
+    def _render(self, zoom, rect):
+        """由金字塔中合适的级别生成显示坐标系中 rect 范围的图像"""
+        block, source = self._get_source_block(zoom, rect)
+        tile = QImage(rect.size(), QImage.Format_ARGB32_Premultiplied)
+        tile.fill(Qt.transparent)
+        painter = QPainter(tile)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        # 缩小时平滑插值，放大时保持像素边界清晰
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, source.width() > rect.width())
+        painter.drawImage(QRectF(tile.rect()), block, source)
+        painter.end()
+        return tile
+
+    def _get_source_block(self, zoom, rect):
+        """
+        从金字塔中合适的级别复制显示坐标系中 rect 范围所需的像素（含插值用的 1 像素边距），
+        绘制时的像素格式转换也只作用于这一小块
+
+        Returns:
+            tuple: (像素块 QImage, rect 在像素块中对应的范围 QRectF)
+        """
+        level = self.pyramid.select_level(zoom)
+        level_image = self.pyramid.get_level(level)
+        factor = zoom * (1 << level)  # 屏幕像素 / 级别像素
+        source = QRectF(rect.x() / factor, rect.y() / factor, rect.width() / factor, rect.height() / factor)
+        bounds = source.toAlignedRect().adjusted(-1, -1, 1, 1).intersected(level_image.rect())
+        return level_image.copy(bounds), source.translated(-bounds.x(), -bounds.y())
+
+    def _evict(self):
+        """超出内存上限时淘汰最久未使用的瓦片"""
+        while self.bytes_used > self.max_bytes and len(self.tiles) > 1:
+            _key, pixmap = self.tiles.popitem(last=False)
+            self.bytes_used -= self._pixmap_bytes(pixmap)
+            self.evictions += 1
+
+    @staticmethod
+    def _pixmap_bytes(pixmap):
+        """估算瓦片占用的内存（字节）"""
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
@@ -1,76 +1,544 @@
 """
 历史管理模块 - 管理图像编辑历史（撤销/重做功能）
+
+历史记录只保存一张基准图像（当前状态）和相邻状态之间的差异块：
+每次编辑只记录发生变化的矩形区域，撤销/重做时在基准图像上原地交换该区域的像素。
+历史记录按字节预算限制内存：距当前状态较远的差异块在后台线程中用 zlib 压缩，
+超出预算时淘汰最老的记录；最近几步保持未压缩，撤销/重做的延迟不受影响。
+差异块在内存中的占用超过 EDIT_HISTORY_RAM_BYTES 时，最远的已压缩记录才转存到临时文件（通过 mmap 读回），
+撤销进入转存部分时提前一步在后台读回；小图片的历史记录不会写入磁盘。
+
+图像所有权：add_state 接收的图像直接成为基准图像（不复制），undo/redo 返回的也是基准图像本身，
+调用方（ImageViewer）与历史记录持有同一个 QImage 对象；撤销/重做只在该对象上原地交换差异块，
+不产生整图复制。其它地方只通过 Qt 隐式共享（QImage(image)）取得只读快照，写入时由 Qt 先行复制。
 """
-from PySide6.QtGui import QImage
-from src.constants.config import MAX_EDIT_HISTORY
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import zlib
+from PySide6.QtGui import QImage, QRegion
+from PySide6.QtCore import QRect
+from src.constants.config import (
+    MAX_EDIT_HISTORY, EDIT_HISTORY_MAX_BYTES, EDIT_HISTORY_RAW_STEPS, EDIT_HISTORY_COMPRESS_LEVEL,
+    EDIT_HISTORY_RAM_BYTES
+)
+from src.features.history_scratch import HistoryScratchFile
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# 查找变化区域时每次比较的行数（限制临时数组的内存占用）
+_DIFF_CHUNK_ROWS = 256
+
+
+class HistoryPatch:
+    """
+    相邻两个历史状态之间的差异块。
+
+    rect 为发生变化的区域的外接矩形，pixels 保存该矩形中“当前未显示的一侧”的像素：
+    位于当前状态之前的差异块保存编辑前的像素，之后的保存编辑后的像素（矩形内未变化的像素交换后保持不变）。
+    region 为实际变化的区域（多个选区时），撤销/重做后只刷新这部分显示。
+    应用差异块即与基准图像交换该区域的像素，因此撤销与重做共用同一份数据。
+    rect 为 None 时表示整图替换（尺寸或格式不同，例如加载了新图片；或每像素不足 1 字节的格式），
+    pixels 为完整图像。
+    像素有三种存放方式：未压缩的 QImage（pixels）、内存中的 zlib 数据（packed）、
+    转存到临时文件中的 zlib 数据（location）；后两种情况下应用前先读回并解压。
+    每次切换存放方式或交换像素时 version 加一，后台任务据此判断结果是否仍然有效。
+    """
+
+    def __init__(self, rect, pixels, region=None):
+        """
+        初始化差异块
+
+        Args:
+            rect: 变化区域的外接矩形（QRect），None 表示整图替换
+            pixels: 变化区域另一侧的像素（QImage）
+            region: 实际变化的区域（QRegion），None 表示整个 rect
+        """
+        self.rect = rect
+        self.region = region
+        self.pixels = pixels
+        self.packed = None
+        self.location = None  # 转存到临时文件时的 (偏移, 长度)
+        self.layout = None  # 压缩时记录的 (宽, 高, 格式, 颜色表)
+        self.raw_bytes = pixels.sizeInBytes()
+        self.version = 0
+        self.pending = False  # 是否已提交后台任务
+
+    def stored_bytes(self):
+        """获取差异块当前占用的内存字节数"""
+        if self.pixels is not None:
+            return self.raw_bytes
+        return len(self.packed) if self.packed is not None else 0
+
+    def disk_bytes(self):
+        """获取差异块转存到临时文件的字节数"""
+        return self.location[1] if self.location is not None else 0
+
+    def store_packed(self, packed, layout):
+        """用内存中的压缩数据替换当前像素"""
+        self.layout = layout
+        self.packed = packed
+        self.pixels = None
+        self.version += 1
+        self.pending = False
+
+    def store_spilled(self, location, layout):
+        """用临时文件中的压缩数据替换当前像素或内存中的压缩数据"""
+        self.layout = layout
+        self.location = location
+        self.packed = None
+        self.pixels = None
+        self.version += 1
+        self.pending = False
+
+    def store_pixels(self, pixels, scratch):
+        """用已解压的像素替换压缩数据，并归还临时文件中的区段"""
+        if self.location is not None:
+            scratch.release(self.location)
+        self.pixels = pixels
+        self.packed = None
+        self.location = None
+        self.layout = None
+        self.version += 1
+        self.pending = False
+
+    def unpack(self, scratch):
+        """读回并解压像素（已是未压缩状态时不做任何事）"""
+        if self.pixels is not None:
+            return
+        packed = scratch.read(self.location) if self.location is not None else self.packed
+        self.store_pixels(_inflate(packed, self.layout), scratch)
+
+    def discard(self, scratch):
+        """差异块被移出历史记录时调用，归还临时文件中的区段"""
+        if self.location is not None and scratch is not None:
+            scratch.release(self.location)
+        self.location = None
+        self.version += 1
+
+    def swap(self, image, scratch):
+        """
+        与基准图像交换像素
+
+        Args:
+            image: 基准图像（原地修改）
+            scratch: 历史记录临时文件（差异块已转存时用于读回）
+        Returns:
+            QImage: 交换后的基准图像（整图替换时为新的图像对象）
+        """
+        self.unpack(scratch)
+        self.version += 1
+        if self.rect is None:
+            image, self.pixels = self.pixels, image
+            self.raw_bytes = self.pixels.sizeInBytes()
+            return image
+        if self.rect.isEmpty():
+            return image
+        current = image.copy(self.rect)
+        _write_rect(image, self.rect, self.pixels)
+        self.pixels = current
+        return image
 
 
 class EditHistory:
     """编辑历史管理器"""
-    
-    def __init__(self, max_history=MAX_EDIT_HISTORY):
+
+    def __init__(self, max_history=MAX_EDIT_HISTORY, max_bytes=EDIT_HISTORY_MAX_BYTES,
+                 raw_steps=EDIT_HISTORY_RAW_STEPS, compress_level=EDIT_HISTORY_COMPRESS_LEVEL,
+                 ram_bytes=EDIT_HISTORY_RAM_BYTES):
         """
         初始化编辑历史管理器
-        
+
         Args:
             max_history: 最大历史记录数，默认使用配置值
+            max_bytes: 历史记录内存上限（字节，含基准图像），默认使用配置值
+            raw_steps: 撤销/重做方向上各保持未压缩的步数
+            compress_level: 后台压缩使用的 zlib 压缩级别
+            ram_bytes: 差异块在内存中的占用上限（字节，不含基准图像），超出时最远的已压缩记录转存到临时文件；
+                       None 表示不转存
         """
         self.max_history = max_history
-        self.history = []
+        self.max_bytes = max_bytes
+        self.raw_steps = raw_steps
+        self.compress_level = compress_level
+        self.ram_bytes = ram_bytes
+        self.base_image = None  # 当前状态的图像，撤销/重做时原地修改
+        self.patches = []  # patches[i] 连接第 i 个与第 i+1 个状态
         self.current_index = -1
-    
-    def add_state(self, image):
-        """添加新的状态到历史记录"""
+        self.evictions = 0
+        self.lock = threading.RLock()  # 保护差异块在界面线程与后台线程之间的状态切换
+        self.worker = None  # 后台压缩/转存/预取线程池，首次需要时创建
+        self.scratch = None  # 历史记录临时文件，首次需要转存时创建
+        self.last_change_rect = None
+        self.image_copies = 0  # 累计的整图复制次数（含原地写入时 Qt 隐式共享脱离产生的复制）
+
+    def add_state(self, image, dirty_rect=None):
+        """
+        添加新的状态到历史记录
+
+        Args:
+            image: 新状态的图像，成为历史记录的基准图像（与调用方共享，调用方此后不应原地修改）
+            dirty_rect: 相对当前状态可能发生变化的区域（QRect 或 QRegion）；None 表示逐像素比较找出变化区域
+        """
         if image is None or image.isNull():
             return
-        
-        # 移除当前索引之后的状态（当用户撤销后进行了新操作时）
-        self.history = self.history[:self.current_index + 1]
-        
-        # 添加新状态
-        self.history.append(image.copy())
-        self.current_index += 1
-        
-        # 如果历史记录超过最大限制，移除最老的状态
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-            self.current_index -= 1
-    
+
+        with self.lock:
+            if self.base_image is None:
+                self.base_image = image
+                self.current_index = 0
+                self.enforce_budget()
+                return
+
+            # 移除当前索引之后的状态（当用户撤销后进行了新操作时）
+            self._discard(self.patches[self.current_index:])
+            del self.patches[self.current_index:]
+
+            # 只记录与当前状态相比发生变化的区域
+            if (image.size() != self.base_image.size() or image.format() != self.base_image.format()
+                    or image.depth() % 8):
+                patch = HistoryPatch(None, self.base_image)
+            else:
+                region = None
+                if dirty_rect is None:
+                    rect = _changed_rect(self.base_image, image)
+                else:
+                    region = QRegion(dirty_rect).intersected(self.base_image.rect())
+                    rect = region.boundingRect()
+                    if region.rectCount() <= 1:
+                        region = None
+                patch = HistoryPatch(rect, self.base_image.copy(rect) if not rect.isEmpty() else QImage(), region)
+            self.base_image = image
+            self.patches.append(patch)
+            self.current_index += 1
+
+            # 如果历史记录超过最大限制，移除最老的状态
+            if len(self.patches) + 1 > self.max_history:
+                self._discard([self.patches.pop(0)])
+                self.current_index -= 1
+            self.enforce_budget()
+            self.schedule_compression()
+
+    def add_operation(self, operation, image):
+        """
+        记录一次操作的结果（与 OperationHistory 接口一致；差异块历史只记录像素变化，不保存操作本身）
+
+        Args:
+            operation: 马赛克操作（MosaicOperation），只有其选区的并集发生变化，无需逐像素比较
+            image: 操作的结果
+        """
+        self.add_state(image, operation.get_dirty_region())
+
     def can_undo(self):
         """检查是否可以撤销"""
         return self.current_index > 0
-    
+
     def can_redo(self):
         """检查是否可以重做"""
-        return self.current_index < len(self.history) - 1
-    
+        return self.current_index < len(self.patches)
+
     def undo(self):
         """撤销操作"""
         if not self.can_undo():
             return None
-        
-        self.current_index -= 1
-        return self.history[self.current_index].copy()
-    
+
+        with self.lock:
+            self.current_index -= 1
+            self._apply_patch(self.patches[self.current_index])
+            self.schedule_compression()
+            # 继续撤销时需要的差异块若已压缩或转存，提前在后台读回
+            if self.current_index > 0:
+                self._prefetch(self.patches[self.current_index - 1])
+            return self.base_image
+
     def redo(self):
         """重做操作"""
         if not self.can_redo():
             return None
-        
-        self.current_index += 1
-        return self.history[self.current_index].copy()
-    
+
+        with self.lock:
+            self._apply_patch(self.patches[self.current_index])
+            self.current_index += 1
+            self.schedule_compression()
+            return self.base_image
+
     def clear(self):
-        """清空历史记录"""
-        self.history.clear()
-        self.current_index = -1
-    
+        """清空历史记录，并删除临时文件"""
+        with self.lock:
+            self.base_image = None
+            self._discard(self.patches)
+            self.patches.clear()
+            self.current_index = -1
+            self.last_change_rect = None
+            if self.scratch is not None:
+                self.scratch.close()
+                self.scratch = None
+
     def get_current_state(self):
-        """获取当前状态"""
-        if 0 <= self.current_index < len(self.history):
-            return self.history[self.current_index].copy()
+        """获取当前状态（隐式共享的只读快照）"""
+        if self.base_image is not None:
+            return QImage(self.base_image)
         return None
-    
+
+    def get_last_change_rect(self):
+        """
+        获取最近一次撤销/重做改变的区域
+
+        Returns:
+            QRect | QRegion | None: 变化区域（图片坐标系）；None 表示整图替换或尚无撤销/重做
+        """
+        return self.last_change_rect
+
     def is_empty(self):
         """检查历史记录是否为空"""
-        return len(self.history) == 0
\ No newline at end of file
+        return self.base_image is None
+
+    def set_max_bytes(self, max_bytes):
+        """
+        运行时调整历史记录内存上限，超出时立即淘汰最老的记录
+
+        Args:
+            max_bytes: 内存上限（字节）
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.enforce_budget()
+
+    def get_max_bytes(self):
+        """获取历史记录内存上限（字节）"""
+        return self.max_bytes
+
+    def stats(self):
+        """
+        获取历史记录内存统计
+
+        Returns:
+            dict: states/patches/compressed/spilled/raw_bytes/stored_bytes/disk_bytes/max_bytes/evictions/image_copies
+                  （raw_bytes 为全部未压缩时的大小，stored_bytes 为实际占用的内存，均含基准图像；
+                  disk_bytes 为转存到临时文件的大小）
+        """
+        with self.lock:
+            base_bytes = self.base_image.sizeInBytes() if self.base_image is not None else 0
+            return {
+                "states": len(self.patches) + 1 if self.base_image is not None else 0,
+                "patches": len(self.patches),
+                "compressed": sum(1 for patch in self.patches if patch.packed is not None),
+                "spilled": sum(1 for patch in self.patches if patch.location is not None),
+                "raw_bytes": base_bytes + sum(patch.raw_bytes for patch in self.patches),
+                "stored_bytes": base_bytes + sum(patch.stored_bytes() for patch in self.patches),
+                "disk_bytes": sum(patch.disk_bytes() for patch in self.patches),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "image_copies": self.image_copies,
+            }
+
+    def enforce_budget(self):
+        """超出内存上限时淘汰记录：先淘汰最老的可撤销记录，仍超出时再淘汰最远的可重做记录"""
+        with self.lock:
+            if self.base_image is None:
+                return
+            used = self.base_image.sizeInBytes() + sum(patch.stored_bytes() for patch in self.patches)
+            while used > self.max_bytes and self.patches:
+                if self.current_index > 0:
+                    patch = self.patches.pop(0)
+                    self.current_index -= 1
+                else:
+                    patch = self.patches.pop()
+                used -= patch.stored_bytes()
+                self._discard([patch])
+                self.evictions += 1
+
+    def schedule_compression(self):
+        """
+        按与当前状态的距离提交后台任务：
+        超过 raw_steps 步的未压缩差异块压缩到内存；差异块在内存中的占用超过 ram_bytes 时，
+        从距离最远的已压缩差异块开始转存到临时文件，直到不再超出
+        """
+        with self.lock:
+            packed = []
+            for index, patch in enumerate(self.patches):
+                if patch.pending or patch.location is not None or patch.raw_bytes == 0:
+                    continue
+                # 撤销到第 index 个状态使用 patches[index]（距离 current_index - 1 - index），
+                # 重做使用 patches[current_index]（距离 index - current_index）
+                distance = self.current_index - 1 - index if index < self.current_index else index - self.current_index
+                if distance < self.raw_steps:
+                    continue
+                if patch.pixels is None:
+                    packed.append((distance, patch))
+                    continue
+                patch.pending = True
+                # 提交隐式共享的浅拷贝：任务执行期间若界面线程修改了原图像，Qt 会先脱离共享，后台读到的数据不受影响
+                self._submit(self._compress_patch, patch, patch.version, QImage(patch.pixels), None, None)
+            if self.ram_bytes is None:
+                return
+            used = sum(patch.stored_bytes() for patch in self.patches)
+            for _distance, patch in sorted(packed, key=lambda item: item[0], reverse=True):
+                if used <= self.ram_bytes:
+                    break
+                if self.scratch is None:
+                    self.scratch = HistoryScratchFile()
+                patch.pending = True
+                used -= patch.stored_bytes()
+                self._submit(self._compress_patch, patch, patch.version, None, patch.packed, self.scratch)
+
+    def wait_for_compression(self):
+        """等待已提交的后台任务全部完成（用于统计与测试）"""
+        while True:
+            with self.lock:
+                worker = self.worker
+                if worker is None or not any(patch.pending for patch in self.patches):
+                    return
+            # 任务完成时可能提交后续任务（压缩后再转存），等到没有待处理的差异块为止
+            worker.submit(lambda: None).result()
+
+    def _apply_patch(self, patch):
+        """在基准图像上应用差异块；基准图像与其它 QImage 共享像素数据时，原地写入会先复制整图"""
+        # cacheKey 的高 32 位是像素数据块的序号，只有脱离共享、复制出新数据块时才会改变
+        serial = self.base_image.cacheKey() >> 32
+        image = patch.swap(self.base_image, self.scratch)
+        if image is self.base_image and image.cacheKey() >> 32 != serial:
+            self.image_copies += 1
+        self.base_image = image
+        self.last_change_rect = patch.region if patch.region is not None else patch.rect
+
+    def _submit(self, function, *args):
+        """向后台线程提交任务"""
+        if self.worker is None:
+            self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="edit-history")
+        self.worker.submit(function, *args)
+
+    def _discard(self, patches):
+        """归还被移出历史记录的差异块占用的临时文件区段"""
+        for patch in patches:
+            patch.discard(self.scratch)
+
+    def _prefetch(self, patch):
+        """在后台读回并解压已压缩或已转存的差异块"""
+        if patch.pixels is not None or patch.pending:
+            return
+        patch.pending = True
+        self._submit(self._prefetch_patch, patch, patch.version, patch.location, patch.packed,
+                     patch.layout, self.scratch)
+
+    def _compress_patch(self, patch, version, pixels, packed, scratch):
+        """后台线程：压缩差异块（scratch 不为 None 时再写入临时文件），期间差异块未变化时替换其存放方式"""
+        try:
+            layout = patch.layout
+            if pixels is not None:
+                packed = zlib.compress(pixels.constBits(), self.compress_level)
+                layout = _layout(pixels)
+            location = scratch.write(packed) if scratch is not None else None
+        except (OSError, ValueError):
+            # 临时文件已随 clear() 关闭，或磁盘写入失败：保持原样
+            patch.pending = False
+            return
+        with self.lock:
+            if patch.version != version:
+                if location is not None and scratch is self.scratch:
+                    scratch.release(location)
+                patch.pending = False
+            elif location is not None:
+                patch.store_spilled(location, layout)
+            else:
+                patch.store_packed(packed, layout)
+                # 压缩期间可能又有新的编辑，已压缩的差异块可能需要继续转存
+                self.schedule_compression()
+
+    def _prefetch_patch(self, patch, version, location, packed, layout, scratch):
+        """后台线程：读回并解压差异块，期间差异块未变化时替换为未压缩的像素"""
+        try:
+            pixels = _inflate(scratch.read(location) if location is not None else packed, layout)
+        except (OSError, ValueError, zlib.error):
+            patch.pending = False
+            return
+        with self.lock:
+            if patch.version == version:
+                patch.store_pixels(pixels, scratch)
+            else:
+                patch.pending = False
+
+
+def _layout(pixels):
+    """记录解压时重建图像所需的尺寸、格式与颜色表"""
+    return pixels.width(), pixels.height(), pixels.format(), pixels.colorTable()
+
+
+def _inflate(packed, layout):
+    """
+    将 zlib 数据解压为图像。
+    参数：
+        packed (bytes): 压缩数据
+        layout (tuple): _layout 记录的 (宽, 高, 格式, 颜色表)
+    返回：
+        QImage: 解压后的图像
+    """
+    width, height, fmt, color_table = layout
+    pixels = QImage(width, height, fmt)
+    if color_table:
+        pixels.setColorTable(color_table)
+    data = zlib.decompress(packed)
+    pixels.bits()[:len(data)] = data  # 与压缩前相同的尺寸和格式，行对齐方式一致
+    return pixels
+
+
+def _changed_rect(old, new):
+    """
+    求两张同尺寸、同格式（每像素为整字节）图像之间发生变化的外接矩形。
+    已安装 NumPy 时精确到像素列；否则逐行比较，返回覆盖变化行的整行区域。
+    参数：
+        old (QImage): 原图像
+        new (QImage): 新图像
+    返回：
+        QRect: 变化区域，没有变化时为空矩形
+    """
+    width, height = old.width(), old.height()
+    row_bytes = width * old.depth() // 8
+    old_bits, new_bits = old.constBits(), new.constBits()
+    old_stride, new_stride = old.bytesPerLine(), new.bytesPerLine()
+    if np is not None:
+        old_rows = np.frombuffer(old_bits, dtype=np.uint8).reshape(height, old_stride)[:, :row_bytes]
+        new_rows = np.frombuffer(new_bits, dtype=np.uint8).reshape(height, new_stride)[:, :row_bytes]
+        changed_rows = np.zeros(height, dtype=bool)
+        changed_cols = np.zeros(row_bytes, dtype=bool)
+        for start in range(0, height, _DIFF_CHUNK_ROWS):
+            diff = old_rows[start:start + _DIFF_CHUNK_ROWS] != new_rows[start:start + _DIFF_CHUNK_ROWS]
+            changed_rows[start:start + _DIFF_CHUNK_ROWS] = diff.any(axis=1)
+            changed_cols |= diff.any(axis=0)
+        rows = np.flatnonzero(changed_rows)
+        if rows.size == 0:
+            return QRect()
+        cols = np.flatnonzero(changed_cols)
+        pixel_bytes = old.depth() // 8
+        left, right = int(cols[0]) // pixel_bytes, int(cols[-1]) // pixel_bytes
+        return QRect(left, int(rows[0]), right - left + 1, int(rows[-1] - rows[0]) + 1)
+
+    top = bottom = None
+    for y in range(height):
+        if old_bits[y * old_stride:y * old_stride + row_bytes] != new_bits[y * new_stride:y * new_stride + row_bytes]:
+            if top is None:
+                top = y
+            bottom = y
+    if top is None:
+        return QRect()
+    return QRect(0, top, width, bottom - top + 1)
+
+
+def _write_rect(image, rect, pixels):
+    """
+    将与区域同尺寸、同格式的像素块逐行复制到图像的指定区域（原地修改）。
+    参数：
+        image (QImage): 目标图像
+        rect (QRect): 目标区域
+        pixels (QImage): 区域像素
+    """
+    pixel_bytes = image.depth() // 8
+    row_bytes = rect.width() * pixel_bytes
+    target, source = image.bits(), pixels.constBits()
+    target_stride, source_stride = image.bytesPerLine(), pixels.bytesPerLine()
+    offset = rect.left() * pixel_bytes
+    for row in range(rect.height()):
+        start = (rect.top() + row) * target_stride + offset
+        target[start:start + row_bytes] = source[row * source_stride:row * source_stride + row_bytes]
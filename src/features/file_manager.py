@@ -4,26 +4,33 @@
 import os
 from PySide6.QtWidgets import QFileDialog, QMessageBox
 from PySide6.QtGui import QImage
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, Signal, QThreadPool
 from src.localization import tr
-from src.features.image_loader import load_image, save_image
+from src.features.image_loader import save_image, MemoryBudgetError
+from src.features.image_load_task import ImageLoadTask
 from src.constants.config import SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_SAVE_EXTENSIONS
 
 
 class FileManager(QObject):
     """文件管理器类"""
-    image_opened = Signal(QImage, str)
+    image_opened = Signal(QImage, str, object, object)  # 工作格式的图像、文件路径、原始像素格式与 LargeImageSource（预览图时）
+    load_started = Signal(str)  # 开始后台加载（文件路径）
+    load_progress = Signal(int)  # 加载进度（0-100，-1 表示解码中、无法细分）
+    load_cancelled = Signal()  # 加载被取消
+    load_failed = Signal(str)  # 加载失败（文件路径）
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_file_path = None
         self.parent_widget = parent
         self.valid_extensions = SUPPORTED_IMAGE_EXTENSIONS
+        self.load_task = None  # 正在后台运行的加载任务
 
     def open_image_file(self, file_path=None):
         """
         打开图像文件。
         如果提供了 file_path，则直接打开；否则，显示文件对话框。
+        文件在后台线程中读取和解码，完成后发出 image_opened；正在进行的加载会被取消。
         Args:
             file_path (str, optional): 要打开的图像文件路径. Defaults to None.
         """
@@ -44,25 +51,70 @@ class FileManager(QObject):
                 )
                 return
 
-            # 使用统一的load_image函数
-            image = load_image(file_path)
-            if image is None:
-                QMessageBox.critical(
-                    self.parent_widget,
-                    tr("error", "Error"),
-                    tr("failed_to_load_image", "Failed to load image")
-                )
-                return
+            # 新的打开请求取消正在进行的加载，旧任务之后发出的信号会被忽略
+            self.cancel_loading()
+            task = ImageLoadTask(file_path)
+            task.signals.progress.connect(self.on_load_progress)
+            task.signals.finished.connect(self.on_load_finished)
+            task.signals.cancelled.connect(self.on_load_cancelled)
+            task.signals.failed.connect(self.on_load_failed)
+            self.load_task = task
+            self.load_started.emit(file_path)
+            QThreadPool.globalInstance().start(task)
+
+    def cancel_loading(self):
+        """取消正在进行的后台加载（结果由 on_load_cancelled 收尾）"""
+        if self.load_task is not None:
+            self.load_task.cancel()
+
+    def is_current_load_task(self):
+        """检查发出信号的是否为当前加载任务（被取消后才结束的旧任务信号直接忽略）"""
+        return self.load_task is not None and self.sender() is self.load_task.signals
 
-            self.current_file_path = file_path
-            self.image_opened.emit(image, file_path)
+    def on_load_progress(self, percent):
+        """转发当前加载任务的进度"""
+        if self.is_current_load_task():
+            self.load_progress.emit(percent)
 
-    def save_image_file(self, image, parent_widget):
+    def on_load_finished(self, image, file_path, source_format, large_image):
+        """后台加载完成"""
+        if not self.is_current_load_task():
+            return
+        cancelled = self.load_task.is_cancelled()
+        self.load_task = None
+        if cancelled:
+            self.load_cancelled.emit()
+            return
+        self.current_file_path = file_path
+        self.image_opened.emit(image, file_path, source_format, large_image)
+
+    def on_load_cancelled(self):
+        """后台加载被取消"""
+        if not self.is_current_load_task():
+            return
+        self.load_task = None
+        self.load_cancelled.emit()
+
+    def on_load_failed(self, file_path, error):
+        """后台加载失败（error 为失败原因的异常，原因未知时为 None）"""
+        if not self.is_current_load_task():
+            return
+        self.load_task = None
+        self.load_failed.emit(file_path)
+        QMessageBox.critical(
+            self.parent_widget,
+            tr("error", "Error"),
+            _error_message(tr("failed_to_load_image", "Failed to load image"), error)
+        )
+
+    def save_image_file(self, image, parent_widget, large_image=None, operations=None):
         """
         保存图像文件 - 使用统一的save_image函数
         Args:
             image: 要保存的图像
             parent_widget: 父窗口部件
+            large_image: 当前图像为超大图片的预览图时的 LargeImageSource，保存时以原分辨率重放 operations
+            operations: 预览图上记录的操作列表（large_image 不为 None 时使用）
         Returns:
             bool: 是否成功保存
         """
@@ -81,8 +133,16 @@ class FileManager(QObject):
             if not file_path.lower().endswith(tuple(SUPPORTED_SAVE_EXTENSIONS)):
                 file_path += '.png'
             
-            # 使用统一的save_image函数
-            if save_image(image, file_path):
+            # 预览图以原分辨率分条带保存，其余使用统一的save_image函数
+            error = None
+            try:
+                if large_image is not None:
+                    saved = large_image.save(file_path, operations or [])
+                else:
+                    saved = save_image(image, file_path)
+            except (OSError, ValueError) as e:
+                saved, error = False, e
+            if saved:
                 self.current_file_path = file_path
                 QMessageBox.information(
                     parent_widget,
@@ -94,7 +154,7 @@ class FileManager(QObject):
                 QMessageBox.critical(
                     parent_widget,
                     tr("error", "Error"),
-                    tr("failed_to_save_image", "Failed to save image")
+                    _error_message(tr("failed_to_save_image", "Failed to save image"), error)
                 )
                 return False
         
@@ -122,4 +182,21 @@ class FileManager(QObject):
             return False
         
         file_ext = os.path.splitext(file_path)[1].lower()
-        return file_ext in self.valid_extensions
\ No newline at end of file
+        return file_ext in self.valid_extensions
+
+
+def _error_message(message, error):
+    """
+    在错误提示后附上失败原因。
+    参数：
+        message (str): 错误提示
+        error (Exception | None): 失败原因，None 表示原因未知
+    返回：
+        str: 显示给用户的消息
+    """
+    if isinstance(error, MemoryBudgetError):
+        detail = tr("memory_budget_exceeded",
+                    "About {} MB of memory is needed, more than the {} MB budget. "
+                    "Only JPEG files can be opened in parts, and only PNG files can be saved in parts.")
+        return f"{message}\n{detail.format(error.required_bytes // 2 ** 20, error.budget_bytes // 2 ** 20)}"
+    return f"{message}\n{error}" if error is not None else message
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+历史记录临时文件模块
+
+用途：
+    为编辑历史提供磁盘上的暂存空间：较早的差异块写入临时目录下的文件，通过 mmap 读回。
+
+使用场景：
+    由 EditHistory 在内存中的差异块超过 EDIT_HISTORY_RAM_BYTES 时首次创建；
+    长时间处理超大扫描件时，最远的已压缩记录转存到磁盘，小图片的历史记录始终留在内存中。
+    文件以 tempfile.TemporaryFile 创建，打开后即不在目录中留下名字（Windows 上关闭时删除），
+    程序异常退出也不会留下包含打码前像素的文件。释放的空间会被后续写入复用；clear() 时关闭文件。
+"""
+import mmap
+import tempfile
+import threading
+
+
+class HistoryScratchFile:
+    """
+    追加写入、按区段复用的临时文件。
+
+    write 返回 (偏移, 长度)，read 通过只读 mmap 取回数据，release 归还区段供后续写入复用。
+    公开方法内部加锁，可在后台压缩线程与界面线程之间共享。
+    """
+
+    def __init__(self, directory=None):
+        """
+        创建临时文件
+
+        Args:
+            directory: 临时文件所在目录，None 表示系统临时目录
+        """
+        self.file = tempfile.TemporaryFile(prefix="mosaic_history_", suffix=".bin", dir=directory)
+        self.size = 0  # 文件有效长度
+        self.free = []  # 已释放的区段 [偏移, 长度]，按偏移排序
+        self.mapping = None
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        """
+        写入数据
+
+        Args:
+            data: 要写入的字节数据
+        Returns:
+            tuple: (偏移, 长度)
+        """
+        length = len(data)
+        with self.lock:
+            offset = self._allocate(length)
+            self.file.seek(offset)
+            self.file.write(data)
+            self.file.flush()
+            return offset, length
+
+    def read(self, location):
+        """
+        读取之前写入的数据
+
+        Args:
+            location: write 返回的 (偏移, 长度)
+        Returns:
+            bytes: 数据
+        """
+        offset, length = location
+        with self.lock:
+            if self.mapping is None or len(self.mapping) < offset + length:
+                # 文件在上次映射后变长，重新映射整个文件
+                if self.mapping is not None:
+                    self.mapping.close()
+                self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self.mapping[offset:offset + length]
+
+    def release(self, location):
+        """归还区段；全部区段都已归还时把文件截断为空"""
+        offset, length = location
+        with self.lock:
+            self.free.append([offset, length])
+            self.free.sort()
+            merged = []
+            for block in self.free:
+                if merged and merged[-1][0] + merged[-1][1] == block[0]:
+                    merged[-1][1] += block[1]
+                else:
+                    merged.append(block)
+            if merged and merged[-1][0] + merged[-1][1] == self.size:
+                # 文件末尾的空闲区段直接截掉
+                self.size = merged.pop()[0]
+                self._truncate()
+            self.free = merged
+
+    def close(self):
+        """关闭临时文件，文件随之删除（可重复调用）"""
+        with self.lock:
+            if self.mapping is not None:
+                self.mapping.close()
+                self.mapping = None
+            if not self.file.closed:
+                self.file.close()
+
+    def _allocate(self, length):
+        """优先复用足够大的空闲区段，否则追加到文件末尾"""
+        for block in self.free:
+            if block[1] >= length:
+                offset = block[0]
+                block[0] += length
+                block[1] -= length
+                if block[1] == 0:
+                    self.free.remove(block)
+                return offset
+        offset = self.size
+        self.size += length
+        return offset
+
+    def _truncate(self):
+        """把文件截断到有效长度（需要先解除映射）"""
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        self.file.truncate(self.size)
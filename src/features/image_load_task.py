@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+后台图片加载任务模块
+
+用途：
+    在 QThreadPool 中读取并解码图片文件，通过信号报告进度与结果，并支持中途取消。
+
+使用场景：
+    大尺寸 TIFF/PNG 的解码耗时较长，放到后台执行可保持界面响应；
+    打开新图片或按 Esc 时取消正在进行的加载。
+    完整解码超过 LARGE_IMAGE_MEMORY_BUDGET 的图片只解码缩小的预览图，并随结果附带 LargeImageSource；
+    解码器不支持缩放解码时加载失败，并附带 MemoryBudgetError 说明原因。
+"""
+from PySide6.QtCore import QObject, QRunnable, Signal
+from PySide6.QtGui import QImage
+from src.features.image_loader import load_image, MemoryBudgetError
+from src.features.image_mosaic import CancellationToken
+from src.features.large_image import LargeImageSource
+from src.features.pixel_formats import to_working_format
+from src.constants.config import LARGE_IMAGE_MEMORY_BUDGET
+
+
+class ImageLoadTaskSignals(QObject):
+    """后台图片加载任务的信号（QRunnable 不是 QObject，信号需单独承载）"""
+
+    progress = Signal(int)  # 加载进度（0-100，-1 表示解码中、无法细分）
+    finished = Signal(QImage, str, object, object)  # 工作格式的图片、文件路径、解码得到的原始像素格式与 LargeImageSource（非预览图时为 None）
+    cancelled = Signal()  # 任务被取消
+    failed = Signal(str, object)  # 加载失败（文件路径，失败原因的异常；原因未知时为 None）
+
+
+class ImageLoadTask(QRunnable):
+    """后台图片加载任务"""
+
+    def __init__(self, file_path):
+        """
+        初始化后台图片加载任务
+
+        Args:
+            file_path: 图片文件路径
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+        self.file_path = file_path
+        self.token = CancellationToken()
+        self.signals = ImageLoadTaskSignals()
+
+    def cancel(self):
+        """请求取消任务（在当前分块读取完或解码结束后生效）"""
+        self.token.cancel()
+
+    def is_cancelled(self):
+        """检查任务是否已被请求取消"""
+        return self.token.is_cancelled()
+
+    def run(self):
+        """在线程池中读取、解码并归一化图片"""
+        try:
+            image = load_image(self.file_path, normalize=False, progress=self.signals.progress.emit,
+                               cancel_token=self.token, max_bytes=LARGE_IMAGE_MEMORY_BUDGET)
+        except MemoryBudgetError as e:
+            self.signals.failed.emit(self.file_path, e)
+            return
+        if self.token.is_cancelled():
+            self.signals.cancelled.emit()
+            return
+        if image is None:
+            self.signals.failed.emit(self.file_path, None)
+            return
+
+        # 工作格式转换也在后台完成，界面线程只需采用结果
+        source_format = image.format()
+        large_image = LargeImageSource.for_image(self.file_path, image)
+        image = to_working_format(image)
+        if self.token.is_cancelled():
+            self.signals.cancelled.emit()
+        else:
+            self.signals.finished.emit(image, self.file_path, source_format, large_image)
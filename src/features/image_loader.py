@@ -8,18 +8,134 @@
 使用场景：
     被主界面调用，实现图片的打开与保存。
 """
-from PySide6.QtGui import QImage
+import os
+from PySide6.QtGui import QImage, QImageReader, QImageIOHandler
+from PySide6.QtCore import Qt, QByteArray, QBuffer, QIODevice, QSize
+from src.features.pixel_formats import to_working_format, get_working_format
+from src.constants.config import IMAGE_LOAD_CHUNK_BYTES, IMAGE_READER_ALLOCATION_LIMIT_MB, LARGE_IMAGE_PREVIEW_MAX_BYTES
 
-def load_image(file_path: str) -> QImage:
+
+class MemoryBudgetError(ValueError):
+    """解码或写出图片所需的内存超出预算（解码器不支持缩放或区域解码、编码器只接受完整图片时）"""
+
+    def __init__(self, required_bytes, budget_bytes):
+        super().__init__(f"需要约 {required_bytes // 2 ** 20} MB 内存，超出内存预算 {budget_bytes // 2 ** 20} MB")
+        self.required_bytes = required_bytes
+        self.budget_bytes = budget_bytes
+
+
+def apply_allocation_limit(limit_mb: int = IMAGE_READER_ALLOCATION_LIMIT_MB):
+    """
+    设置 QImageReader 单张图片的解码内存上限（全局生效，程序启动时调用一次）。
+    Qt 6 默认拒绝解码超过 256 MB 的图片。
+    参数：
+        limit_mb (int): 上限（MB），0 表示不限制
+    """
+    QImageReader.setAllocationLimit(limit_mb)
+
+def get_image_size(file_path: str) -> QSize:
+    """
+    只读取文件头获取图片的原始尺寸（不解码像素）。
+    参数：
+        file_path (str): 图片文件路径
+    返回：
+        QSize: 图片尺寸，无法识别时为无效尺寸
+    """
+    return QImageReader(file_path).size()
+
+def get_decoded_bytes(size: QSize, fmt: QImage.Format) -> int:
+    """
+    估算图片解码并转换为工作格式后占用的字节数。
+    参数：
+        size (QSize): 图片尺寸
+        fmt (QImage.Format): 文件的像素格式（QImageReader.imageFormat()，未知时按 32 位估算）
+    返回：
+        int: 字节数
+    """
+    depth = 32
+    if fmt != QImage.Format_Invalid:
+        depth = QImage(1, 1, get_working_format(QImage(1, 1, fmt))).depth()
+    return size.width() * size.height() * depth // 8
+
+def _preview_size(size: QSize, decoded_bytes: int, max_bytes: int) -> QSize:
+    """按面积等比缩小，使解码结果不超过 max_bytes"""
+    scale = (max_bytes / decoded_bytes) ** 0.5
+    return QSize(max(1, int(size.width() * scale)), max(1, int(size.height() * scale)))
+
+def load_image(file_path: str, normalize: bool = True, progress=None, cancel_token=None,
+               max_bytes: int | None = None) -> QImage:
     """
     加载图片文件。
+    先分块读取文件内容（可报告进度、可取消），再由 QImageReader 从内存解码；
+    指定 max_bytes 且文件内容与解码结果同时驻留会超出 max_bytes 时，不读入文件，直接从文件解码。
     参数：
         file_path (str): 图片文件路径
+        normalize (bool): 是否转换为马赛克处理的工作格式（见 pixel_formats.get_working_format），
+            加载时转换一次，之后的每次处理都无需再转换
+        progress (callable | None): 进度回调 progress(百分比 0-100)，解码阶段无法细分时报告 -1
+        cancel_token (CancellationToken | None): 取消令牌，取消后返回 None
+        max_bytes (int | None): 完整解码超过该字节数时只返回缩小的预览图（LARGE_IMAGE_PREVIEW_MAX_BYTES 以内），
+            由解码器直接按预览尺寸解码（只有 JPEG 等支持 ScaledSize 的格式可以）。
+            None 表示总是完整解码；调用方可比较返回图片与 get_image_size 的尺寸判断是否为预览图
     返回：
-        QImage: 加载的图片对象
+        QImage: 加载的图片对象，加载失败或被取消时返回 None
+    异常：
+        MemoryBudgetError: 完整解码超过 max_bytes，而解码器不支持缩放解码（PNG、TIFF 等只能完整解码）
     """
-    image = QImage(file_path)
-    return image if not image.isNull() else None
+    header = QImageReader(file_path)
+    decoded_bytes = get_decoded_bytes(header.size(), header.imageFormat()) if header.size().isValid() else 0
+    preview_size = None
+    if max_bytes is not None and decoded_bytes > max_bytes:
+        if not header.supportsOption(QImageIOHandler.ScaledSize):
+            raise MemoryBudgetError(decoded_bytes, max_bytes)
+        preview_size = _preview_size(header.size(), decoded_bytes, min(max_bytes, LARGE_IMAGE_PREVIEW_MAX_BYTES))
+        header.setScaledSize(preview_size)
+        decoded_bytes = get_decoded_bytes(preview_size, header.imageFormat())
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        return None
+    if max_bytes is not None and size + decoded_bytes > max_bytes:
+        # 文件内容读入内存会使峰值超出预算：直接从文件解码，解码阶段无法细分进度
+        reader = header
+    else:
+        data = _read_file(file_path, size, progress, cancel_token)
+        if data is None:
+            return None
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.ReadOnly)
+        reader = QImageReader(buffer)
+        if preview_size is not None:
+            reader.setScaledSize(preview_size)
+
+    if progress is not None:
+        progress(-1)
+    if cancel_token is not None and cancel_token.is_cancelled():
+        return None
+    image = reader.read()
+    if image.isNull() or (cancel_token is not None and cancel_token.is_cancelled()):
+        return None
+    if preview_size is not None and image.size() != preview_size:
+        image = image.scaled(preview_size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    return to_working_format(image) if normalize else image
+
+def _read_file(file_path: str, size: int, progress=None, cancel_token=None):
+    """分块读取文件内容（报告进度、检查取消），返回 QByteArray；读取失败或被取消时返回 None"""
+    try:
+        data = QByteArray()
+        with open(file_path, "rb") as f:
+            while True:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    return None
+                chunk = f.read(IMAGE_LOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                data.append(chunk)
+                if progress is not None and size:
+                    progress(min(data.size() * 100 // size, 100))
+    except OSError:
+        return None
+    return data
 
 def save_image(image: QImage, file_path: str) -> bool:
     """
@@ -7,11 +7,159 @@
 
 使用场景：
     被主界面调用，对用户框选区域应用马赛克。
+
+处理引擎：
+    numpy  - 通过 QImage.bits() 零拷贝访问像素缓冲区，按块广播填充并以数组运算混合强度（默认）
+    qt     - 仅使用 Qt 的 C++ 光栅代码：FastTransformation 缩小/放大后以 QPainter 不透明度合成
+    python - 逐像素的参考实现，未安装 NumPy 时自动回退
+
+像素格式：
+    处理前图片先归一化为工作格式（见 pixel_formats），结果也保持工作格式：
+    RGB32 沿用 QColor 参考语义（结果不透明）；
+    ARGB32_Premultiplied / RGBA64_Premultiplied / Grayscale8 / Grayscale16
+    按通道直接处理，保留透明度与位深。
+
+马赛克核（取色模式）：
+    sample - 每块取左上角像素颜色
+    mean   - 每块取块内像素的平均颜色（numpy 引擎基于积分图，每块 O(1)）
+    blur   - 多次盒式模糊近似的高斯模糊，滑动窗口和使每像素开销与半径无关（见 apply_blur）
+    fill   - 纯色填充（需要 NumPy）
+    noise  - 随机噪声（需要 NumPy）
+    各核通过 register_kernel 注册并共用同一接口（见 MosaicKernel），
+    条带切分、并行、进度、取消、批量处理与实时预览对所有已注册的核一致生效；
+    sample/mean 由上述处理引擎实现，其余核直接读写像素缓冲区，engine 参数对其不生效。
+    apply_mosaic / apply_mosaic_batch 不依赖界面，可在无窗口的脚本中直接调用。
+
+块网格：
+    默认以选区左上角为网格原点（参考实现的行为）；anchored=True 时锚定到图片原点，
+    任意选区的网格都相互对齐，单元颜色只取决于图片内容，可由块颜色缓存（BlockColorCache）
+    在同一编辑代数内复用，重复处理同一区域的结果也保持一致。
 """
-from PySide6.QtGui import QImage, QColor
-from PySide6.QtCore import QRect
+import os
+import sys
+import array
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, lru_cache
+from PySide6.QtGui import QImage, QColor, QPainter, QRegion
+from PySide6.QtCore import Qt, QRect, QPoint
+from src.constants.config import (
+    MOSAIC_WORKER_COUNT, MOSAIC_PARALLEL_MIN_PIXELS, MOSAIC_PROGRESS_STEPS, MOSAIC_BLUR_PASSES, MOSAIC_BLUR_CHUNK_ROWS
+)
+from src.features.pixel_formats import to_working_format, get_channel_layout, get_alpha_channel, channel_array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# 引擎名称
+ENGINE_NUMPY = "numpy"
+ENGINE_QT = "qt"
+ENGINE_PYTHON = "python"
+
+# 马赛克核名称（取色模式）
+MODE_SAMPLE = "sample"
+MODE_MEAN = "mean"
+MODE_BLUR = "blur"
+MODE_FILL = "fill"
+MODE_NOISE = "noise"
+
+# qt 引擎不能直接绘制的灰度工作格式，处理时转换为对应的预乘格式（灰度值可无损往返）
+_QT_WORK_FORMATS = {
+    QImage.Format_Grayscale8: QImage.Format_ARGB32_Premultiplied,
+    QImage.Format_Grayscale16: QImage.Format_RGBA64_Premultiplied,
+}
+
+# QImage.pixel() 对越界坐标返回的固定值
+_OUT_OF_RANGE_PIXEL = 12345
+
+# 32 位像素按字节访问时 R/G/B 三个通道所在的下标
+_COLOR_BYTES = [0, 1, 2] if sys.byteorder == "little" else [1, 2, 3]
 
-def apply_mosaic(image: QImage, rect: QRect, block_size: int = 15, intensity: float = 0.5) -> QImage:
+# Qt 最近邻放大使用 16.16 定点步长，行过长时块边界会漂移；
+# 每次放大的像素跨度控制在该值 / block_size 以内可保证整数倍放大逐块精确
+_QT_UPSCALE_SPAN = 16384
+
+# QPainter 不允许多个线程同时在同一张 QImage 上绘制，qt 引擎写回目标图片时需互斥
+_QT_PAINT_LOCK = threading.Lock()
+
+
+class MosaicCancelled(Exception):
+    """马赛克处理被取消"""
+
+
+class CancellationToken:
+    """
+    取消令牌：由发起方调用 cancel()，处理过程在每个条带/块行之间检查。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """请求取消"""
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        """检查是否已请求取消"""
+        return self._event.is_set()
+
+
+class MosaicKernel:
+    """
+    马赛克（打码）核描述。
+
+    所有核共用同一个缓冲区与矩形接口 process(source, target, rect, area, params)：
+        source - 只读的源图片（工作格式），可以读取 area 以外的像素（如模糊的邻域）
+        target - 被写入的图片（与 source 尺寸相同），核只能修改 area 内的像素
+        rect   - 完整选区（图片坐标系，块网格以其左上角为原点）
+        area   - 本次需要处理的矩形，已裁剪到选区与图片范围内；可切分的核会收到其中一个条带
+        params - 参数字典：block_size / intensity / engine / cache
+    调度代码（条带切分、并行、进度、取消、批量处理与预览）只依据核声明的属性工作。
+    """
+
+    def __init__(self, name, title_key, title, process, thread_safe=True, tileable=True,
+                 block_aligned=False, uses_block_size=True, uses_engine=False, scratch_factor=16):
+        """
+        初始化马赛克核描述
+
+        Args:
+            name: 核名称（即 apply_mosaic 的 mode 参数）
+            title_key: 界面显示名称的翻译键
+            title: 默认显示名称
+            process: 处理函数 process(source, target, rect, area, params)
+            thread_safe: 多个条带能否在不同线程中同时处理
+            tileable: 能否按水平条带切分处理；否则整个区域一次处理
+            block_aligned: 处理范围与条带边界是否按块网格对齐（沿用参考实现的块裁剪规则）
+            uses_block_size: 是否使用块大小参数（界面据此启用块大小控件）
+            uses_engine: 是否由 numpy/qt/python 引擎实现（engine 参数只对这类核生效）
+            scratch_factor: 处理时临时数据的峰值占处理范围像素字节数的倍数（不含图片本身的副本），
+                分条带处理超大图片时据此计算条带的内存开销
+        """
+        self.name = name
+        self.title_key = title_key
+        self.title = title
+        self.process = process
+        self.thread_safe = thread_safe
+        self.tileable = tileable
+        self.block_aligned = block_aligned
+        self.uses_block_size = uses_block_size
+        self.uses_engine = uses_engine
+        self.scratch_factor = scratch_factor
+
+
+def _check_cancelled(cancel_token):
+    """已请求取消时抛出 MosaicCancelled"""
+    if cancel_token is not None and cancel_token.is_cancelled():
+        raise MosaicCancelled()
+
+
+def apply_mosaic(image: QImage, rect: QRect, block_size: int = 15, intensity: float = 0.5,
+                 engine: str | None = None, mode: str = MODE_SAMPLE, cache=None,
+                 workers: int | None = None, progress=None, cancel_token=None,
+                 anchored: bool = False, color_cache=None,
+                 seed: int | None = None) -> QImage:
     """
     对指定矩形区域应用马赛克效果。
     参数：
@@ -19,19 +167,291 @@ def apply_mosaic(image: QImage, rect: QRect, block_size: int = 15, intensity: fl
         rect (QRect): 需要马赛克的区域（图片坐标系）
         block_size (int): 马赛克块大小，默认15
         intensity (float): 马赛克强度，0.0-1.0，控制原始颜色和马赛克颜色的混合比例
+        engine (str | None): 处理引擎名称（"numpy"/"qt"/"python"），见 available_engines()；None 表示自动选择
+        mode (str): 马赛克核名称，见 available_kernels()；"sample" 取块左上角像素，"mean" 取块内平均颜色
+        cache (IntegralImageCache | None): 与 image 绑定的积分图缓存，mean 模式下由 numpy 引擎复用
+        workers (int | None): 并行线程数，None 使用配置 MOSAIC_WORKER_COUNT，0 表示按 CPU 核心数
+        progress (callable | None): 进度回调 progress(百分比 0-100)，可能在工作线程中调用
+        cancel_token (CancellationToken | None): 取消令牌，取消后抛出 MosaicCancelled
+        anchored (bool): 块网格是否锚定到图片原点（sample/mean 核有效），False 时以选区左上角为原点
+        color_cache (BlockColorCache | None): 与 image 绑定的块颜色缓存，网格锚定时复用已计算的单元颜色
+        seed (int | None): 随机种子（noise 核有效），相同种子与参数的处理结果完全相同；None 表示每次随机
     返回：
-        QImage: 处理后的图片
+        QImage: 处理后的图片（工作格式，见 pixel_formats.get_working_format）
     使用示例：
         new_img = apply_mosaic(image, QRect(10,10,100,100), 20, 0.7)
+        new_img = apply_mosaic(image, QRect(10,10,100,100), 20, 0.7, mode="mean")
+        new_img = apply_mosaic(image, QRect(10,10,100,100), 20, 1.0, mode="blur")  # 同 apply_blur
     """
     if image is None or rect is None:
         return image
-    img = image.copy()
-    for y in range(rect.top(), rect.bottom(), block_size):
+    return apply_mosaic_batch(image, [rect], block_size, intensity, engine=engine, mode=mode, cache=cache,
+                              workers=workers, progress=progress, cancel_token=cancel_token,
+                              anchored=anchored, color_cache=color_cache, seed=seed)
+
+
+def apply_mosaic_batch(image: QImage, rects, block_size: int = 15, intensity: float = 0.5,
+                       engine: str | None = None, mode: str = MODE_SAMPLE, cache=None,
+                       workers: int | None = None, progress=None, cancel_token=None,
+                       anchored: bool = False, color_cache=None,
+                       seed: int | None = None, row_offset: int = 0) -> QImage:
+    """
+    对多个矩形区域一次性应用马赛克效果。
+    相交的矩形先由 coalesce_rects 切分为互不相交、恰好覆盖选区并集的矩形，
+    依次写入同一份图片副本：每个像素只处理一次，整批处理只复制一次图片，调用方也只需记录一次历史。
+    参数：
+        image (QImage): 原始图片
+        rects (list[QRect]): 需要马赛克的区域列表（图片坐标系）
+        row_offset (int): image 为大图中从第 row_offset 行开始的水平条带时（分条带处理超大图片），
+            noise 核按大图中的行号生成随机数，结果与整图处理一致
+        其余参数与 apply_mosaic 相同；progress 按各区域面积汇总为整批进度
+    返回：
+        QImage: 处理后的图片（工作格式；没有有效区域时不复制，原图已是工作格式则直接返回原图）
+    使用示例：
+        new_img = apply_mosaic_batch(image, [QRect(10,10,100,20), QRect(10,40,100,20)], 20, 0.7)
+    """
+    if engine is None:
+        engine = get_default_engine()
+    if engine not in MOSAIC_ENGINES:
+        raise ValueError(f"未知的马赛克引擎: {engine}")
+    kernel = get_kernel(mode)
+    merged = coalesce_rects(rects or [])
+    if image is None or not merged:
+        return to_working_format(image)
+
+    # 源图片在处理过程中保持只读（模糊等核需要读取未被修改的邻域），结果写入一份副本
+    source = to_working_format(image)
+    working_format = source.format()
+    engine_backed = kernel.uses_engine and not (anchored and np is not None)
+    if engine_backed and engine == ENGINE_QT and working_format in _QT_WORK_FORMATS:
+        target = source.convertToFormat(_QT_WORK_FORMATS[working_format])
+    else:
+        target = source.copy()
+    if source is not image:
+        # 转换后的图片与缓存绑定的图片不同，缓存不可用
+        cache = color_cache = None
+
+    params = {"block_size": block_size, "intensity": intensity, "engine": engine, "cache": cache,
+              "anchored": anchored, "color_cache": color_cache, "seed": seed, "row_offset": row_offset}
+    workers = _resolve_workers(workers) if kernel.thread_safe else 1
+    total = sum(rect.width() * rect.height() for rect in merged)
+    done = 0
+    for rect in merged:
+        _check_cancelled(cancel_token)
+        area = rect.width() * rect.height()
+        report = None
+        if progress is not None:
+            report = lambda percent, done=done, area=area: progress((done * 100 + percent * area) // total)
+        _apply_kernel(kernel, source, target, rect, params, workers, report, cancel_token)
+        done += area
+    return target if target.format() == working_format else target.convertToFormat(working_format)
+
+
+def _apply_kernel(kernel: MosaicKernel, source: QImage, target: QImage, rect: QRect, params: dict,
+                  workers: int, progress=None, cancel_token=None):
+    """
+    按核声明的属性调度单个选区的处理：
+    计算实际处理范围，可切分的核按水平条带（块对齐的核按块行对齐）交给 _run_stripes，
+    线程安全的核才会在多个线程中并行；不可切分的核整个区域一次处理。
+    """
+    width, height = target.width(), target.height()
+    if kernel.block_aligned and params["anchored"]:
+        # 网格锚定到图片原点：处理范围即选区与图片的交集，条带按全局块行对齐
+        clipped = rect.intersected(QRect(0, 0, width, height))
+        x0, x1 = clipped.left(), clipped.right() + 1
+        y0, y1 = clipped.top(), clipped.bottom() + 1
+        origin, step = 0, params["block_size"]
+    elif kernel.block_aligned:
+        block_size = params["block_size"]
+        count_x, x0, x1 = _block_span(rect.left(), rect.right(), block_size, width)
+        count_y, y0, y1 = _block_span(rect.top(), rect.bottom(), block_size, height)
+        if count_x == 0 or count_y == 0:
+            return
+        origin, step = rect.top(), block_size
+    else:
+        clipped = rect.intersected(QRect(0, 0, width, height))
+        x0, x1 = clipped.left(), clipped.right() + 1
+        y0, y1 = clipped.top(), clipped.bottom() + 1
+        origin, step = y0, 1
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    if not kernel.tileable:
+        _check_cancelled(cancel_token)
+        kernel.process(source, target, rect, QRect(x0, y0, x1 - x0, y1 - y0), params)
+        if progress is not None:
+            progress(100)
+        return
+    _run_stripes(lambda top, bottom: kernel.process(source, target, rect, QRect(x0, top, x1 - x0, bottom - top),
+                                                    params),
+                 origin, step, y0, y1, x1 - x0, workers, progress, cancel_token)
+
+
+def apply_blur(image: QImage, rect: QRect, block_size: int = 15, intensity: float = 0.5,
+               workers: int | None = None, progress=None, cancel_token=None) -> QImage:
+    """
+    对指定矩形区域应用模糊效果（blur 核，参数与 apply_mosaic 相同）。
+    以 MOSAIC_BLUR_PASSES 次盒式模糊近似 sigma = block_size / 2 的高斯模糊，
+    每次盒式模糊按行、列以滑动窗口和计算，每像素开销与模糊半径无关。
+    参数：
+        image (QImage): 原始图片
+        rect (QRect): 需要模糊的区域（图片坐标系）
+        block_size (int): 模糊强度（高斯 sigma 的两倍，与马赛克块大小的视觉尺度相当）
+        intensity (float): 模糊结果与原始颜色的混合比例，0.0-1.0
+        workers / progress / cancel_token: 与 apply_mosaic 相同
+    返回：
+        QImage: 处理后的图片（工作格式）
+    使用示例：
+        new_img = apply_blur(image, QRect(10,10,100,100), 20, 1.0)
+    """
+    return apply_mosaic(image, rect, block_size, intensity, mode=MODE_BLUR, workers=workers,
+                        progress=progress, cancel_token=cancel_token)
+
+
+def coalesce_rects(rects) -> list:
+    """
+    将可能相交的矩形切分为两两不相交的矩形，覆盖范围恰好等于原矩形的并集。
+    按顺序处理：与已有矩形不相交的矩形保持原样（块网格原点不变），
+    相交的矩形只保留尚未被覆盖的部分，由 QRegion 按水平带切分为若干矩形。
+    每个像素只处理一次，也不会处理选区以外的像素；对结果再次调用得到相同的矩形。
+    参数：
+        rects (list[QRect]): 矩形列表，无效矩形会被忽略
+    返回：
+        list[QRect]: 两两不相交的矩形列表，按从上到下、从左到右排序
+    """
+    covered = QRegion()
+    pieces = []
+    for rect in rects:
+        if rect is None:
+            continue
+        current = QRect(rect).normalized()
+        if not current.isValid():
+            continue
+        if covered.intersects(current):
+            pieces.extend(QRegion(current).subtracted(covered))
+        else:
+            pieces.append(current)
+        covered += current
+    return sorted(pieces, key=lambda r: (r.top(), r.left()))
+
+
+def register_kernel(kernel: MosaicKernel) -> MosaicKernel:
+    """
+    注册马赛克核（同名的核会被替换），注册后即可通过 mode 参数使用并出现在界面的模式列表中。
+    参数：
+        kernel (MosaicKernel): 核描述
+    返回：
+        MosaicKernel: 注册的核
+    """
+    MOSAIC_KERNELS[kernel.name] = kernel
+    return kernel
+
+
+def get_kernel(name: str) -> MosaicKernel:
+    """
+    按名称获取已注册的马赛克核。
+    参数：
+        name (str): 核名称
+    返回：
+        MosaicKernel: 核描述；名称未注册时抛出 ValueError
+    """
+    kernel = MOSAIC_KERNELS.get(name)
+    if kernel is None:
+        raise ValueError(f"未知的马赛克模式: {name}")
+    return kernel
+
+
+def get_read_margin(mode: str, block_size: int) -> int:
+    """
+    获取核在选区以外读取的邻域宽度（像素）。
+    分条带处理时，条带边界距选区至少该宽度（或落在图片边界上），结果才与整图处理一致。
+    参数：
+        mode (str): 马赛克核名称
+        block_size (int): 块大小
+    返回：
+        int: 邻域宽度，只读取选区内像素的核为 0
+    """
+    if mode == MODE_BLUR:
+        return sum(_blur_radii(block_size, MOSAIC_BLUR_PASSES))
+    return 0
+
+
+def get_scratch_bytes(mode: str, pixel_bytes: int) -> int:
+    """
+    获取核处理每个像素时临时数据（NumPy 临时数组、Python 列表等）的峰值字节数，不含图片本身的副本。
+    分条带处理时，条带每行的内存开销须计入该值。
+    参数：
+        mode (str): 马赛克核名称
+        pixel_bytes (int): 工作格式每像素的字节数
+    返回：
+        int: 每像素的临时数据字节数
+    """
+    return get_kernel(mode).scratch_factor * pixel_bytes
+
+
+def available_kernels() -> list:
+    """
+    获取当前环境可用的马赛克核列表（按注册顺序）。
+    返回：
+        list[MosaicKernel]: 核描述列表
+    """
+    return list(MOSAIC_KERNELS.values())
+
+
+def available_engines() -> list:
+    """
+    获取当前环境可用的处理引擎名称列表。
+    返回：
+        list: 引擎名称列表
+    """
+    return list(MOSAIC_ENGINES.keys())
+
+
+def get_default_engine() -> str:
+    """
+    获取默认处理引擎：已安装 NumPy 时使用 numpy 引擎，否则回退到逐像素的 python 参考实现。
+    两者的结果逐像素一致；qt 引擎更快，但强度混合与参考实现每通道最多相差 2，只用于预览。
+    返回：
+        str: 引擎名称
+    """
+    return ENGINE_NUMPY if np is not None else ENGINE_PYTHON
+
+
+def get_preview_engine() -> str:
+    """
+    获取实时预览使用的处理引擎：已安装 NumPy 时与最终结果相同，
+    否则使用 qt 引擎（预览只在显示分辨率下近似显示，逐像素的参考实现无法跟上拖动）。
+    返回：
+        str: 引擎名称
+    """
+    return ENGINE_NUMPY if np is not None else ENGINE_QT
+
+
+def _apply_mosaic_python(image: QImage, rect: QRect, block_size: int, intensity: float,
+                         mode: str = MODE_SAMPLE, cache=None, workers: int | None = None,
+                         progress=None, cancel_token=None, target: QImage | None = None) -> QImage:
+    """
+    逐像素的参考实现：每块取左上角像素颜色（或块内平均颜色），再按强度与原色混合。
+    提供 target 时直接在 target 上修改（批量处理共用一份副本），否则先复制 image。
+    RGB32 逐像素经过 QColor；其它工作格式直接读写像素缓冲区的各通道。
+    """
+    img = image.copy() if target is None else target
+    if img.format() != QImage.Format_RGB32:
+        return _apply_mosaic_python_channels(img, rect, block_size, intensity, mode, progress, cancel_token)
+    rows = range(rect.top(), rect.bottom(), block_size)
+    for row, y in enumerate(rows):
+        _check_cancelled(cancel_token)
+        if progress is not None:
+            progress(row * 100 // len(rows))
         for x in range(rect.left(), rect.right(), block_size):
-            # 取块左上角像素颜色作为马赛克颜色
-            mosaic_color = QColor(img.pixel(x, y))
-            
+            if mode == MODE_MEAN:
+                mosaic_color = _block_mean_python(img, rect, x, y, block_size)
+                if mosaic_color is None:
+                    continue
+            else:
+                # 取块左上角像素颜色作为马赛克颜色
+                mosaic_color = QColor(img.pixel(x, y))
+
             for dy in range(block_size):
                 for dx in range(block_size):
                     px = x + dx
@@ -39,7 +459,7 @@ def apply_mosaic(image: QImage, rect: QRect, block_size: int = 15, intensity: fl
                     if rect.contains(px, py) and px < img.width() and py < img.height():
                         # 获取原始颜色
                         original_color = QColor(img.pixel(px, py))
-                        
+
                         # 根据强度进行颜色混合
                         if intensity >= 1.0:
                             # 完全马赛克
@@ -53,6 +473,902 @@ def apply_mosaic(image: QImage, rect: QRect, block_size: int = 15, intensity: fl
                             g = int(original_color.green() * (1 - intensity) + mosaic_color.green() * intensity)
                             b = int(original_color.blue() * (1 - intensity) + mosaic_color.blue() * intensity)
                             final_color = QColor(r, g, b)
-                        
+
                         img.setPixel(px, py, final_color.rgb())
-    return img
\ No newline at end of file
+    return img
+
+
+def _apply_mosaic_python_channels(img: QImage, rect: QRect, block_size: int, intensity: float,
+                                  mode: str, progress=None, cancel_token=None) -> QImage:
+    """
+    按通道逐像素处理工作格式（预乘 ARGB、16 位、灰度）的图片，直接在 img 上修改。
+    所有通道（含预乘 alpha）一起取色与混合，透明度和位深得以保留；
+    混合与平均的取整方式与 RGB32 参考实现相同。锚点在图片外的块取全 0 颜色。
+    """
+    dtype, channels, _used = get_channel_layout(img.format())
+    buffer = img.bits().cast("H" if dtype == "uint16" else "B")
+    stride = img.bytesPerLine() // buffer.itemsize
+    count_x, x0, x1 = _block_span(rect.left(), rect.right(), block_size, img.width())
+    count_y, y0, y1 = _block_span(rect.top(), rect.bottom(), block_size, img.height())
+
+    for row in range(count_y):
+        _check_cancelled(cancel_token)
+        if progress is not None:
+            progress(row * 100 // count_y)
+        y = rect.top() + row * block_size
+        top, bottom = max(y, y0), min(y + block_size, y1)
+        for col in range(count_x):
+            x = rect.left() + col * block_size
+            left, right = max(x, x0), min(x + block_size, x1)
+            if top >= bottom or left >= right:
+                continue
+
+            if mode == MODE_MEAN:
+                totals = [0] * channels
+                for py in range(top, bottom):
+                    for offset in range(py * stride + left * channels, py * stride + right * channels, channels):
+                        for c in range(channels):
+                            totals[c] += buffer[offset + c]
+                count = (bottom - top) * (right - left)
+                mosaic_color = [total // count for total in totals]
+            elif x >= 0 and y >= 0:
+                offset = y * stride + x * channels
+                mosaic_color = list(buffer[offset:offset + channels])
+            else:
+                mosaic_color = [0] * channels
+
+            if intensity <= 0.0:
+                continue
+            for py in range(top, bottom):
+                for offset in range(py * stride + left * channels, py * stride + right * channels, channels):
+                    for c in range(channels):
+                        if intensity >= 1.0:
+                            buffer[offset + c] = mosaic_color[c]
+                        else:
+                            buffer[offset + c] = int(buffer[offset + c] * (1 - intensity)
+                                                     + mosaic_color[c] * intensity)
+    return img
+
+
+def _block_mean_python(img: QImage, rect: QRect, x: int, y: int, block_size: int):
+    """
+    计算单个块在选区与图片范围内像素的平均颜色（各通道向下取整）。
+    返回：
+        QColor | None: 平均颜色，块内没有有效像素时返回 None
+    """
+    total_r = total_g = total_b = count = 0
+    for py in range(max(y, 0), min(y + block_size, img.height())):
+        for px in range(max(x, 0), min(x + block_size, img.width())):
+            if rect.contains(px, py):
+                color = QColor(img.pixel(px, py))
+                total_r += color.red()
+                total_g += color.green()
+                total_b += color.blue()
+                count += 1
+    if count == 0:
+        return None
+    return QColor(total_r // count, total_g // count, total_b // count)
+
+
+def _block_span(start: int, end: int, block_size: int, limit: int):
+    """
+    计算参考实现沿一个方向实际处理的像素范围。
+    块起点为 range(start, end, block_size)，最后一块不会越过 end（含）与图片边界。
+    返回：
+        tuple: (块数量, 处理起点, 处理终点(不含))
+    """
+    count = len(range(start, end, block_size))
+    stop = min(start + count * block_size, end + 1, limit)
+    return count, max(start, 0), stop
+
+
+def _block_edges(origin: int, count: int, block_size: int, start: int, stop: int):
+    """
+    计算每个块沿一个方向在处理范围 [start, stop) 内的边界（相对 start）。
+    返回：
+        ndarray: 长度为 count + 1 的边界数组，第 i 块覆盖 [edges[i], edges[i+1])
+    """
+    edges = origin + np.arange(count + 1) * block_size
+    return np.clip(edges, start, stop) - start
+
+
+def _block_means_numpy(image: QImage, region, origin_x: int, origin_y: int, block_size: int,
+                       count_x: int, count_y: int, x0: int, y0: int, cache=None):
+    """
+    基于积分图（summed-area table）计算 RGB32 图片每块的平均颜色。
+    提供 cache 时改用其中按图片缓存的分块积分图，任意块大小都无需重新扫描像素。
+    参数：
+        region: 处理范围 [x0, x0+宽) × [y0, y0+高) 的 uint32 像素视图
+        origin_x, origin_y: 第 0 列/第 0 行块的起点（图片坐标）
+    返回：
+        ndarray: 形状为 (count_y, count_x) 的 uint32 块颜色（不透明）
+    """
+    height, width = region.shape
+    edges_x = _block_edges(origin_x, count_x, block_size, x0, x0 + width)
+    edges_y = _block_edges(origin_y, count_y, block_size, y0, y0 + height)
+
+    if cache is not None and cache.supports(image):
+        sums = cache.block_sums(image, edges_x + x0, edges_y + y0)
+    else:
+        channels = region.view(np.uint8).reshape(height, width, 4)[:, :, _COLOR_BYTES]
+        sums = _sat_block_sums(channels, edges_x, edges_y)
+
+    colors = np.full((count_y, count_x, 4), 0xFF, dtype=np.uint8)
+    colors[:, :, _COLOR_BYTES] = _sums_to_means(sums, edges_x, edges_y, np.uint8)
+    return colors.view(np.uint32).reshape(count_y, count_x)
+
+
+def _block_means_channels(image: QImage, region, origin_x: int, origin_y: int, block_size: int,
+                          count_x: int, count_y: int, x0: int, y0: int, cache=None):
+    """
+    按通道计算工作格式图片每块的平均值（各通道向下取整，含预乘 alpha）。
+    参数：
+        region: 处理范围的 (高, 宽, 通道数) 像素视图
+        其余参数同 _block_means_numpy
+    返回：
+        ndarray: 形状为 (count_y, count_x, 通道数)、类型与 region 相同的块颜色
+    """
+    height, width = region.shape[:2]
+    edges_x = _block_edges(origin_x, count_x, block_size, x0, x0 + width)
+    edges_y = _block_edges(origin_y, count_y, block_size, y0, y0 + height)
+    if cache is not None and cache.supports(image):
+        sums = cache.block_sums(image, edges_x + x0, edges_y + y0)
+    else:
+        sums = _sat_block_sums(region, edges_x, edges_y)
+    return _sums_to_means(sums, edges_x, edges_y, region.dtype)
+
+
+def _sat_block_sums(channels, edges_x, edges_y):
+    """
+    用积分图求每块各通道的像素和。
+    8 位通道的积分图以 uint32 存储并允许回绕：单块像素和远小于 2^32，
+    四角相减在模 2^32 意义下仍得到精确的块内和；16 位通道改用 uint64。
+    """
+    height, width, count = channels.shape
+    dtype = np.uint64 if channels.dtype == np.uint16 else np.uint32
+    table = np.zeros((height + 1, width + 1, count), dtype=dtype)
+    np.cumsum(channels, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, dtype=dtype, out=table[1:, 1:])
+    top, bottom = edges_y[:-1, None], edges_y[1:, None]
+    left, right = edges_x[None, :-1], edges_x[None, 1:]
+    return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+
+def _sums_to_means(sums, edges_x, edges_y, dtype):
+    """块内像素和除以块面积（向下取整）得到平均值"""
+    areas = (np.diff(edges_y)[:, None] * np.diff(edges_x)[None, :]).astype(sums.dtype)
+    # 完全落在处理范围外的块不会被用到，面积按 1 处理以避免除零
+    return (sums // np.maximum(areas, 1)[:, :, None]).astype(dtype)
+
+
+@lru_cache(maxsize=16)
+def _blend_table(intensity: float):
+    """
+    生成强度混合查找表：table[(原色 << 8) | 马赛克色] = int(原色 * (1 - 强度) + 马赛克色 * 强度)。
+    查表与参考实现使用完全相同的浮点表达式，结果逐值一致，但每像素只需一次查表。
+    按 32 行分段计算，浮点中间数组只有 64 KB；同一强度的表被缓存（只读共享）。
+    """
+    values = np.arange(256, dtype=np.float64)
+    table = np.empty((256, 256), dtype=np.uint8)
+    for start in range(0, 256, 32):
+        table[start:start + 32] = values[start:start + 32, None] * (1 - intensity) + values[None, :] * intensity
+    table.flags.writeable = False
+    return table.ravel()
+
+
+def _blend_into(region, mosaic, intensity: float):
+    """
+    按强度将 mosaic 混合写入 region（mosaic 可广播到 region 的形状）。
+    8 位通道用查找表，16 位通道用与参考实现相同的浮点表达式。
+    """
+    if intensity >= 1.0:
+        region[...] = mosaic
+    elif intensity <= 0.0:
+        return
+    elif region.dtype == np.uint8:
+        region[...] = np.take(_blend_table(intensity), (region.astype(np.uint16) << 8) | mosaic)
+    else:
+        region[...] = (region * (1 - intensity) + mosaic * intensity).astype(region.dtype)
+
+
+def _resolve_workers(workers: int | None) -> int:
+    """
+    解析工作线程数：None 使用配置值，0 表示按 CPU 核心数自动选择。
+    """
+    if workers is None:
+        workers = MOSAIC_WORKER_COUNT
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+def _run_stripes(kernel, origin: int, block_size: int, start: int, stop: int, row_pixels: int, workers: int,
+                 progress=None, cancel_token=None):
+    """
+    将处理范围 [start, stop) 按块行对齐切分为水平条带并行处理。
+    条带边界总是落在块边界上，各条带互不重叠，拼接结果与单线程处理完全一致。
+    需要报告进度或支持取消时会切分出更多条带，每完成一个条带报告一次进度，
+    每个条带开始前检查一次取消令牌。
+    参数：
+        kernel: 处理单个条带的函数 kernel(条带起始行, 条带结束行)，返回值按条带顺序收集
+        origin: 第 0 行块的起点（图片坐标）
+        row_pixels: 每行处理的像素数，用于判断选区是否大到值得并行
+        workers: 工作线程数
+        progress: 进度回调 progress(百分比)
+        cancel_token: 取消令牌
+    返回：
+        list: [(条带起始行, 条带结束行, kernel 返回值), ...]
+    """
+    first_row = (start - origin) // block_size
+    last_row = (stop - origin + block_size - 1) // block_size
+    rows = last_row - first_row
+    if row_pixels * (stop - start) < MOSAIC_PARALLEL_MIN_PIXELS:
+        workers = 1
+    parts = workers if progress is None and cancel_token is None else max(workers, MOSAIC_PROGRESS_STEPS)
+    parts = max(1, min(parts, rows))
+
+    bounds = [first_row + rows * i // parts for i in range(parts + 1)]
+    stripes = [(max(origin + bounds[i] * block_size, start), min(origin + bounds[i + 1] * block_size, stop))
+               for i in range(parts)]
+    lock = threading.Lock()
+    done = [0]
+
+    def run(stripe):
+        _check_cancelled(cancel_token)
+        result = kernel(*stripe)
+        if progress is not None:
+            with lock:
+                done[0] += 1
+                progress(done[0] * 100 // parts)
+        return result
+
+    if workers <= 1 or parts <= 1:
+        results = [run(stripe) for stripe in stripes]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, parts)) as pool:
+            results = list(pool.map(run, stripes))
+    return [(top, bottom, result) for (top, bottom), result in zip(stripes, results)]
+
+
+def _numpy_stripe(image: QImage, pixels, rect: QRect, block_size: int, intensity: float,
+                  x0: int, x1: int, y0: int, y1: int, count_x: int, block_colors=None):
+    """
+    处理 [x0, x1) × [y0, y1) 条带（y0 位于块边界或处理范围起点）。
+    block_colors 为 None 时在条带内自行计算块平均颜色；
+    NumPy 的数组运算会释放 GIL，多个条带可以真正并行。
+    """
+    first_row = (y0 - rect.top()) // block_size
+    last_row = (y1 - rect.top() + block_size - 1) // block_size
+    origin_y = rect.top() + first_row * block_size
+    region = pixels[y0:y1, x0:x1]
+    if block_colors is None:
+        colors = _block_means_numpy(image, region, rect.left(), origin_y, block_size,
+                                    count_x, last_row - first_row, x0, y0)
+    else:
+        colors = block_colors[first_row:last_row]
+
+    # 块颜色按块大小整数倍展开，再截取实际处理范围
+    offset_x, offset_y = x0 - rect.left(), y0 - origin_y
+    mosaic = np.repeat(np.repeat(colors, block_size, axis=0), block_size, axis=1)
+    mosaic = mosaic[offset_y:offset_y + y1 - y0, offset_x:offset_x + x1 - x0]
+
+    if intensity >= 1.0:
+        blended = mosaic
+    elif intensity <= 0.0:
+        blended = region
+    else:
+        original = region.view(np.uint8).astype(np.uint16)
+        colors = mosaic.view(np.uint8)
+        blended = np.take(_blend_table(intensity), (original << 8) | colors).view(np.uint32)
+
+    # QColor.rgb() 总是返回不透明颜色
+    region[...] = blended | np.uint32(0xFF000000)
+
+
+def _apply_mosaic_numpy(image: QImage, rect: QRect, block_size: int, intensity: float,
+                        mode: str = MODE_SAMPLE, cache=None, workers: int | None = None,
+                        progress=None, cancel_token=None, target: QImage | None = None) -> QImage:
+    """
+    NumPy 向量化实现，结果与参考实现逐像素一致。
+    像素缓冲区通过 QImage.bits() 以零拷贝方式视作 uint32 数组，
+    块颜色通过广播一次性展开，强度混合以整块数组运算完成；
+    大选区按块对齐的水平条带在线程池中并行处理。
+    RGB32 按 uint32 整像素处理，其它工作格式交给 _apply_mosaic_numpy_channels。
+    """
+    img = image.copy() if target is None else target
+    if img.format() != QImage.Format_RGB32:
+        return _apply_mosaic_numpy_channels(image, img, rect, block_size, intensity, mode, cache,
+                                            workers, progress, cancel_token)
+
+    width, height = img.width(), img.height()
+    count_x, x0, x1 = _block_span(rect.left(), rect.right(), block_size, width)
+    count_y, y0, y1 = _block_span(rect.top(), rect.bottom(), block_size, height)
+    if count_x == 0 or count_y == 0 or x0 >= x1 or y0 >= y1:
+        return img
+
+    # 零拷贝视图：每行可能包含对齐填充，按 bytesPerLine 取行后再截取有效宽度
+    pixels = np.frombuffer(img.bits(), dtype=np.uint32).reshape(height, img.bytesPerLine() // 4)[:, :width]
+
+    block_colors = None
+    if mode == MODE_MEAN:
+        if cache is not None and cache.supports(image):
+            # 在当前线程一次性从缓存取出全部块平均颜色，各条带无需再争用缓存锁
+            block_colors = _block_means_numpy(image, pixels[y0:y1, x0:x1], rect.left(), rect.top(),
+                                              block_size, count_x, count_y, x0, y0, cache)
+    else:
+        # 每块左上角像素颜色；与 QImage.pixel 一致，图片外的锚点取越界返回值
+        anchor_x = np.arange(count_x) * block_size + rect.left()
+        anchor_y = np.arange(count_y) * block_size + rect.top()
+        valid_x = (anchor_x >= 0) & (anchor_x < width)
+        valid_y = (anchor_y >= 0) & (anchor_y < height)
+        block_colors = np.full((count_y, count_x), _OUT_OF_RANGE_PIXEL, dtype=np.uint32)
+        block_colors[np.ix_(valid_y, valid_x)] = pixels[np.ix_(anchor_y[valid_y], anchor_x[valid_x])]
+
+    _run_stripes(lambda top, bottom: _numpy_stripe(image, pixels, rect, block_size, intensity,
+                                                   x0, x1, top, bottom, count_x, block_colors),
+                 rect.top(), block_size, y0, y1, x1 - x0, _resolve_workers(workers), progress, cancel_token)
+    return img
+
+
+def _numpy_channel_stripe(image: QImage, array, rect: QRect, block_size: int, intensity: float,
+                          x0: int, x1: int, y0: int, y1: int, count_x: int, block_colors=None):
+    """
+    按通道处理 [x0, x1) × [y0, y1) 条带，与 _numpy_stripe 相同但保留全部通道（含预乘 alpha）。
+    8 位通道用查找表混合，16 位通道用与参考实现相同的浮点表达式。
+    """
+    first_row = (y0 - rect.top()) // block_size
+    last_row = (y1 - rect.top() + block_size - 1) // block_size
+    origin_y = rect.top() + first_row * block_size
+    region = array[y0:y1, x0:x1]
+    if block_colors is None:
+        colors = _block_means_channels(image, region, rect.left(), origin_y, block_size,
+                                       count_x, last_row - first_row, x0, y0)
+    else:
+        colors = block_colors[first_row:last_row]
+
+    offset_x, offset_y = x0 - rect.left(), y0 - origin_y
+    mosaic = np.repeat(np.repeat(colors, block_size, axis=0), block_size, axis=1)
+    mosaic = mosaic[offset_y:offset_y + y1 - y0, offset_x:offset_x + x1 - x0]
+
+    _blend_into(region, mosaic, intensity)
+
+
+def _apply_mosaic_numpy_channels(image: QImage, img: QImage, rect: QRect, block_size: int, intensity: float,
+                                 mode: str, cache=None, workers: int | None = None,
+                                 progress=None, cancel_token=None) -> QImage:
+    """
+    NumPy 按通道处理工作格式（预乘 ARGB、16 位、灰度）的图片，结果与 _apply_mosaic_python_channels 逐值一致。
+    image 为源图片（用于匹配积分图缓存），img 为被修改的副本。
+    """
+    count_x, x0, x1 = _block_span(rect.left(), rect.right(), block_size, img.width())
+    count_y, y0, y1 = _block_span(rect.top(), rect.bottom(), block_size, img.height())
+    if count_x == 0 or count_y == 0 or x0 >= x1 or y0 >= y1:
+        return img
+
+    array = channel_array(img, writable=True)
+    block_colors = None
+    if mode == MODE_MEAN:
+        if cache is not None and cache.supports(image):
+            block_colors = _block_means_channels(image, array[y0:y1, x0:x1], rect.left(), rect.top(),
+                                                 block_size, count_x, count_y, x0, y0, cache)
+    else:
+        # 每块左上角像素的各通道；图片外的锚点取全 0
+        anchor_x = np.arange(count_x) * block_size + rect.left()
+        anchor_y = np.arange(count_y) * block_size + rect.top()
+        valid_x = (anchor_x >= 0) & (anchor_x < img.width())
+        valid_y = (anchor_y >= 0) & (anchor_y < img.height())
+        block_colors = np.zeros((count_y, count_x, array.shape[2]), dtype=array.dtype)
+        block_colors[np.ix_(valid_y, valid_x)] = array[np.ix_(anchor_y[valid_y], anchor_x[valid_x])]
+
+    _run_stripes(lambda top, bottom: _numpy_channel_stripe(image, array, rect, block_size, intensity,
+                                                           x0, x1, top, bottom, count_x, block_colors),
+                 rect.top(), block_size, y0, y1, x1 - x0, _resolve_workers(workers), progress, cancel_token)
+    return img
+
+
+def _uniform_segments(origin: int, count: int, block_size: int, start: int, stop: int):
+    """
+    将处理范围 [start, stop) 按块宽度相同的连续块分段：首尾被裁剪的块单独成段。
+    返回：
+        list: [(起始像素, 像素长度, 起始块下标, 块数量), ...]，像素位置相对 start
+    """
+    segments = []
+    index = 0
+    while index < count:
+        begin = max(origin + index * block_size, start)
+        end = min(origin + (index + 1) * block_size, stop)
+        if end <= begin:
+            index += 1
+            continue
+        run = 1
+        if end - begin == block_size:
+            # 合并连续的完整块
+            run = max(1, min(count - index, (stop - begin) // block_size))
+        segments.append((begin - start, run * (end - begin), index, run))
+        index += run
+    return segments
+
+
+def _qt_block_means(img: QImage, origin_x: int, origin_y: int, block_size: int, count_x: int, count_y: int,
+                    x0: int, y0: int, x1: int, y1: int) -> QImage:
+    """
+    用 Qt 平滑缩放（面积平均）计算每块平均颜色。
+    宽度一致的块分段后整体缩小，使每个输出像素恰好对应一个块。
+    返回：
+        QImage: count_x × count_y 的块颜色图（RGB32 不透明，预乘格式保留 alpha）
+    """
+    area = img.copy(QRect(x0, y0, x1 - x0, y1 - y0))
+    if img.format() == QImage.Format_RGB32:
+        area.reinterpretAsFormat(QImage.Format_RGB32)
+        area = area.convertToFormat(QImage.Format_ARGB32)
+        area.reinterpretAsFormat(QImage.Format_RGB32)
+    blocks = QImage(count_x, count_y, area.format())
+    blocks.fill(0)
+    painter = QPainter(blocks)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    for sx, sw, bx, nx in _uniform_segments(origin_x, count_x, block_size, x0, x1):
+        for sy, sh, by, ny in _uniform_segments(origin_y, count_y, block_size, y0, y1):
+            part = area.copy(QRect(sx, sy, sw, sh))
+            painter.drawImage(bx, by, part.scaled(nx, ny, Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+    painter.end()
+    return blocks
+
+
+def _qt_outside_color(fmt: QImage.Format) -> QColor:
+    """
+    锚点在图片外的块颜色，与参考实现一致：
+    RGB32 为 QImage.pixel() 的越界返回值（不透明），灰度为黑色，预乘格式为全透明。
+    """
+    if fmt == QImage.Format_RGB32:
+        return QColor(_OUT_OF_RANGE_PIXEL)
+    if fmt in _QT_WORK_FORMATS:
+        return QColor(0, 0, 0)
+    return QColor(0, 0, 0, 0)
+
+
+def _qt_stripe(img: QImage, rect: QRect, block_size: int, intensity: float, mode: str,
+               count_x: int, x0: int, x1: int, y0: int, y1: int, outside: QColor) -> QImage:
+    """
+    生成 [x0, x1) × [y0, y1) 条带处理后的像素（RGB32 为不透明，预乘格式保留 alpha）。
+    只读取共享的 img，不修改它；Qt 的缩放与绘制在 C++ 中执行，可在工作线程中并行。
+    """
+    first_row = (y0 - rect.top()) // block_size
+    count_y = (y1 - rect.top() + block_size - 1) // block_size - first_row
+    origin_x, origin_y = rect.left(), rect.top() + first_row * block_size
+    opaque = img.format() == QImage.Format_RGB32
+
+    region = img.copy(QRect(x0, y0, x1 - x0, y1 - y0))
+    if opaque:
+        # 与参考实现一致，处理区域内的像素保留原始通道值并统一为不透明：
+        # 按 RGB32 重新解释后再转换为 ARGB32，Qt 只会补齐 alpha 而不做预乘合成
+        region.reinterpretAsFormat(QImage.Format_RGB32)
+        region = region.convertToFormat(QImage.Format_ARGB32)
+        region.reinterpretAsFormat(QImage.Format_RGB32)
+    if intensity <= 0.0:
+        return region
+
+    if mode == MODE_MEAN:
+        blocks = _qt_block_means(img, origin_x, origin_y, block_size, count_x, count_y, x0, y0, x1, y1)
+    else:
+        # 缩小：最近邻取样点位于源块的 (block_size - 1) // 2 处，平移源区域使其对准块左上角
+        offset = (block_size - 1) // 2
+        source = img.copy(QRect(origin_x - offset, origin_y - offset,
+                                count_x * block_size, count_y * block_size))
+        if opaque:
+            source.reinterpretAsFormat(QImage.Format_RGB32)
+        blocks = source.scaled(count_x, count_y, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        if opaque:
+            blocks = blocks.convertToFormat(QImage.Format_ARGB32)
+            blocks.reinterpretAsFormat(QImage.Format_RGB32)
+        # 锚点在图片左侧/上方之外的块（copy() 在图片外补 0）改为参考实现的颜色
+        outside_x = min(count_x, (block_size - 1 - origin_x) // block_size) if origin_x < 0 else 0
+        outside_y = min(count_y, (block_size - 1 - origin_y) // block_size) if origin_y < 0 else 0
+        if outside_x or outside_y:
+            fixer = QPainter(blocks)
+            fixer.setCompositionMode(QPainter.CompositionMode_Source)
+            fixer.fillRect(QRect(0, 0, outside_x, count_y), outside)
+            fixer.fillRect(QRect(0, 0, count_x, outside_y), outside)
+            fixer.end()
+
+    painter = QPainter(region)
+    if not opaque:
+        # 预乘格式下 Source 模式加不透明度即对全部通道（含 alpha）做线性插值
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+    painter.setOpacity(min(intensity, 1.0))
+    # 块网格原点相对处理区域的位置；裁剪掉超出选区和图片的部分块
+    painter.translate(origin_x - x0, origin_y - y0)
+    painter.setClipRect(QRect(x0 - origin_x, y0 - origin_y, x1 - x0, y1 - y0))
+    step = max(1, _QT_UPSCALE_SPAN // (block_size * block_size))
+    for by in range(0, count_y, step):
+        for bx in range(0, count_x, step):
+            tile = blocks.copy(QRect(bx, by, min(step, count_x - bx), min(step, count_y - by)))
+            tile = tile.scaled(tile.width() * block_size, tile.height() * block_size,
+                               Qt.IgnoreAspectRatio, Qt.FastTransformation)
+            painter.drawImage(bx * block_size, by * block_size, tile)
+    painter.end()
+    return region
+
+
+def _apply_mosaic_qt(image: QImage, rect: QRect, block_size: int, intensity: float,
+                     mode: str = MODE_SAMPLE, cache=None, workers: int | None = None,
+                     progress=None, cancel_token=None, target: QImage | None = None) -> QImage:
+    """
+    Qt 原生实现，不含逐像素的 Python 运算。
+    选区按块缩小（FastTransformation 最近邻取样恰好落在每块左上角；
+    mean 模式改用 SmoothTransformation 面积平均），
+    再按块整数倍放大，最后以 QPainter.setOpacity(intensity) 合成回原图。
+    边缘不完整的块与参考实现一样按选区与图片边界裁剪；
+    强度混合由 Qt 定点运算完成，与参考实现每通道最多相差 2。
+    大选区按块对齐的水平条带在线程池中并行生成，再在当前线程依次写回。
+    """
+    # 提供 target 时直接写入 target（批量处理保证其格式可直接绘制），否则处理副本；
+    # 灰度格式转换为对应的预乘格式处理后再转换回来
+    native = target is not None or image.format() not in _QT_WORK_FORMATS
+    if target is not None:
+        img = target
+    else:
+        img = image.copy() if native else image.convertToFormat(_QT_WORK_FORMATS[image.format()])
+    count_x, x0, x1 = _block_span(rect.left(), rect.right(), block_size, img.width())
+    count_y, y0, y1 = _block_span(rect.top(), rect.bottom(), block_size, img.height())
+    if count_x == 0 or count_y == 0 or x0 >= x1 or y0 >= y1:
+        return img if native else img.convertToFormat(image.format())
+
+    outside = _qt_outside_color(image.format())
+    stripes = _run_stripes(lambda top, bottom: _qt_stripe(img, rect, block_size, intensity, mode,
+                                                          count_x, x0, x1, top, bottom, outside),
+                           rect.top(), block_size, y0, y1, x1 - x0, _resolve_workers(workers),
+                           progress, cancel_token)
+
+    with _QT_PAINT_LOCK:
+        painter = QPainter(img)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        for top, _bottom, region in stripes:
+            painter.drawImage(x0, top, region)
+        painter.end()
+    return img if native else img.convertToFormat(image.format())
+
+
+def _engine_process(source: QImage, target: QImage, rect: QRect, area: QRect, params: dict,
+                    mode: str = MODE_SAMPLE):
+    """
+    sample/mean 核：把块对齐的条带换算为子选区后交给所选引擎处理。
+    中间条带止于块边界，以该边界作为子选区底边时 range(top, 底边, block_size) 恰好覆盖条带内的块行；
+    最后一个条带沿用选区底边，保留参考实现对最后一行块的裁剪规则，拼接结果与整体处理一致。
+    """
+    if params["anchored"]:
+        if np is not None:
+            _anchored_process(source, target, area, params, mode)
+        else:
+            _anchored_engine_process(source, target, area, params, mode)
+        return
+    block_size = params["block_size"]
+    top = rect.top() + (area.top() - rect.top()) // block_size * block_size
+    end = area.bottom() + 1
+    bottom = end if (end - rect.top()) % block_size == 0 and end <= rect.bottom() else rect.bottom()
+    stripe = QRect(QPoint(rect.left(), top), QPoint(rect.right(), bottom))
+    MOSAIC_ENGINES[params["engine"]](source, stripe, block_size, params["intensity"], mode,
+                                     cache=params["cache"], workers=1, target=target)
+
+
+def _grid_block_colors(image: QImage, cells: QRect, block_size: int, mode: str, cache=None):
+    """
+    计算锚定网格中一组单元的颜色（单元 (i, j) 覆盖图片的 [j*块大小, (j+1)*块大小) × [i*块大小, (i+1)*块大小)）。
+    sample 取单元左上角像素，mean 取单元与图片交集内的平均值（各通道向下取整）；
+    单元颜色只取决于图片内容，与选区无关。RGB32 的颜色统一为不透明。
+    返回：
+        ndarray: 形状为 (单元行数, 单元列数, 通道数) 的颜色
+    """
+    pixels = channel_array(image)
+    height, width, channels = pixels.shape
+    _dtype, _channels, used = get_channel_layout(image.format())
+    if mode == MODE_MEAN:
+        edges_x = np.clip(np.arange(cells.left(), cells.right() + 2) * block_size, 0, width)
+        edges_y = np.clip(np.arange(cells.top(), cells.bottom() + 2) * block_size, 0, height)
+        if cache is not None and cache.supports(image):
+            sums = cache.block_sums(image, edges_x, edges_y)
+        else:
+            region = pixels[edges_y[0]:edges_y[-1], edges_x[0]:edges_x[-1]][:, :, used]
+            sums = _sat_block_sums(region, edges_x - edges_x[0], edges_y - edges_y[0])
+        colors = np.empty((cells.height(), cells.width(), channels), dtype=pixels.dtype)
+        colors[:, :, used] = _sums_to_means(sums, edges_x, edges_y, pixels.dtype)
+    else:
+        anchor_x = np.arange(cells.left(), cells.right() + 1) * block_size
+        anchor_y = np.arange(cells.top(), cells.bottom() + 1) * block_size
+        colors = pixels[np.ix_(anchor_y, anchor_x)]
+    if image.format() == QImage.Format_RGB32:
+        colors[:, :, get_alpha_channel(image.format())] = 0xFF
+    return colors
+
+
+def _anchored_process(source: QImage, target: QImage, area: QRect, params: dict, mode: str):
+    """
+    网格锚定的 sample/mean 核：取覆盖 area 的网格单元颜色（有块颜色缓存时复用已缓存的单元），
+    按块大小展开后截取 area 范围并按强度混合。
+    """
+    block_size = params["block_size"]
+    cells = QRect(QPoint(area.left() // block_size, area.top() // block_size),
+                  QPoint(area.right() // block_size, area.bottom() // block_size))
+    compute = partial(_grid_block_colors, source, block_size=block_size, mode=mode, cache=params["cache"])
+    color_cache = params["color_cache"]
+    if color_cache is not None and color_cache.is_available():
+        colors = color_cache.block_colors(source, block_size, mode, cells, compute)
+    else:
+        colors = compute(cells)
+    offset_x = area.left() - cells.left() * block_size
+    offset_y = area.top() - cells.top() * block_size
+    mosaic = np.repeat(np.repeat(colors, block_size, axis=0), block_size, axis=1)
+    mosaic = mosaic[offset_y:offset_y + area.height(), offset_x:offset_x + area.width()]
+    _blend_into(_area_array(target, area), mosaic, params["intensity"])
+
+
+def _anchored_engine_process(source: QImage, target: QImage, area: QRect, params: dict, mode: str):
+    """
+    未安装 NumPy 时的网格锚定实现：以覆盖 area 的完整网格单元为子选区，
+    由所选引擎在该范围的临时副本上处理，再把 area 部分写回 target（不使用块颜色缓存）。
+    """
+    block_size = params["block_size"]
+    left = area.left() // block_size * block_size
+    top = area.top() // block_size * block_size
+    right = (area.right() // block_size + 1) * block_size
+    bottom = (area.bottom() // block_size + 1) * block_size
+    bounds = QRect(left, top, right - left, bottom - top).intersected(source.rect())
+    scratch = source.copy(bounds)
+    # 子选区的右/下边取单元终点（含），range(0, 终点, block_size) 恰好覆盖全部单元且不裁剪最后一个单元
+    grid = QRect(QPoint(0, 0), QPoint(right - left, bottom - top))
+    result = MOSAIC_ENGINES[params["engine"]](scratch, grid, block_size, params["intensity"], mode, workers=1)
+    with _QT_PAINT_LOCK:
+        painter = QPainter(target)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawImage(area.topLeft(), result, area.translated(-bounds.topLeft()))
+        painter.end()
+
+
+def _area_array(image: QImage, area: QRect):
+    """获取 area 范围内可写的 (高, 宽, 通道数) 像素视图"""
+    return channel_array(image, writable=True)[area.top():area.bottom() + 1, area.left():area.right() + 1]
+
+
+def _blur_radii(block_size: int, passes: int) -> list:
+    """
+    计算近似高斯模糊（sigma = block_size / 2）的各次盒式模糊半径。
+    passes 次宽度为 w 的盒式模糊等价于方差 passes * (w^2 - 1) / 12 的卷积，
+    宽度取相邻的两个奇数并按次数分配，使总方差最接近 sigma^2。
+    """
+    sigma = max(block_size, 1) / 2
+    ideal = (12 * sigma * sigma / passes + 1) ** 0.5
+    lower = int(ideal)
+    lower -= 1 if lower % 2 == 0 else 0
+    lower = max(lower, 1)
+    count = round((12 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes)
+                  / (-4 * lower - 4))
+    count = min(max(count, 0), passes)
+    return [(lower - 1) // 2 if index < count else (lower + 1) // 2 for index in range(passes)]
+
+
+def _box_pass(values, radius: int, axis: int, start: int, stop: int):
+    """
+    NumPy 盒式模糊单次一维平均：沿 axis 计算 [start, stop) 位置的 (2 * radius + 1) 窗口平均值（四舍五入）。
+    每个输出 O(1)，与半径无关；窗口在数组两端截断，只平均实际存在的像素。
+    水平方向按 MOSAIC_BLUR_CHUNK_ROWS 行分块、用前缀和相减得到窗口和，各行互不依赖、无需额外邻域；
+    垂直方向在整列上逐行维护滑动窗口和（整行向量化，进入一行、离开一行），同一时刻只访问少数几行。
+    两个方向的工作集都与数组高度和模糊半径无关。
+    """
+    sum_dtype = np.uint64 if values.dtype == np.uint16 else np.uint32
+    if axis == 0:
+        return _box_pass_rows(values, radius, start, stop, sum_dtype)
+    output = np.empty((values.shape[0], stop - start, values.shape[2]), dtype=values.dtype)
+    for top in range(0, values.shape[0], MOSAIC_BLUR_CHUNK_ROWS):
+        bottom = top + MOSAIC_BLUR_CHUNK_ROWS
+        output[top:bottom] = _box_pass_columns(values[top:bottom], radius, start, stop, sum_dtype)
+    return output
+
+
+def _box_pass_columns(values, radius: int, start: int, stop: int, sum_dtype):
+    """水平方向的窗口平均：前缀和两端各补 radius 个边界值，窗口和即为两个等距切片之差，无需逐列取下标"""
+    height, length, channels = values.shape
+    sums = np.empty((height, length + 1 + 2 * radius, channels), dtype=sum_dtype)
+    sums[:, :radius + 1] = 0
+    np.cumsum(values, axis=1, dtype=sum_dtype, out=sums[:, radius + 1:radius + 1 + length])
+    sums[:, radius + 1 + length:] = sums[:, radius + length:radius + 1 + length]
+    window = sums[:, start + 2 * radius + 1:stop + 2 * radius + 1] - sums[:, start:stop]
+    index = np.arange(start, stop)
+    counts = (np.minimum(index + radius + 1, length) - np.maximum(index - radius, 0)).astype(sum_dtype)
+    full = 2 * radius + 1
+    # 完整窗口的像素数相同，按标量整体相除；靠近两端被截断的列按各自的像素数整段广播相除
+    interior = np.flatnonzero(counts == full)
+    first, last = (interior[0], interior[-1] + 1) if len(interior) else (len(counts), len(counts))
+    middle = window[:, first:last]
+    middle += sum_dtype(full // 2)
+    middle //= sum_dtype(full)
+    for begin, end in ((0, first), (last, len(counts))):
+        if begin < end:
+            edge = counts[begin:end, None]
+            part = window[:, begin:end]
+            part += edge // 2
+            part //= edge
+    return window.astype(values.dtype)
+
+
+def _box_pass_rows(values, radius: int, start: int, stop: int, sum_dtype):
+    """垂直方向的滑动窗口平均：窗口每下移一行，只加上进入的行、减去离开的行"""
+    length = values.shape[0]
+    output = np.empty((stop - start,) + values.shape[1:], dtype=values.dtype)
+    sums = values[max(start - radius, 0):min(start + radius + 1, length)].sum(axis=0, dtype=sum_dtype)
+    buffer = np.empty_like(sums)
+    for row, index in enumerate(range(start, stop)):
+        if index > start:
+            if index + radius < length:
+                sums += values[index + radius]
+            if index - radius - 1 >= 0:
+                sums -= values[index - radius - 1]
+        count = sum_dtype(min(index + radius + 1, length) - max(index - radius, 0))
+        np.add(sums, count // 2, out=buffer)
+        np.floor_divide(buffer, count, out=buffer)
+        output[row] = buffer
+    return output
+
+
+def _running_means(lines: list, radius: int, start: int, stop: int) -> list:
+    """
+    纯 Python 滑动窗口平均：第 i 个输出为 lines[i - radius : i + radius + 1]（两端截断）逐元素的平均值（四舍五入）。
+    窗口每移动一步只加上进入的一项、减去离开的一项，每个输出 O(1)，与半径无关。
+    """
+    length = len(lines)
+    low, high = max(start - radius, 0), min(start + radius + 1, length)
+    sums = [sum(column) for column in zip(*lines[low:high])]
+    means = []
+    for index in range(start, stop):
+        if index > start:
+            if index + radius < length:
+                sums = [total + value for total, value in zip(sums, lines[index + radius])]
+            if index - radius - 1 >= 0:
+                sums = [total - value for total, value in zip(sums, lines[index - radius - 1])]
+        count = min(index + radius + 1, length) - max(index - radius, 0)
+        means.append([(total + count // 2) // count for total in sums])
+    return means
+
+
+def _box_pass_python(rows: list, radius: int, axis: int, start: int, stop: int, channels: int = 1) -> list:
+    """
+    纯 Python 盒式模糊单次一维平均，rows 为逐行的通道值列表，含义同 _box_pass。
+    水平方向以像素（channels 个通道）为滑动单位，垂直方向以整行为滑动单位。
+    """
+    if axis == 0:
+        return _running_means(rows, radius, start, stop)
+    blurred = []
+    for row in rows:
+        pixels = [row[offset:offset + channels] for offset in range(0, len(row), channels)]
+        blurred.append([value for pixel in _running_means(pixels, radius, start, stop) for value in pixel])
+    return blurred
+
+
+def _blur_window(window, box, radii: list, area: QRect, bounds: QRect, width: int, height: int):
+    """
+    对读取的邻域窗口依次执行多次可分离盒式模糊，返回 area 范围的结果。
+    每次模糊只计算后续各次仍需要的范围（area 向外扩展剩余半径之和，裁剪到图片内），
+    窗口边缘要么是图片边界、要么距输出至少一个半径，因此结果与条带如何切分无关。
+    参数：
+        window: bounds 范围的像素（NumPy 数组或逐行列表）
+        box: 单次一维平均函数 box(values, radius, axis, start, stop)
+        bounds: 窗口在图片中的范围
+    """
+    left, top = bounds.left(), bounds.top()
+    remaining = sum(radii)
+    for radius in radii:
+        remaining -= radius
+        out_left, out_right = max(area.left() - remaining, 0), min(area.right() + 1 + remaining, width)
+        out_top, out_bottom = max(area.top() - remaining, 0), min(area.bottom() + 1 + remaining, height)
+        window = box(window, radius, 1, out_left - left, out_right - left)
+        window = box(window, radius, 0, out_top - top, out_bottom - top)
+        left, top = out_left, out_top
+    return window
+
+
+def _blur_process(source: QImage, target: QImage, rect: QRect, area: QRect, params: dict):
+    """
+    模糊核：MOSAIC_BLUR_PASSES 次可分离盒式模糊近似 sigma = block_size / 2 的高斯模糊。
+    每次盒式模糊按水平、垂直两个方向以滑动窗口和计算，每像素的开销与模糊半径无关。
+    邻域从只读的 source 读取（area 四周多读各次半径之和），条带之间互不依赖；窗口在图片边界处截断。
+    NumPy 实现一次读取整个邻域：水平方向按行分块、垂直方向在整列上滑动，临时数组的工作集与半径无关，
+    邻域只在 area 四周多读一次，不会像按行切块那样每块重复读取上下邻域。
+    纯 Python 实现按行分块处理，每块至少为邻域行数的 16 倍，重复读取的邻域不超过块本身的八分之一。
+    """
+    radii = _blur_radii(params["block_size"], MOSAIC_BLUR_PASSES)
+    halo = sum(radii)
+    intensity = params["intensity"]
+    width, height = source.width(), source.height()
+    if np is not None:
+        bounds = area.adjusted(-halo, -halo, halo, halo).intersected(QRect(0, 0, width, height))
+        window = channel_array(source)[bounds.top():bounds.bottom() + 1, bounds.left():bounds.right() + 1]
+        blurred = _blur_window(window, _box_pass, radii, area, bounds, width, height)
+        _blend_into(_area_array(target, area), blurred, intensity)
+        return
+    chunk_rows = max(MOSAIC_BLUR_CHUNK_ROWS, 16 * halo)
+    for chunk_top in range(area.top(), area.bottom() + 1, chunk_rows):
+        chunk = QRect(area.left(), chunk_top, area.width(), min(chunk_rows, area.bottom() + 1 - chunk_top))
+        bounds = chunk.adjusted(-halo, -halo, halo, halo).intersected(QRect(0, 0, width, height))
+        _blur_chunk_python(source, target, radii, chunk, bounds, intensity)
+
+
+def _blur_chunk_python(source: QImage, target: QImage, radii: list, area: QRect, bounds: QRect, intensity: float):
+    """未安装 NumPy 时的模糊实现：逐行读取像素缓冲区，滑动窗口平均后按参考实现的表达式混合写回"""
+    _dtype, channels, _used = get_channel_layout(source.format())
+    code = "H" if _dtype == "uint16" else "B"
+    pixels = source.constBits().cast(code)
+    stride = source.bytesPerLine() // pixels.itemsize
+    rows = [list(pixels[y * stride + bounds.left() * channels:y * stride + (bounds.right() + 1) * channels])
+            for y in range(bounds.top(), bounds.bottom() + 1)]
+    blurred = _blur_window(rows, partial(_box_pass_python, channels=channels), radii, area, bounds,
+                           source.width(), source.height())
+    if intensity <= 0.0:
+        return
+    output = target.bits().cast(code)
+    for y, row in zip(range(area.top(), area.bottom() + 1), blurred):
+        offset = y * stride + area.left() * channels
+        if intensity < 1.0:
+            row = [int(original * (1 - intensity) + value * intensity)
+                   for original, value in zip(output[offset:offset + len(row)], row)]
+        output[offset:offset + len(row)] = array.array(code, row)
+
+
+def _fill_process(source: QImage, target: QImage, rect: QRect, area: QRect, params: dict):
+    """纯色填充核：以不透明黑色覆盖区域，强度小于 1 时与原色按比例混合"""
+    region = _area_array(target, area)
+    color = np.zeros(region.shape[2], dtype=region.dtype)
+    alpha = get_alpha_channel(target.format())
+    if alpha is not None:
+        color[alpha] = np.iinfo(region.dtype).max
+    _blend_into(region, color, params["intensity"])
+
+
+def _noise_process(source: QImage, target: QImage, rect: QRect, area: QRect, params: dict):
+    """
+    随机噪声核：以均匀分布的随机颜色替换区域内的像素，保留原有的 alpha；
+    预乘格式的颜色通道按 alpha 缩放，保证结果仍是合法的预乘值。
+    每次调用使用独立的随机数生成器，多个条带可并行处理；
+    指定 seed 时每行的随机数只由 (种子, 行号, 起始列) 决定，结果与条带划分和线程数无关，可精确重放。
+    """
+    region = _area_array(target, area)
+    maximum = int(np.iinfo(region.dtype).max)
+    alpha = get_alpha_channel(target.format())
+    colors = [channel for channel in range(region.shape[2]) if channel != alpha]
+    seed = params.get("seed")
+    if seed is None:
+        noise = np.random.default_rng().integers(0, maximum, size=region.shape[:2] + (len(colors),),
+                                                 dtype=np.uint32, endpoint=True)
+    else:
+        top = area.top() + params.get("row_offset", 0)
+        noise = np.stack([np.random.default_rng([seed, y, area.left()]).integers(
+            0, maximum, size=(region.shape[1], len(colors)), dtype=np.uint32, endpoint=True)
+            for y in range(top, top + region.shape[0])])
+    if alpha is not None:
+        noise = noise * region[:, :, alpha:alpha + 1] // maximum
+    mosaic = region.copy()
+    mosaic[:, :, colors] = noise.astype(region.dtype)
+    _blend_into(region, mosaic, params["intensity"])
+
+
+MOSAIC_ENGINES = {ENGINE_QT: _apply_mosaic_qt, ENGINE_PYTHON: _apply_mosaic_python}
+if np is not None:
+    MOSAIC_ENGINES[ENGINE_NUMPY] = _apply_mosaic_numpy
+
+# 各核临时数据的峰值（像素字节数的倍数），以 tracemalloc 在各工作格式、强度 1.0 与 0.7 下实测的最大值向上取整：
+# NumPy 实现的主要开销是 8 位通道强度混合时的 uint16 中间数组与查找表结果、模糊的 uint32/uint64 窗口和、噪声的随机数；
+# 未安装 NumPy 时 sample/mean 由 python 引擎逐像素处理（qt 引擎最多一份放大结果），模糊按行分块存放为 Python 整数列表
+_ENGINE_SCRATCH = 15 if np is not None else 2
+_BLUR_SCRATCH = 13 if np is not None else 60
+
+# 已注册的马赛克核：名称 -> MosaicKernel，按注册顺序在界面中列出
+MOSAIC_KERNELS = {}
+register_kernel(MosaicKernel(MODE_SAMPLE, "mosaic_mode_sample", "Corner Pixel",
+                             partial(_engine_process, mode=MODE_SAMPLE), block_aligned=True, uses_engine=True,
+                             scratch_factor=_ENGINE_SCRATCH))
+register_kernel(MosaicKernel(MODE_MEAN, "mosaic_mode_mean", "Block Average",
+                             partial(_engine_process, mode=MODE_MEAN), block_aligned=True, uses_engine=True,
+                             scratch_factor=_ENGINE_SCRATCH))
+register_kernel(MosaicKernel(MODE_BLUR, "mosaic_mode_blur", "Blur", _blur_process, scratch_factor=_BLUR_SCRATCH))
+if np is not None:
+    register_kernel(MosaicKernel(MODE_FILL, "mosaic_mode_fill", "Solid Fill", _fill_process,
+                                 uses_block_size=False, scratch_factor=12))
+    register_kernel(MosaicKernel(MODE_NOISE, "mosaic_mode_noise", "Noise", _noise_process,
+                                 uses_block_size=False, scratch_factor=17))
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+图像金字塔模块
+
+用途：
+    为当前图片维护逐级减半的多分辨率图像（mipmap），显示与缩放时从最接近目标尺寸的级别缩放。
+
+使用场景：
+    由 ImageViewer 随当前图片持有：把 12000×9000 的图片显示在 900 像素宽的窗口中时，
+    只需从 1500×1125 的级别缩放，而不是每次都从原图缩放。
+    各级别在首次需要时才生成；编辑后只把与脏区域相交的瓦片标记为待重建，
+    下次取用该级别时才重建这些瓦片。金字塔有独立的内存上限，缓存新级别前按最近最少使用顺序淘汰整个级别；
+    单个级别就超出上限时不缓存，每次取用时按需生成。
+"""
+from collections import OrderedDict
+from PySide6.QtGui import QImage, QPainter, QRegion
+from PySide6.QtCore import Qt, QRect
+from src.constants.config import IMAGE_PYRAMID_MAX_BYTES, IMAGE_PYRAMID_TILE_SIZE, IMAGE_PYRAMID_MIN_TILE_SIZE
+
+
+class ImagePyramid:
+    """
+    逐级减半的图像金字塔。
+
+    第 0 级即原图（不复制），第 k 级的尺寸为第 k-1 级的一半（向上取整），
+    像素 (x, y) 覆盖原图的 [x·2^k, (x+1)·2^k) × [y·2^k, (y+1)·2^k)，由已缓存的更高分辨率级别块平均得到。
+    每级划分瓦片并记录待重建的瓦片，各级的一个瓦片都覆盖原图 tile_size 见方的范围
+    （级别瓦片边长不小于 IMAGE_PYRAMID_MIN_TILE_SIZE），小范围编辑在各级只需重建同样大小的原图范围。
+    """
+
+    def __init__(self, max_bytes=IMAGE_PYRAMID_MAX_BYTES, tile_size=IMAGE_PYRAMID_TILE_SIZE):
+        """
+        初始化图像金字塔
+
+        Args:
+            max_bytes: 缓存的各级别（不含原图）占用内存的上限（字节），超出上限的单个级别不缓存
+            tile_size: 一个瓦片覆盖的原图边长（像素）
+        """
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.image = None
+        self.generation = 0
+        self.levels = OrderedDict()  # 级别 -> [图像, 待重建的瓦片集合 {(列, 行)}]
+        self.bytes_used = 0
+        self.built_tiles = 0
+        self.evictions = 0
+        self.uncached_builds = 0
+
+    def bind(self, image, generation=0):
+        """绑定新的图片并清空全部级别（加载新图片或整图替换时调用）"""
+        self.image = image
+        self.generation = generation
+        self.levels.clear()
+        self.bytes_used = 0
+
+    def advance(self, image, generation, dirty_rect=None):
+        """
+        图片被编辑后推进到新的状态。
+
+        Args:
+            image: 编辑后的图片
+            generation: 新的编辑代数
+            dirty_rect: 发生变化的区域（原图坐标系，QRect 或 QRegion）；None 表示整图都可能变化
+        """
+        if dirty_rect is None or self.image is None or image.size() != self.image.size():
+            self.bind(image, generation)
+            return
+        self.image = image
+        self.generation = generation
+        self.invalidate(dirty_rect)
+
+    def invalidate(self, rect):
+        """把各级别中与指定区域（原图坐标系，QRect 或 QRegion）相交的瓦片标记为待重建"""
+        if rect is None or rect.isEmpty():
+            return
+        region = QRegion(rect) if isinstance(rect, QRect) else rect
+        for level, (image, dirty) in self.levels.items():
+            for changed in region:
+                changed = changed.intersected(self.image.rect())
+                if changed.isEmpty():
+                    continue
+                tile = self.get_tile_size(level) << level  # 第 level 级的一个瓦片覆盖原图的像素数
+                for row in range(changed.top() // tile, changed.bottom() // tile + 1):
+                    for column in range(changed.left() // tile, changed.right() // tile + 1):
+                        dirty.add((column, row))
+
+    def select_level(self, scale):
+        """
+        选择缩放到 scale 倍时应使用的级别：尺寸不小于目标尺寸的最小级别
+
+        Args:
+            scale: 目标尺寸相对原图的比例
+        Returns:
+            int: 级别
+        """
+        if self.image is None or scale <= 0:
+            return 0
+        level = 0
+        width, height = self.image.width(), self.image.height()
+        while (width > 1 or height > 1) and scale * 2 <= 1:
+            width, height = (width + 1) // 2, (height + 1) // 2
+            scale *= 2
+            level += 1
+        return level
+
+    def get_level(self, level):
+        """
+        获取指定级别的图像（需要时生成或重建待重建的瓦片）
+
+        Args:
+            level: 级别，0 为原图
+        Returns:
+            QImage: 该级别的图像（与金字塔共享，调用方不应修改）
+        """
+        if level <= 0 or self.image is None:
+            return self.image
+        entry = self.levels.get(level)
+        if entry is None:
+            width, height = self.image.width(), self.image.height()
+            for _ in range(level):
+                width, height = (width + 1) // 2, (height + 1) // 2
+            image = QImage(width, height, self.image.format())
+            tile_size = self.get_tile_size(level)
+            columns = (width + tile_size - 1) // tile_size
+            rows = (height + tile_size - 1) // tile_size
+            entry = [image, {(column, row) for row in range(rows) for column in range(columns)}]
+            if image.sizeInBytes() > self.max_bytes:
+                # 单个级别就超出上限：不缓存，由已缓存的更高分辨率级别按需生成后直接返回
+                base_level = max((cached for cached in self.levels if cached < level), default=0)
+                self._rebuild(self.get_level(base_level), level - base_level, image, entry[1], tile_size)
+                self.uncached_builds += 1
+                return image
+            # 先淘汰旧级别腾出空间，缓存的级别始终不超过上限
+            self._evict(image.sizeInBytes())
+            self.levels[level] = entry
+            self.bytes_used += image.sizeInBytes()
+        image, dirty = entry
+        if dirty:
+            # 从最近的已缓存的更高分辨率级别（至少有原图）直接逐级减半，中间级别不必常驻内存
+            base_level = max((cached for cached in self.levels if cached < level), default=0)
+            base = self.get_level(base_level)
+            self._rebuild(base, level - base_level, image, dirty, self.get_tile_size(level))
+            dirty.clear()
+        if level in self.levels:
+            self.levels.move_to_end(level)
+        return image
+
+    def get_tile_size(self, level):
+        """获取第 level 级的瓦片边长（级别像素）"""
+        return max(IMAGE_PYRAMID_MIN_TILE_SIZE, self.tile_size >> level)
+
+    def get_level_for_scale(self, scale):
+        """
+        获取缩放到 scale 倍时应使用的级别图像
+
+        Args:
+            scale: 目标尺寸相对原图的比例
+        Returns:
+            tuple: (级别图像, 级别)
+        """
+        level = self.select_level(scale)
+        return self.get_level(level), level
+
+    def stats(self):
+        """
+        获取金字塔统计信息
+
+        Returns:
+            dict: levels/bytes/max_bytes/built_tiles/evictions/uncached_builds/generation
+        """
+        return {
+            "levels": len(self.levels),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "built_tiles": self.built_tiles,
+            "evictions": self.evictions,
+            "uncached_builds": self.uncached_builds,
+            "generation": self.generation,
+        }
+
+    def _rebuild(self, base, steps, image, dirty, tile_size):
+        """
+        由更高分辨率的级别 base 缩小 2^steps 倍，重建待重建的瓦片；全部瓦片待重建时整级按瓦片行生成。
+        每个区域从 base 中取对应的 2^steps 倍范围（超出图片的部分以最后一行/列补齐），
+        由 Qt 平滑缩放（整数倍缩小即块平均）后写入，区域之间互不影响。
+        """
+        columns = (image.width() + tile_size - 1) // tile_size
+        rows = (image.height() + tile_size - 1) // tile_size
+        if len(dirty) == columns * rows:
+            areas = [QRect(0, row * tile_size, image.width(), tile_size).intersected(image.rect())
+                     for row in range(rows)]
+        else:
+            areas = [QRect(column * tile_size, row * tile_size, tile_size, tile_size)
+                     .intersected(image.rect()) for column, row in sorted(dirty)]
+        factor = 1 << steps
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        for area in areas:
+            source = QRect(area.left() * factor, area.top() * factor, area.width() * factor, area.height() * factor)
+            painter.drawImage(area.topLeft(), _padded_copy(base, source).scaled(
+                area.size(), Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        painter.end()
+        self.built_tiles += len(dirty)
+
+    def _evict(self, incoming_bytes=0):
+        """淘汰最久未使用的级别，直到再缓存 incoming_bytes 字节也不超出内存上限"""
+        while self.levels and self.bytes_used + incoming_bytes > self.max_bytes:
+            _level, (image, _dirty) = self.levels.popitem(last=False)
+            self.bytes_used -= image.sizeInBytes()
+            self.evictions += 1
+
+
+def _padded_copy(image, rect):
+    """复制 rect 范围的像素，超出图片右边/下边的部分以最后一列/行补齐"""
+    block = image.copy(rect)
+    inside = rect.intersected(image.rect()).translated(-rect.topLeft())
+    if inside.size() == block.size():
+        return block
+    painter = QPainter(block)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    if inside.right() + 1 < block.width():
+        column = block.copy(QRect(inside.right(), 0, 1, inside.height()))
+        painter.drawImage(QRect(inside.right() + 1, 0, block.width() - inside.right() - 1, inside.height()), column)
+    if inside.bottom() + 1 < block.height():
+        row = block.copy(QRect(0, inside.bottom(), block.width(), 1))
+        painter.drawImage(QRect(0, inside.bottom() + 1, block.width(), block.height() - inside.bottom() - 1), row)
+    painter.end()
+    return block
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+积分图缓存模块
+
+用途：
+    按图片分块缓存各通道的积分图（summed-area table），供块平均马赛克复用。
+
+使用场景：
+    由 ImageViewer 随当前图片持有；拖动块大小或重复预览同一区域时，
+    任意块大小的块内像素和都可直接由缓存的积分图四角相减得到，无需重新扫描像素。
+    编辑后只丢弃与脏矩形相交的分块，其余分块继续有效。
+"""
+from collections import OrderedDict
+import threading
+from PySide6.QtGui import QRegion
+from PySide6.QtCore import QRect
+from src.constants.config import INTEGRAL_CACHE_MAX_BYTES, INTEGRAL_CACHE_TILE_SIZE
+from src.features.pixel_formats import get_channel_layout, channel_array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+
+class IntegralImageCache:
+    """
+    分块积分图缓存。
+
+    每个分块保存 (tile+1) × (tile+1) × 通道数 的积分图，通道为工作格式中参与取色的通道
+    （RGB32 为 R/G/B，预乘格式含 alpha，灰度为 1 个通道）。
+    8 位通道以 uint32 存储并允许回绕：单块像素和远小于 2^32，四角相减在模 2^32 意义下仍然精确；
+    16 位通道使用 uint64。
+    缓存以 (QImage.cacheKey(), 编辑代数) 标识所属图片状态，
+    按最近最少使用顺序在超出内存上限时淘汰分块。
+    公开方法内部加锁，可在后台马赛克任务与界面线程之间共享。
+    """
+
+    def __init__(self, max_bytes=INTEGRAL_CACHE_MAX_BYTES, tile_size=INTEGRAL_CACHE_TILE_SIZE):
+        """
+        初始化积分图缓存
+
+        Args:
+            max_bytes: 缓存占用内存上限（字节）
+            tile_size: 分块边长（像素）
+        """
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.tiles = OrderedDict()
+        self.image_key = None
+        self.generation = 0
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def is_available(self):
+        """检查当前环境是否支持积分图缓存（需要 NumPy）"""
+        return np is not None
+
+    def supports(self, image):
+        """检查图片格式是否可由缓存读取（工作格式）"""
+        return np is not None and image is not None and get_channel_layout(image.format()) is not None
+
+    def bind(self, image, generation=0):
+        """
+        绑定新的图片状态并清空全部分块（加载新图片或整图替换时调用）
+        """
+        with self.lock:
+            self.clear()
+            self.image_key = image.cacheKey() if image is not None else None
+            self.generation = generation
+
+    def advance(self, image, generation, dirty_rect=None):
+        """
+        图片被编辑后推进到新的状态。
+
+        Args:
+            image: 编辑后的图片
+            generation: 新的编辑代数
+            dirty_rect: 发生变化的区域（图片坐标系，QRect 或 QRegion）；None 表示整图都可能变化
+        """
+        with self.lock:
+            if dirty_rect is None or self.image_key is None:
+                self.bind(image, generation)
+                return
+            self.invalidate(dirty_rect)
+            self.image_key = image.cacheKey()
+            self.generation = generation
+
+    def invalidate(self, rect):
+        """丢弃与指定区域（QRect 或 QRegion）相交的分块"""
+        with self.lock:
+            if rect is None or rect.isEmpty():
+                return
+            region = QRegion(rect) if isinstance(rect, QRect) else rect
+            size = self.tile_size
+            for key in list(self.tiles.keys()):
+                tile_rect = QRect(key[0] * size, key[1] * size, size, size)
+                if region.intersects(tile_rect):
+                    self._drop(key)
+
+    def clear(self):
+        """清空缓存（保留命中统计）"""
+        with self.lock:
+            self.tiles.clear()
+            self.bytes_used = 0
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        Returns:
+            dict: hits/misses/evictions/tiles/bytes/max_bytes/generation
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tiles": len(self.tiles),
+                "bytes": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "generation": self.generation,
+            }
+
+    def block_sums(self, image, edges_x, edges_y):
+        """
+        计算网格中每个块内各参与取色通道的像素和。
+
+        Args:
+            image: 与缓存绑定的图片（cacheKey 不一致时缓存会先被清空）
+            edges_x: 长度为 nx + 1 的递增列边界（图片坐标，第 i 块覆盖 [edges_x[i], edges_x[i+1])）
+            edges_y: 长度为 ny + 1 的递增行边界
+        Returns:
+            ndarray: 形状为 (ny, nx, 通道数) 的块内像素和，通道顺序与内存字节顺序一致
+        """
+        with self.lock:
+            if image.cacheKey() != self.image_key:
+                # 图片在缓存不知情的情况下被替换，已有分块全部作废
+                self.bind(image, self.generation)
+
+            edges_x = np.asarray(edges_x)
+            edges_y = np.asarray(edges_y)
+            dtype, _channels, used = get_channel_layout(image.format())
+            sum_dtype = np.uint64 if dtype == "uint16" else np.uint32
+            sums = np.zeros((len(edges_y) - 1, len(edges_x) - 1, len(used)), dtype=sum_dtype)
+            if sums.size == 0:
+                return sums
+
+            pixels = channel_array(image)
+            size = self.tile_size
+            left, right = int(edges_x[0]), int(edges_x[-1])
+            top, bottom = int(edges_y[0]), int(edges_y[-1])
+            for tile_y in range(top // size, (bottom - 1) // size + 1):
+                for tile_x in range(left // size, (right - 1) // size + 1):
+                    table = self._get_tile(pixels, used, sum_dtype, tile_x, tile_y)
+                    origin_x, origin_y = tile_x * size, tile_y * size
+                    cols, local_x = self._tile_edges(edges_x, origin_x, origin_x + table.shape[1] - 1)
+                    rows, local_y = self._tile_edges(edges_y, origin_y, origin_y + table.shape[0] - 1)
+                    if cols.stop <= cols.start or rows.stop <= rows.start:
+                        continue
+                    y_top, y_bottom = local_y[:-1, None], local_y[1:, None]
+                    x_left, x_right = local_x[None, :-1], local_x[None, 1:]
+                    sums[rows, cols] += (table[y_bottom, x_right] - table[y_top, x_right]
+                                         - table[y_bottom, x_left] + table[y_top, x_left])
+            return sums
+
+    def _tile_edges(self, edges, start, stop):
+        """
+        求与分块范围 [start, stop) 相交的块下标区间，以及裁剪到分块内的局部边界
+        """
+        first = max(int(np.searchsorted(edges, start, side="right")) - 1, 0)
+        last = min(int(np.searchsorted(edges, stop, side="left")), len(edges) - 1)
+        local = np.clip(edges[first:last + 1], start, stop) - start
+        return slice(first, last), local
+
+    def _get_tile(self, pixels, used, sum_dtype, tile_x, tile_y):
+        """获取（必要时计算）指定分块的积分图"""
+        key = (tile_x, tile_y)
+        table = self.tiles.get(key)
+        if table is not None:
+            self.hits += 1
+            self.tiles.move_to_end(key)
+            return table
+
+        self.misses += 1
+        size = self.tile_size
+        channels = pixels[tile_y * size:(tile_y + 1) * size, tile_x * size:(tile_x + 1) * size][:, :, used]
+        height, width = channels.shape[:2]
+        table = np.zeros((height + 1, width + 1, len(used)), dtype=sum_dtype)
+        np.cumsum(channels, axis=0, dtype=sum_dtype, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, dtype=sum_dtype, out=table[1:, 1:])
+
+        self.tiles[key] = table
+        self.bytes_used += table.nbytes
+        while self.bytes_used > self.max_bytes and len(self.tiles) > 1:
+            oldest = next(iter(self.tiles))
+            self._drop(oldest)
+            self.evictions += 1
+        return table
+
+    def _drop(self, key):
+        """移除单个分块"""
+        table = self.tiles.pop(key, None)
+        if table is not None:
+            self.bytes_used -= table.nbytes
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+超大图片模块
+
+用途：
+    完整解码超过内存预算（LARGE_IMAGE_MEMORY_BUDGET）的图片只以缩小的预览图显示和编辑，
+    保存时在原始文件上按水平条带以原分辨率重放预览图上记录的操作。
+
+使用场景：
+    ImageLoadTask 发现加载结果是预览图时创建 LargeImageSource，随图片交给 ImageViewer；
+    MainWindow 保存时取得操作记录，由 LargeImageSource.save 分条带渲染并写出。
+    解码器支持区域解码（QImageReader 的 ClipRect，如 JPEG）时每个条带只解码该条带；
+    否则只能先完整解码一次原图，再逐条带处理。
+    PNG 按条带压缩写出，不需要完整的结果图；Qt 的其它编码器（JPEG）只接受完整图片，
+    结果按每像素 3 字节（有透明通道时 4 字节）拼接后一次写出，这是无法避免的整图分配。
+    条带高度按预算扣除上述整图分配后计算，切分位置不穿过任何块或模糊邻域，结果与整图处理一致。
+
+内存预算：
+    打开与保存都在开始解码前按预计的峰值检查 LARGE_IMAGE_MEMORY_BUDGET，超出时抛出 MemoryBudgetError，
+    不会先分配再失败。条带每行的开销包括条带的各份副本与各操作中开销最大的核的临时数据，
+    PNG 逐行转换与压缩，除 zlib 的压缩状态外只多占用一行。Qt 自带的解码器中只有 JPEG 支持缩放解码与区域解码，
+    因此真正保持在预算内的组合是：打开 JPEG，保存为 PNG。
+    完整解码超出预算的 PNG、TIFF、BMP、WebP 等无法打开；保存为 JPEG 时整张结果图须在预算之内。
+"""
+import array
+import math
+import os
+import struct
+import sys
+import zlib
+from PySide6.QtGui import QImage, QImageReader, QImageIOHandler, QPainter
+from PySide6.QtCore import QRect, QSize
+from src.constants.config import LARGE_IMAGE_MEMORY_BUDGET, LARGE_IMAGE_MIN_STRIPE_ROWS
+from src.features.image_loader import get_image_size, get_decoded_bytes, MemoryBudgetError
+from src.features.image_mosaic import coalesce_rects, get_kernel, get_read_margin, get_scratch_bytes
+from src.features.pixel_formats import to_working_format
+
+# 每个条带同时存在的副本数：解码结果、工作格式转换、马赛克处理结果（核的临时数据另按 get_scratch_bytes 计入）
+_STRIPE_COPIES = 3
+
+# zlib 默认参数（windowBits=15、memLevel=8）压缩时的内部状态：(1 << (15 + 2)) + (1 << (8 + 9)) 字节，另加输出缓冲的余量
+_ZLIB_DEFLATE_BYTES = (1 << 17) + (1 << 17) + 64 * 1024
+
+# PNG 文件签名
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 工作格式 -> (写出 PNG 时转换的格式, PNG 颜色类型, 位深)
+_PNG_LAYOUTS = {
+    QImage.Format_RGB32: (QImage.Format_RGB888, 2, 8),
+    QImage.Format_ARGB32_Premultiplied: (QImage.Format_RGBA8888, 6, 8),
+    QImage.Format_Grayscale8: (QImage.Format_Grayscale8, 0, 8),
+    QImage.Format_Grayscale16: (QImage.Format_Grayscale16, 0, 16),
+    QImage.Format_RGBA64_Premultiplied: (QImage.Format_RGBA64, 6, 16),
+}
+
+
+class LargeImageSource:
+    """
+    以预览图编辑的超大图片的原始文件。
+
+    预览图与原图的坐标按宽、高各自的比例换算；
+    预览图上记录的操作（MosaicOperation）经 to_full_operation 换算后在原图上重放。
+    """
+
+    def __init__(self, file_path, full_size, preview_size):
+        """
+        初始化超大图片的原始文件
+
+        Args:
+            file_path: 原始文件路径
+            full_size: 原图尺寸（QSize）
+            preview_size: 预览图尺寸（QSize）
+        """
+        self.file_path = file_path
+        self.full_size = QSize(full_size)
+        self.preview_size = QSize(preview_size)
+
+    @classmethod
+    def for_image(cls, file_path, image):
+        """
+        加载结果是预览图（尺寸小于文件中的原图）时创建，否则返回 None
+
+        Args:
+            file_path: 图片文件路径
+            image: load_image 返回的图片
+        Returns:
+            LargeImageSource | None
+        """
+        if image is None or image.isNull():
+            return None
+        full_size = get_image_size(file_path)
+        if not full_size.isValid() or full_size == image.size():
+            return None
+        return cls(file_path, full_size, image.size())
+
+    def get_full_size(self):
+        """获取原图尺寸"""
+        return QSize(self.full_size)
+
+    def get_preview_scale(self):
+        """获取预览图相对原图的缩放比例（按宽度）"""
+        return self.preview_size.width() / self.full_size.width()
+
+    def to_full_operation(self, operation):
+        """将预览图上记录的操作换算到原图坐标"""
+        return operation.scaled(self.full_size.width() / self.preview_size.width(),
+                                self.full_size.height() / self.preview_size.height())
+
+    def render_stripes(self, operations, max_bytes=LARGE_IMAGE_MEMORY_BUDGET, reserved_bytes=0):
+        """
+        以原分辨率逐条带重放操作。
+        预算在调用时立即检查（此时尚未解码任何条带），返回的生成器再逐条带解码与处理。
+
+        Args:
+            operations: 预览图上记录的操作列表（按顺序）
+            max_bytes: 内存预算（字节）
+            reserved_bytes: 预算中已被调用方占用的字节数（如拼接结果的整图）
+        Returns:
+            generator: 依次产生 (条带首行, 处理后的条带 QImage)
+        Raises:
+            MemoryBudgetError: 预算扣除 reserved_bytes（与需要完整解码的原图）后容纳不下
+                LARGE_IMAGE_MIN_STRIPE_ROWS 行，或无法切分的最高条带超出预算
+            ValueError: 原始文件无法解码
+        """
+        operations = [self.to_full_operation(operation) for operation in operations]
+        width, height = self.full_size.width(), self.full_size.height()
+        reader = QImageReader(self.file_path)
+        row_bytes = get_decoded_bytes(QSize(width, 1), reader.imageFormat())
+        # 操作依次处理，同一时刻只有一个核的临时数据
+        scratch_bytes = max((get_scratch_bytes(operation.mode, row_bytes // width) for operation in operations),
+                            default=0)
+        stripe_row_bytes = row_bytes * _STRIPE_COPIES + scratch_bytes * width
+        clip = reader.supportsOption(QImageIOHandler.ClipRect)
+        if not clip:
+            # 解码器不支持区域解码，只能完整解码一次，再从中逐条带复制
+            reserved_bytes += get_decoded_bytes(self.full_size, reader.imageFormat())
+        stripe_rows = (max_bytes - reserved_bytes) // stripe_row_bytes
+        if stripe_rows < LARGE_IMAGE_MIN_STRIPE_ROWS:
+            raise MemoryBudgetError(reserved_bytes + LARGE_IMAGE_MIN_STRIPE_ROWS * stripe_row_bytes, max_bytes)
+        stripes = plan_stripes(operations, height, stripe_rows)
+        # 选区或模糊邻域无法切分时条带会超过 stripe_rows
+        tallest = max(bottom - top for top, bottom in stripes)
+        if reserved_bytes + tallest * stripe_row_bytes > max_bytes:
+            raise MemoryBudgetError(reserved_bytes + tallest * stripe_row_bytes, max_bytes)
+
+        full = None
+        if not clip:
+            full = to_working_format(reader.read())
+            if full.isNull():
+                raise ValueError(f"无法解码图片: {self.file_path}")
+        return self._iter_stripes(operations, stripes, full)
+
+    def _iter_stripes(self, operations, stripes, full):
+        """逐条带解码（full 不为 None 时从完整解码的原图复制）并重放操作"""
+        width = self.full_size.width()
+        for top, bottom in stripes:
+            area = QRect(0, top, width, bottom - top)
+            if full is not None:
+                stripe = full.copy(area)
+            else:
+                stripe_reader = QImageReader(self.file_path)
+                stripe_reader.setClipRect(area)
+                stripe = to_working_format(stripe_reader.read())
+            if stripe.isNull():
+                raise ValueError(f"无法解码图片: {self.file_path}")
+            for operation in operations:
+                stripe = _apply_to_stripe(operation, stripe, top)
+            yield top, stripe
+
+    def save(self, file_path, operations, max_bytes=LARGE_IMAGE_MEMORY_BUDGET):
+        """
+        以原分辨率重放操作并保存
+
+        Args:
+            file_path: 保存路径（.png 按条带写出，其它格式拼接后由 Qt 写出）
+            operations: 预览图上记录的操作列表
+            max_bytes: 内存预算（字节）
+        Returns:
+            bool: 是否保存成功
+        Raises:
+            MemoryBudgetError: 预计的峰值超出预算（此时不创建文件）
+            OSError, ValueError: 读取原图或写出失败（未写完的文件已删除）
+        """
+        png = file_path.lower().endswith(".png")
+        has_alpha = False
+        if not png:
+            source_format = QImageReader(self.file_path).imageFormat()
+            has_alpha = source_format != QImage.Format_Invalid and QImage(1, 1, source_format).hasAlphaChannel()
+        if png:
+            resident_bytes = _PngStripeWriter.get_resident_bytes(self.full_size)
+        else:
+            resident_bytes = _ImageStripeWriter.get_resident_bytes(self.full_size, has_alpha)
+        stripes = self.render_stripes(operations, max_bytes, resident_bytes)
+        writer = None
+        try:
+            if png:
+                writer = _PngStripeWriter(file_path, self.full_size)
+            else:
+                writer = _ImageStripeWriter(file_path, self.full_size, has_alpha)
+            for top, stripe in stripes:
+                writer.write(top, stripe)
+            return writer.close()
+        except (OSError, ValueError):
+            if writer is not None:
+                writer.discard()
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            raise
+
+
+def plan_stripes(operations, height, stripe_rows):
+    """
+    规划分条带处理的切分位置。
+    切分行不穿过任何块对齐核的块行，也不落在模糊等核读取的邻域内；
+    有网格锚定的操作时切分行是各锚定块大小的公倍数，条带内的网格与整图一致。
+    找不到合适的切分行时条带会超过 stripe_rows（最多为整张图片）。
+    参数：
+        operations (list[MosaicOperation]): 原图坐标系的操作列表
+        height (int): 图片高度
+        stripe_rows (int): 期望的条带行数
+    返回：
+        list[tuple]: [(条带首行, 条带结束行(不含)), ...]
+    """
+    period = 1
+    constraints = []  # (起始行, 结束行, 步长, 原点)：切分行 c 在 (起始行, 结束行) 内时须满足 (c - 原点) % 步长 == 0，步长 0 表示不可切分
+    for operation in operations:
+        kernel = get_kernel(operation.mode)
+        margin = get_read_margin(operation.mode, operation.block_size)
+        for rect in coalesce_rects(operation.rects):
+            if kernel.block_aligned and operation.anchored:
+                period = math.lcm(period, operation.block_size)
+            elif kernel.block_aligned:
+                constraints.append((rect.top(), rect.bottom() + 1, operation.block_size, rect.top()))
+            if margin:
+                constraints.append((rect.top() - margin, rect.bottom() + 1 + margin, 0, 0))
+
+    def is_valid(cut):
+        return all(not start < cut < stop or (step and (cut - origin) % step == 0)
+                   for start, stop, step, origin in constraints)
+
+    stripes = []
+    top = 0
+    while top < height:
+        bottom = min(top + stripe_rows, height)
+        if bottom < height:
+            cut = bottom // period * period
+            while cut > top and not is_valid(cut):
+                cut -= period
+            if cut <= top:
+                cut = (bottom // period + 1) * period
+                while cut < height and not is_valid(cut):
+                    cut += period
+            bottom = min(cut, height)
+        stripes.append((top, bottom))
+        top = bottom
+    return stripes
+
+
+def _apply_to_stripe(operation, stripe, top):
+    """
+    把原图坐标系的操作应用到从第 top 行开始的条带：
+    选区先切分为互不相交的矩形（与整图处理相同），再只在垂直方向裁剪，块网格原点不变；
+    裁剪后仍互不相交，apply 时不会被再次切分
+    """
+    bottom = top + stripe.height()
+    rects = []
+    for rect in coalesce_rects(operation.rects):
+        clipped_top, clipped_bottom = max(rect.top(), top), min(rect.bottom() + 1, bottom)
+        if clipped_top < clipped_bottom:
+            rects.append(QRect(rect.left(), clipped_top - top, rect.width(), clipped_bottom - clipped_top))
+    if not rects:
+        return stripe
+    return operation.apply(stripe, rects=rects, row_offset=top)
+
+
+class _PngStripeWriter:
+    """按条带写出 PNG：逐行转换格式、不做预测过滤，以 zlib 流式压缩，同一时刻只缓存一行，不需要完整的结果图"""
+
+    def __init__(self, file_path, size):
+        self.file = open(file_path, "wb")
+        self.size = size
+        self.layout = None
+        self.compressor = zlib.compressobj()
+
+    @staticmethod
+    def get_resident_bytes(size):
+        """写出期间常驻内存的字节数（zlib 压缩状态与一行转换结果、一行待压缩数据，按 16 位 RGBA 估算），创建前用于检查预算"""
+        return _ZLIB_DEFLATE_BYTES + 2 * (size.width() * 8 + 1)
+
+    def write(self, top, stripe):
+        """写出下一个条带（条带必须从上到下依次写出）"""
+        if self.layout is None:
+            # 首个条带决定颜色类型与位深
+            self.layout = _PNG_LAYOUTS[stripe.format()]
+            _output_format, color_type, bit_depth = self.layout
+            self.file.write(_PNG_SIGNATURE)
+            self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", self.size.width(), self.size.height(),
+                                                   bit_depth, color_type, 0, 0, 0))
+        output_format, _color_type, bit_depth = self.layout
+        for y in range(stripe.height()):
+            line = stripe.copy(0, y, stripe.width(), 1).convertToFormat(output_format)
+            row = line.constBits()[:line.width() * line.depth() // 8]
+            if bit_depth == 16 and sys.byteorder == "little":
+                # PNG 的 16 位通道为大端序
+                values = array.array("H", bytes(row))
+                values.byteswap()
+                row = values.tobytes()
+            # 每行以过滤类型 0（不过滤）开头
+            compressed = self.compressor.compress(b"\x00" + row)
+            if compressed:
+                self._write_chunk(b"IDAT", compressed)
+
+    def close(self):
+        """写出剩余的压缩数据与文件尾"""
+        self._write_chunk(b"IDAT", self.compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self.file.close()
+        return True
+
+    def discard(self):
+        """放弃写出（出错时调用，文件由调用方删除）"""
+        self.file.close()
+
+    def _write_chunk(self, tag, data):
+        self.file.write(struct.pack(">I", len(data)) + tag + data)
+        self.file.write(struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+
+class _ImageStripeWriter:
+    """把条带拼接到一张紧凑格式的完整图片，最后由 Qt 一次写出（Qt 编码器只接受完整图片）"""
+
+    def __init__(self, file_path, size, has_alpha):
+        self.file_path = file_path
+        self.image = QImage(size, QImage.Format_ARGB32 if has_alpha else QImage.Format_RGB888)
+        if self.image.isNull():
+            raise OSError(f"无法分配 {size.width()} × {size.height()} 的图片")
+
+    @staticmethod
+    def get_resident_bytes(size, has_alpha):
+        """写出期间常驻内存的字节数（拼接结果的整图，每行按 4 字节对齐），创建前用于检查预算"""
+        depth = 32 if has_alpha else 24
+        return (size.width() * depth + 31) // 32 * 4 * size.height()
+
+    def write(self, top, stripe):
+        """把条带绘制到结果图片的对应位置"""
+        painter = QPainter(self.image)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawImage(0, top, stripe)
+        painter.end()
+
+    def close(self):
+        """写出完整图片"""
+        saved = self.image.save(self.file_path)
+        self.image = None
+        return saved
+
+    def discard(self):
+        """放弃写出，释放结果图片"""
+        self.image = None
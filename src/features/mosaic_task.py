@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+后台马赛克任务模块
+
+用途：
+    在 QThreadPool 中执行 apply_mosaic_batch，通过信号报告进度与结果，并支持中途取消。
+
+使用场景：
+    大图或大选区的马赛克处理耗时较长，放到后台执行可保持界面响应；
+    用户按 Esc、打开新图片或清除图片时取消正在运行的任务。
+"""
+from PySide6.QtCore import QObject, QRunnable, Signal
+from PySide6.QtGui import QImage
+from src.features.image_mosaic import apply_mosaic_batch, coalesce_rects, CancellationToken, MosaicCancelled
+
+
+class MosaicTaskSignals(QObject):
+    """后台马赛克任务的信号（QRunnable 不是 QObject，信号需单独承载）"""
+
+    progress = Signal(int)  # 处理进度（0-100）
+    finished = Signal(QImage, object)  # 处理结果与发生变化的区域列表（互不相交的 QRect）
+    cancelled = Signal()  # 任务被取消
+    failed = Signal(str)  # 处理出错（错误信息）
+
+
+class MosaicTask(QRunnable):
+    """后台马赛克任务"""
+
+    def __init__(self, image, rects, block_size, intensity, mode, cache=None, anchored=False, color_cache=None,
+                 seed=None, engine=None):
+        """
+        初始化后台马赛克任务
+
+        Args:
+            image: 待处理的图片（任务持有其隐式共享副本，不会修改原图）
+            rects: 选区矩形列表（图片坐标系），相交的选区切分为互不相交的矩形后一次处理
+            block_size: 马赛克块大小
+            intensity: 马赛克强度 (0.0-1.0)
+            mode: 取色模式
+            cache: 与图片绑定的积分图缓存
+            anchored: 块网格是否锚定到图片原点
+            color_cache: 与图片绑定的块颜色缓存（网格锚定时使用）
+            seed: 随机种子（noise 核使用，记录后可精确重放）
+            engine: 处理引擎（与记录的操作相同，重放时得到同样的结果），None 表示默认引擎
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+        self.image = QImage(image)
+        self.rects = coalesce_rects(rects)
+        self.block_size = block_size
+        self.intensity = intensity
+        self.mode = mode
+        self.cache = cache
+        self.anchored = anchored
+        self.color_cache = color_cache
+        self.seed = seed
+        self.engine = engine
+        self.token = CancellationToken()
+        self.signals = MosaicTaskSignals()
+
+    def cancel(self):
+        """请求取消任务（在当前条带处理完后生效）"""
+        self.token.cancel()
+
+    def is_cancelled(self):
+        """检查任务是否已被请求取消"""
+        return self.token.is_cancelled()
+
+    def run(self):
+        """在线程池中执行马赛克处理"""
+        try:
+            result = apply_mosaic_batch(self.image, self.rects, self.block_size, self.intensity,
+                                        engine=self.engine, mode=self.mode, cache=self.cache,
+                                        progress=self.signals.progress.emit, cancel_token=self.token,
+                                        anchored=self.anchored,
+                                        color_cache=self.color_cache, seed=self.seed)
+        except MosaicCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+
+        if self.token.is_cancelled():
+            self.signals.cancelled.emit()
+        else:
+            self.signals.finished.emit(result, self.rects)
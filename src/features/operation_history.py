@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+操作记录历史模块
+
+用途：
+    以操作（马赛克核、选区、块大小、强度等参数）代替像素快照记录编辑历史，
+    每隔固定步数保存一次完整检查点，任意状态都从最近的检查点重放操作得到。
+
+使用场景：
+    EDIT_HISTORY_MODE 为 "operations" 时由 MainWindow 使用，接口与 EditHistory 相同；
+    内存占用随操作数量而不是图片尺寸增长。
+    检查点与返回的图像都通过 Qt 隐式共享持有，不复制像素；操作只生成新图像，从不原地修改。
+    操作记录可与图片一起保存为 JSON 文件（OPERATION_LOG_SUFFIX），记录得到保存结果的全部参数。
+"""
+import json
+from PySide6.QtGui import QImage, QRegion
+from PySide6.QtCore import QRect, QPoint
+from src.constants.config import MAX_EDIT_HISTORY, OPERATION_HISTORY_CHECKPOINT_INTERVAL
+from src.features.image_mosaic import apply_mosaic_batch, available_engines, get_default_engine
+
+# 操作记录文件格式版本
+OPERATION_LOG_VERSION = 1
+
+
+class MosaicOperation:
+    """
+    一次马赛克操作的完整参数。
+
+    相同的操作作用于相同的图片总是得到相同的结果：操作记录处理时使用的引擎，重放时使用同一引擎
+    （qt 引擎的强度混合与其它引擎每通道最多相差 2；numpy 与 python 引擎逐像素一致，可互相代替），
+    noise 核按 seed 生成随机数，与条带划分和线程数无关。
+    """
+
+    def __init__(self, mode, rects, block_size, intensity, anchored=False, seed=None, engine=None):
+        """
+        初始化马赛克操作
+
+        Args:
+            mode: 马赛克核名称
+            rects: 选区矩形列表（图片坐标系）
+            block_size: 马赛克块大小
+            intensity: 马赛克强度 (0.0-1.0)
+            anchored: 块网格是否锚定到图片原点
+            seed: 随机种子（noise 核使用）
+            engine: 处理引擎，None 表示默认引擎
+        """
+        self.mode = mode
+        self.rects = [QRect(rect) for rect in rects]
+        self.block_size = block_size
+        self.intensity = intensity
+        self.anchored = anchored
+        self.seed = seed
+        self.engine = engine or get_default_engine()
+
+    def apply(self, image, cache=None, color_cache=None, rects=None, row_offset=0):
+        """
+        将操作应用到图片
+
+        Args:
+            image: 图片（不会被修改）
+            cache: 与图片绑定的积分图缓存
+            color_cache: 与图片绑定的块颜色缓存
+            rects: 代替 self.rects 使用的选区（分条带处理时为裁剪到条带内的选区）
+            row_offset: image 为大图中的水平条带时，条带首行在大图中的行号
+        Returns:
+            QImage: 处理后的图片
+        """
+        # 记录时的 numpy 引擎在未安装 NumPy 的环境中由结果一致的 python 引擎代替
+        engine = self.engine if self.engine in available_engines() else get_default_engine()
+        return apply_mosaic_batch(image, self.rects if rects is None else rects, self.block_size, self.intensity,
+                                  engine=engine, mode=self.mode, cache=cache, anchored=self.anchored,
+                                  color_cache=color_cache, seed=self.seed, row_offset=row_offset)
+
+    def get_dirty_region(self):
+        """
+        获取操作可能改变的区域（马赛克核只写入选区内的像素）
+
+        Returns:
+            QRegion: 全部选区的并集（图片坐标系）
+        """
+        region = QRegion()
+        for rect in self.rects:
+            region += rect.normalized()
+        return region
+
+    def scaled(self, scale_x, scale_y):
+        """
+        按比例换算到另一分辨率（预览图上记录的操作换算到原图）
+
+        Args:
+            scale_x: 水平缩放比例（目标宽度 / 当前宽度）
+            scale_y: 垂直缩放比例
+        Returns:
+            MosaicOperation: 换算后的操作（块大小按水平比例缩放）
+        """
+        rects = [QRect(QPoint(round(rect.left() * scale_x), round(rect.top() * scale_y)),
+                       QPoint(round((rect.right() + 1) * scale_x) - 1, round((rect.bottom() + 1) * scale_y) - 1))
+                 for rect in self.rects]
+        return MosaicOperation(self.mode, rects, max(1, round(self.block_size * scale_x)), self.intensity,
+                               self.anchored, self.seed, self.engine)
+
+    def to_dict(self):
+        """转换为可写入 JSON 的字典"""
+        return {
+            "mode": self.mode,
+            "rects": [[rect.x(), rect.y(), rect.width(), rect.height()] for rect in self.rects],
+            "block_size": self.block_size,
+            "intensity": self.intensity,
+            "anchored": self.anchored,
+            "seed": self.seed,
+            "engine": self.engine,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """从 to_dict 生成的字典创建操作"""
+        return cls(data["mode"], [QRect(*rect) for rect in data["rects"]], data["block_size"],
+                   data["intensity"], data.get("anchored", False), data.get("seed"), data.get("engine"))
+
+
+class OperationEntry:
+    """操作历史中的一步：一次操作，或以完整图像开始的新状态（如加载图片）"""
+
+    def __init__(self, operation=None, checkpoint=None):
+        """
+        初始化历史步骤
+
+        Args:
+            operation: 马赛克操作；None 表示该步直接以 checkpoint 为结果
+            checkpoint: 该步结果的完整图像（检查点），None 表示需要重放得到
+        """
+        self.operation = operation
+        self.checkpoint = checkpoint
+
+
+class OperationHistory:
+    """操作记录历史管理器（与 EditHistory 接口相同）"""
+
+    def __init__(self, max_history=MAX_EDIT_HISTORY, checkpoint_interval=OPERATION_HISTORY_CHECKPOINT_INTERVAL):
+        """
+        初始化操作记录历史管理器
+
+        Args:
+            max_history: 最大历史记录数，默认使用配置值
+            checkpoint_interval: 每隔多少次操作保存一次完整检查点
+        """
+        self.max_history = max_history
+        self.checkpoint_interval = checkpoint_interval
+        self.entries = []  # entries[i] 产生第 i 个状态；entries[0] 总带有检查点
+        self.current_index = -1
+        self.current_image = None  # 当前状态的图像，重做时在其上应用下一步操作
+        self.trimmed_operations = []  # 因超出最大记录数被移除、但仍属于当前图片的操作（保存操作记录时需要）
+        self.last_change_rect = None
+        self.replayed = 0  # 累计重放的操作数
+
+    def add_state(self, image):
+        """添加新的状态到历史记录（以完整图像开始，如加载图片）"""
+        if image is None or image.isNull():
+            return
+        self._append(OperationEntry(checkpoint=QImage(image)), image)
+
+    def add_operation(self, operation, image):
+        """
+        记录一次操作
+
+        Args:
+            operation: 马赛克操作
+            image: 操作的结果（用作当前状态，必要时保存为检查点）
+        """
+        if image is None or image.isNull():
+            return
+        if self.current_image is None:
+            # 还没有起始图像，无法重放，只能按完整图像记录
+            self.add_state(image)
+            return
+        entry = OperationEntry(operation)
+        if self.current_index + 1 - self._checkpoint_index(self.current_index) >= self.checkpoint_interval:
+            entry.checkpoint = QImage(image)
+        self._append(entry, image)
+
+    def can_undo(self):
+        """检查是否可以撤销"""
+        return self.current_index > 0
+
+    def can_redo(self):
+        """检查是否可以重做"""
+        return self.current_index < len(self.entries) - 1
+
+    def undo(self):
+        """撤销操作（从最近的检查点重放）"""
+        if not self.can_undo():
+            return None
+
+        self.current_index -= 1
+        self.current_image = self.rebuild(self.current_index)
+        self.last_change_rect = self._change_region(self.current_index + 1)
+        return self.current_image
+
+    def redo(self):
+        """重做操作（在当前状态上应用下一步操作）"""
+        if not self.can_redo():
+            return None
+
+        self.current_index += 1
+        entry = self.entries[self.current_index]
+        if entry.checkpoint is not None:
+            self.current_image = QImage(entry.checkpoint)
+        else:
+            self.current_image = entry.operation.apply(self.current_image)
+            self.replayed += 1
+        self.last_change_rect = self._change_region(self.current_index)
+        return self.current_image
+
+    def clear(self):
+        """清空历史记录"""
+        self.entries.clear()
+        self.current_index = -1
+        self.current_image = None
+        self.trimmed_operations = []
+        self.last_change_rect = None
+
+    def get_current_state(self):
+        """获取当前状态（隐式共享的只读快照）"""
+        if self.current_image is not None:
+            return QImage(self.current_image)
+        return None
+
+    def get_last_change_rect(self):
+        """
+        获取最近一次撤销/重做改变的区域
+
+        Returns:
+            QRegion | None: 被撤销或重做的操作的选区（图片坐标系）；None 表示整图替换或尚无撤销/重做
+        """
+        return self.last_change_rect
+
+    def is_empty(self):
+        """检查历史记录是否为空"""
+        return len(self.entries) == 0
+
+    def rebuild(self, index):
+        """
+        从不晚于 index 的最近检查点重放操作，重建第 index 个状态
+
+        Args:
+            index: 状态序号
+        Returns:
+            QImage: 该状态的图像
+        """
+        start = self._checkpoint_index(index)
+        image = QImage(self.entries[start].checkpoint)
+        for entry in self.entries[start + 1:index + 1]:
+            image = entry.operation.apply(image)
+            self.replayed += 1
+        return image
+
+    def get_operations(self):
+        """
+        获取从最近一次完整图像状态（如加载图片）到当前状态的操作列表，用于保存操作记录
+
+        Returns:
+            list[MosaicOperation]: 操作列表
+        """
+        operations = []
+        for entry in reversed(self.entries[:self.current_index + 1]):
+            if entry.operation is None:
+                return operations[::-1]
+            operations.append(entry.operation)
+        # 起始的完整图像状态已被移除，补上被移除的操作
+        return self.trimmed_operations + operations[::-1]
+
+    def stats(self):
+        """
+        获取历史记录统计
+
+        Returns:
+            dict: states/operations/checkpoints/checkpoint_bytes/replayed/image_copies
+                  （每次重放操作都会生成一张新图像，image_copies 与 replayed 相同）
+        """
+        checkpoints = [entry.checkpoint for entry in self.entries if entry.checkpoint is not None]
+        return {
+            "states": len(self.entries),
+            "operations": sum(1 for entry in self.entries if entry.operation is not None),
+            "checkpoints": len(checkpoints),
+            "checkpoint_bytes": sum(image.sizeInBytes() for image in checkpoints),
+            "replayed": self.replayed,
+            "image_copies": self.replayed,
+        }
+
+    def _append(self, entry, image):
+        """追加一步并成为当前状态，超出最大记录数时移除最老的状态"""
+        # 移除当前索引之后的状态（当用户撤销后进行了新操作时）
+        del self.entries[self.current_index + 1:]
+        self.entries.append(entry)
+        self.current_index += 1
+        self.current_image = image
+
+        if len(self.entries) > self.max_history:
+            # 新的第一步必须带有检查点，才能作为重放的起点
+            if self.entries[1].checkpoint is None:
+                self.entries[1].checkpoint = self.rebuild(1)
+            oldest = self.entries.pop(0)
+            if oldest.operation is None:
+                self.trimmed_operations = []
+            else:
+                self.trimmed_operations.append(oldest.operation)
+            self.current_index -= 1
+
+    def _change_region(self, index):
+        """获取第 index 步相对上一状态改变的区域（以完整图像开始的步骤为 None）"""
+        operation = self.entries[index].operation
+        return operation.get_dirty_region() if operation is not None else None
+
+    def _checkpoint_index(self, index):
+        """获取不晚于 index 的最近检查点序号"""
+        while self.entries[index].checkpoint is None:
+            index -= 1
+        return index
+
+
+def save_operation_log(file_path, operations, source=None):
+    """
+    保存操作记录。
+    参数：
+        file_path (str): 文件路径
+        operations (list[MosaicOperation]): 操作列表
+        source (str | None): 原始图片的文件名
+    异常：
+        OSError: 文件写入失败
+    """
+    data = {
+        "version": OPERATION_LOG_VERSION,
+        "source": source,
+        "operations": [operation.to_dict() for operation in operations],
+    }
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+像素格式模块
+
+用途：
+    定义马赛克处理使用的工作格式，提供格式归一化与按通道访问像素缓冲区的工具。
+
+使用场景：
+    load_image 在加载时把图片一次性转换为工作格式；马赛克引擎与积分图缓存
+    按工作格式的通道布局直接读写像素缓冲区，不再逐像素经过 QColor 转换，
+    透明通道与灰度/16 位深度得以保留。
+"""
+import sys
+from PySide6.QtGui import QImage
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# 32 位像素按字节访问时 R/G/B 三个通道所在的下标
+COLOR_BYTES = [0, 1, 2] if sys.byteorder == "little" else [1, 2, 3]
+
+# 32 位像素按字节访问时 alpha 通道所在的下标
+ALPHA_BYTE = 3 if sys.byteorder == "little" else 0
+
+# 工作格式的通道布局：格式 -> (通道数据类型, 每像素通道数, 参与取色与混合的通道下标)
+# RGB32 的 alpha 字节恒为 0xFF，不参与计算；预乘格式的各通道（含 alpha）可直接线性混合
+CHANNEL_LAYOUTS = {
+    QImage.Format_RGB32: ("uint8", 4, COLOR_BYTES),
+    QImage.Format_ARGB32_Premultiplied: ("uint8", 4, [0, 1, 2, 3]),
+    QImage.Format_Grayscale8: ("uint8", 1, [0]),
+    QImage.Format_Grayscale16: ("uint16", 1, [0]),
+    QImage.Format_RGBA64_Premultiplied: ("uint16", 4, [0, 1, 2, 3]),
+}
+
+# 马赛克处理的工作格式
+WORKING_FORMATS = tuple(CHANNEL_LAYOUTS.keys())
+
+# 每通道超过 8 位的格式，统一为 16 位预乘格式以保留位深
+_HIGH_DEPTH_FORMATS = (
+    QImage.Format_RGBX64,
+    QImage.Format_RGBA64,
+    QImage.Format_BGR30,
+    QImage.Format_A2BGR30_Premultiplied,
+    QImage.Format_RGB30,
+    QImage.Format_A2RGB30_Premultiplied,
+    QImage.Format_RGBX16FPx4,
+    QImage.Format_RGBA16FPx4,
+    QImage.Format_RGBA16FPx4_Premultiplied,
+    QImage.Format_RGBX32FPx4,
+    QImage.Format_RGBA32FPx4,
+    QImage.Format_RGBA32FPx4_Premultiplied,
+)
+
+# 使用颜色表的格式：颜色表全为不透明灰度时归一化为 Grayscale8
+_INDEXED_FORMATS = (
+    QImage.Format_Indexed8,
+    QImage.Format_Mono,
+    QImage.Format_MonoLSB,
+)
+
+
+def get_working_format(image: QImage) -> QImage.Format:
+    """
+    获取图片应使用的工作格式。
+    规则：
+        已是工作格式的保持不变；
+        灰度颜色表的索引图片 -> Grayscale8；
+        每通道超过 8 位的格式 -> RGBA64_Premultiplied；
+        其余带透明通道的格式 -> ARGB32_Premultiplied，不透明格式 -> RGB32。
+    参数：
+        image (QImage): 图片
+    返回：
+        QImage.Format: 工作格式
+    """
+    fmt = image.format()
+    if fmt in WORKING_FORMATS:
+        return fmt
+    if fmt in _INDEXED_FORMATS and _is_gray_table(image.colorTable()):
+        return QImage.Format_Grayscale8
+    if fmt in _HIGH_DEPTH_FORMATS:
+        return QImage.Format_RGBA64_Premultiplied
+    return QImage.Format_ARGB32_Premultiplied if image.hasAlphaChannel() else QImage.Format_RGB32
+
+
+def to_working_format(image: QImage) -> QImage:
+    """
+    将图片转换为工作格式（已是工作格式时直接返回原图，不复制）。
+    参数：
+        image (QImage): 图片
+    返回：
+        QImage: 工作格式的图片
+    """
+    if image is None or image.isNull():
+        return image
+    working_format = get_working_format(image)
+    if image.format() == working_format:
+        return image
+    return image.convertToFormat(working_format)
+
+
+def get_format_name(fmt: QImage.Format) -> str:
+    """
+    获取像素格式的简短名称（去掉 Format_ 前缀），用于界面显示。
+    参数：
+        fmt (QImage.Format): 像素格式
+    返回：
+        str: 格式名称，如 "ARGB32_Premultiplied"
+    """
+    name = fmt.name
+    return name[len("Format_"):] if name.startswith("Format_") else name
+
+
+def get_channel_layout(fmt: QImage.Format):
+    """
+    获取工作格式的通道布局。
+    参数：
+        fmt (QImage.Format): 像素格式
+    返回：
+        tuple | None: (通道数据类型名, 每像素通道数, 参与计算的通道下标)，非工作格式返回 None
+    """
+    return CHANNEL_LAYOUTS.get(fmt)
+
+
+def get_alpha_channel(fmt: QImage.Format):
+    """
+    获取工作格式中 alpha 通道的下标。
+    参数：
+        fmt (QImage.Format): 像素格式
+    返回：
+        int | None: alpha 通道下标，灰度格式没有 alpha 通道时返回 None
+    """
+    if fmt == QImage.Format_RGBA64_Premultiplied:
+        return 3
+    if fmt in (QImage.Format_RGB32, QImage.Format_ARGB32_Premultiplied):
+        return ALPHA_BYTE
+    return None
+
+
+def channel_array(image: QImage, writable: bool = False):
+    """
+    以零拷贝方式将工作格式图片的像素缓冲区视作 (高, 宽, 通道数) 的 NumPy 数组。
+    每行可能包含对齐填充，按 bytesPerLine 取行后再截取有效宽度。
+    参数：
+        image (QImage): 工作格式的图片
+        writable (bool): True 时通过 bits() 取得可写视图（必要时先脱离隐式共享）
+    返回：
+        ndarray: 像素数组，通道顺序与内存字节顺序一致
+    """
+    dtype, channels, _used = CHANNEL_LAYOUTS[image.format()]
+    buffer = image.bits() if writable else image.constBits()
+    item_size = np.dtype(dtype).itemsize
+    rows = np.frombuffer(buffer, dtype=dtype).reshape(image.height(), image.bytesPerLine() // item_size)
+    return rows[:, :image.width() * channels].reshape(image.height(), image.width(), channels)
+
+
+def _is_gray_table(color_table) -> bool:
+    """检查颜色表是否全为不透明灰度"""
+    if not color_table:
+        return False
+    for rgb in color_table:
+        red, green, blue = (rgb >> 16) & 0xFF, (rgb >> 8) & 0xFF, rgb & 0xFF
+        if (rgb >> 24) & 0xFF != 0xFF or red != green or green != blue:
+            return False
+    return True
@@ -2,14 +2,21 @@
 """
 图像显示组件模块 - 包含图像显示和选择功能
 """
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QScrollArea, QMessageBox
-from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QPixmap
-from src.utils.selectable_label import SelectableLabel
+import os
+from PySide6.QtWidgets import QWidget, QVBoxLayout
+from PySide6.QtCore import Signal, QRect, QPoint, QSize, QTimer
+from src.gui.image_viewport import ImageViewport
 from src.localization import tr
-from src.features.image_loader import load_image
+from src.features.integral_cache import IntegralImageCache
+from src.features.block_color_cache import BlockColorCache
+from src.features.image_pyramid import ImagePyramid
+from src.features.display_tiles import DisplayTileCache
+from src.features.image_mosaic import apply_mosaic_batch, coalesce_rects, get_read_margin, get_preview_engine
+from src.features.pixel_formats import to_working_format
 from src.constants.config import (
-    IMAGE_VIEWER_MIN_WIDTH, IMAGE_VIEWER_MIN_HEIGHT, IMAGE_VIEWER_BACKGROUND_COLOR, IMAGE_VIEWER_BORDER_STYLE
+    IMAGE_VIEWER_MIN_WIDTH, IMAGE_VIEWER_MIN_HEIGHT, IMAGE_VIEWER_BACKGROUND_COLOR, IMAGE_VIEWER_BORDER_STYLE,
+    PREVIEW_INTERVAL_MS, UI_LIVE_PREVIEW_DEFAULT, IMAGE_VIEWER_RESIZE_SETTLE_MS,
+    IMAGE_VIEWER_ZOOM_STEP
 )
 
 
@@ -19,12 +26,25 @@ class ImageViewer(QWidget):
     # 信号定义
     selection_made = Signal(object)  # 发出选择区域
     image_loaded = Signal(str)  # 发出图像路径
+    zoom_changed = Signal(float)  # 发出缩放比例（屏幕像素 / 当前图像像素）
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_image = None
-        self.original_image = None
         self.image_path = None
+        # 文件解码得到的原始像素格式（当前图片已归一化为工作格式）
+        self.source_format = None
+        # 当前图片是超大图片的缩小预览时，对应的原始文件（保存时以原分辨率重放操作）
+        self.large_image = None
+        # 当前图片的编辑代数、积分图缓存、网格锚定的块颜色缓存、显示用图像金字塔与显示瓦片（随 current_image 一起维护）
+        self.image_generation = 0
+        self.integral_cache = IntegralImageCache()
+        self.block_color_cache = BlockColorCache()
+        self.pyramid = ImagePyramid()
+        self.tile_cache = DisplayTileCache(self.pyramid)
+        # 实时预览：预览开关与参数 (block_size, intensity, mode, anchored)
+        self.preview_enabled = UI_LIVE_PREVIEW_DEFAULT
+        self.preview_params = None
         self.init_ui()
     
     def init_ui(self):
@@ -32,105 +52,120 @@ class ImageViewer(QWidget):
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         
-        # 创建滚动区域
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setAlignment(Qt.AlignCenter)
-        
-        # 创建可选择的标签
-        self.image_label = SelectableLabel()
-        self.image_label.setAlignment(Qt.AlignCenter)
+        # 创建可缩放、平移并可框选的图像视口（自行处理缩放与平移，不再需要滚动区域）
+        self.image_label = ImageViewport()
         self.image_label.setMinimumSize(IMAGE_VIEWER_MIN_WIDTH, IMAGE_VIEWER_MIN_HEIGHT)
         self.image_label.setStyleSheet(f"QLabel {{ background-color: {IMAGE_VIEWER_BACKGROUND_COLOR}; border: {IMAGE_VIEWER_BORDER_STYLE}; }}")
         self.image_label.selection_completed.connect(self.on_selection_completed)
+        self.image_label.selection_changed.connect(self.schedule_preview)
+        self.image_label.view_changed.connect(self.schedule_preview)
+        self.image_label.zoom_changed.connect(self.zoom_changed.emit)
+        
+        # 预览刷新定时器：间隔内的多次变化合并为一次渲染
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_INTERVAL_MS)
+        self.preview_timer.timeout.connect(self.render_preview)
+        
+        # 调整窗口大小：拖动期间保持缩放比例（只重绘已缓存的瓦片），停止后再重新适应窗口
+        self.resize_settle_timer = QTimer(self)
+        self.resize_settle_timer.setSingleShot(True)
+        self.resize_settle_timer.setInterval(IMAGE_VIEWER_RESIZE_SETTLE_MS)
+        self.resize_settle_timer.timeout.connect(self.refresh_display)
         
-        scroll_area.setWidget(self.image_label)
-        layout.addWidget(scroll_area)
+        layout.addWidget(self.image_label)
         
         self.setLayout(layout)
     
-    def load_image(self, file_path):
-        """加载图像文件 - 使用统一的image_loader"""
-        try:
-            # 使用统一的load_image函数
-            image = load_image(file_path)
-            if image is None:
-                raise ValueError(f"无法加载图片: {file_path}")
-            
-            # 保存原始图像
-            self.original_image = image.copy()
-            self.current_image = image.copy()
-            self.image_path = file_path
-            
-            # 显示图片
-            self.display_image(image)
-            self.image_loaded.emit(file_path)
-            
-            return True
-            
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                tr("error", "Error"),
-                f"{tr('load_failed', 'Load failed')}: {str(e)}"
-            )
+    def set_image(self, image, file_path, source_format=None, large_image=None):
+        """
+        采用已解码的图像作为当前图像（不再重新解码文件，也不复制像素）
+        Args:
+            image: 文件解码得到的图像（未归一化时在此转换为工作格式）
+            file_path: 图像文件路径
+            source_format: 文件解码得到的原始像素格式；None 表示 image 即为解码结果
+            large_image: image 为超大图片的缩小预览时对应的 LargeImageSource
+        Returns:
+            bool: 是否成功
+        """
+        if image is None or image.isNull():
             return False
-    
-    def display_image(self, image):
-        """在标签中显示图像，根据窗口大小自动缩放"""
-        if image and not image.isNull():
-            # 获取标签的当前尺寸
-            label_size = self.image_label.size()
-            
-            # 如果标签还没有尺寸，使用最小尺寸
-            if label_size.width() <= 1 or label_size.height() <= 1:
-                label_size.setWidth(IMAGE_VIEWER_MIN_WIDTH)
-                label_size.setHeight(IMAGE_VIEWER_MIN_HEIGHT)
-            
-            # 将图像缩放到适合标签的大小，保持纵横比
-            pixmap = QPixmap.fromImage(image)
-            scaled_pixmap = pixmap.scaled(
-                label_size,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            self.image_label.setPixmap(scaled_pixmap)
-            self.image_label.adjustSize()
-    
-    def get_selection_rect(self):
-        """获取选择区域 - 转换为原始图像坐标"""
-        display_rect = self.image_label.get_selection_rect()
-        if not display_rect or display_rect.isNull():
-            return display_rect
-        
-        # 获取显示的图片尺寸
-        pixmap = self.image_label.pixmap()
-        if not pixmap or pixmap.isNull():
-            return display_rect
+        self.source_format = source_format if source_format is not None else image.format()
+        self.large_image = large_image
+        image = to_working_format(image)
         
-        # 获取原始图像尺寸
-        if not self.has_image():
-            return display_rect
-        
-        original_width = self.current_image.width()
-        original_height = self.current_image.height()
-        display_width = pixmap.width()
-        display_height = pixmap.height()
-        
-        # 计算缩放比例
-        scale_x = original_width / display_width
-        scale_y = original_height / display_height
+        self.current_image = image
+        self.image_path = file_path
+        self.image_generation += 1
+        self.integral_cache.bind(self.current_image, self.image_generation)
+        self.block_color_cache.bind(self.current_image, self.image_generation)
+        self.pyramid.bind(self.current_image, self.image_generation)
+        self.tile_cache.bind(self.current_image, self.image_generation)
         
-        # 转换坐标到原始图像（display_rect已经是图片相对坐标）
-        from PySide6.QtCore import QRect
-        original_rect = QRect(
-            int(display_rect.x() * scale_x),
-            int(display_rect.y() * scale_y),
-            int(display_rect.width() * scale_x),
-            int(display_rect.height() * scale_y)
-        )
+        # 移除加载提示并显示图片（适应窗口）
+        self.image_label.clear()
+        self.display_image()
+        self.image_loaded.emit(file_path)
         
-        return original_rect
+        return True
+    
+    def display_image(self, keep_view=False):
+        """
+        在视口中显示当前图像（按可见范围分块绘制）
+        Args:
+            keep_view: 是否保持当前的缩放比例与位置；否则缩放到适应窗口
+        """
+        if self.has_image():
+            self.image_label.set_tile_source(self.tile_cache, self.current_image.size(), keep_view)
+            self.schedule_preview()
+    
+    def refresh_display(self):
+        """调整窗口大小结束后，适应窗口模式下按新的窗口大小重新缩放"""
+        if self.has_image() and self.image_label.is_fit_mode():
+            self.image_label.fit_to_window()
+    
+    def zoom_in(self):
+        """放大"""
+        self.image_label.zoom_by(IMAGE_VIEWER_ZOOM_STEP)
+    
+    def zoom_out(self):
+        """缩小"""
+        self.image_label.zoom_by(1 / IMAGE_VIEWER_ZOOM_STEP)
+    
+    def fit_to_window(self):
+        """缩放到适应窗口"""
+        if self.has_image():
+            self.image_label.fit_to_window()
+    
+    def zoom_actual_size(self):
+        """按实际像素（100%）显示"""
+        self.image_label.set_zoom(1.0)
+    
+    def get_zoom(self):
+        """获取当前缩放比例（屏幕像素 / 当前图像像素）"""
+        return self.image_label.get_zoom()
+    
+    def get_selection_rects(self):
+        """获取全部选择区域（图像坐标，视口中的选区本身就以图像坐标保存）"""
+        rects = [rect.normalized() for rect in self.image_label.get_selection_rects()]
+        return [rect for rect in rects if rect.isValid()]
+    
+    def show_loading(self, file_path):
+        """
+        后台加载期间显示占位提示（当前图像保留，加载取消或失败时由 hide_loading 恢复显示）
+        Args:
+            file_path: 正在加载的文件路径
+        """
+        self.preview_timer.stop()
+        self.image_label.set_overlay(None)
+        self.clear_selection()
+        self.image_label.setText(tr("loading_image", "Loading {}...").format(os.path.basename(file_path)))
+    
+    def hide_loading(self):
+        """移除占位提示，恢复显示当前图像"""
+        self.image_label.clear()
+        if self.has_image():
+            self.display_image(keep_view=True)
     
     def clear_selection(self):
         """清除选择区域"""
@@ -140,10 +175,18 @@ class ImageViewer(QWidget):
         """清除图像"""
         # 清除当前图像
         self.current_image = None
-        self.original_image = None
         self.image_path = None
+        self.source_format = None
+        self.large_image = None
+        self.image_generation += 1
+        self.integral_cache.bind(None, self.image_generation)
+        self.block_color_cache.bind(None, self.image_generation)
+        self.pyramid.bind(None, self.image_generation)
+        self.tile_cache.bind(None, self.image_generation)
         
-        # 清除标签中的图像
+        # 清除视口中的图像
+        self.resize_settle_timer.stop()
+        self.image_label.set_tile_source(None, QSize())
         self.image_label.clear()
         
         # 清除选择区域
@@ -157,14 +200,130 @@ class ImageViewer(QWidget):
         """获取当前图像"""
         return self.current_image
     
-    def get_original_image(self):
-        """获取原始图像"""
-        return self.original_image
+    def get_format_info(self):
+        """
+        获取当前图像的像素格式信息
+        Returns:
+            tuple: (文件解码得到的原始格式, 当前使用的工作格式)，没有图像时为 (None, None)
+        """
+        if not self.has_image():
+            return None, None
+        return self.source_format, self.current_image.format()
+    
+    def get_large_image(self):
+        """获取当前图片对应的超大图片原始文件（LargeImageSource），当前图片不是预览图时为 None"""
+        return self.large_image
+    
+    def get_integral_cache(self):
+        """获取当前图像的积分图缓存"""
+        return self.integral_cache
+    
+    def get_block_color_cache(self):
+        """获取当前图像的块颜色缓存（网格锚定模式使用）"""
+        return self.block_color_cache
+    
+    def get_pixmap_conversions(self):
+        """获取显示时转换为 QPixmap 的累计次数（每个显示瓦片生成时转换一次）"""
+        return self.tile_cache.stats()["rendered"]
+    
+    def get_image_generation(self):
+        """获取当前图像的编辑代数（每次加载、清除或更新图像时递增）"""
+        return self.image_generation
     
-    def update_image(self, new_image):
-        """更新当前图像"""
-        self.current_image = new_image.copy()
-        self.display_image(new_image)
+    def update_image(self, new_image, dirty_rect=None):
+        """
+        更新当前图像（不复制：与调用方共享同一个 QImage，撤销/重做时由编辑历史原地修改）
+        Args:
+            new_image: 新图像
+            dirty_rect: 相对上一状态发生变化的区域（QRect 或 QRegion）；None 表示整图替换
+        """
+        resized = self.current_image is None or new_image.size() != self.current_image.size()
+        self.current_image = new_image
+        self.image_generation += 1
+        self.integral_cache.advance(self.current_image, self.image_generation, dirty_rect)
+        self.block_color_cache.advance(self.current_image, self.image_generation, dirty_rect)
+        self.pyramid.advance(self.current_image, self.image_generation, dirty_rect)
+        self.tile_cache.advance(self.current_image, self.image_generation, dirty_rect)
+        if dirty_rect is None or resized:
+            self.display_image(keep_view=not resized)
+        else:
+            # 只重绘变化区域对应的控件范围，其余瓦片与金字塔级别保持缓存
+            self.image_label.update_image_rect(dirty_rect)
+            self.schedule_preview()
+    
+    def set_preview_enabled(self, enabled):
+        """开启或关闭实时预览"""
+        self.preview_enabled = enabled
+        self.schedule_preview()
+    
+    def set_preview_params(self, block_size, intensity, mode, anchored=False):
+        """
+        设置实时预览参数
+        Args:
+            block_size: 原图分辨率下的块大小（预览时按显示比例缩放）
+            intensity: 马赛克强度 (0.0-1.0)
+            mode: 马赛克核名称
+            anchored: 块网格是否锚定到图片原点
+        """
+        self.preview_params = (block_size, intensity, mode, anchored)
+        self.schedule_preview()
+    
+    def schedule_preview(self, *args):
+        """安排一次预览刷新（定时器运行期间的后续变化在同一次刷新中体现）"""
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
+    
+    def render_preview(self):
+        """
+        在显示分辨率下渲染选区马赛克预览。
+        只处理选区与可见范围相交的部分，全分辨率处理仅在应用马赛克时进行。
+        """
+        if not self.has_image():
+            return
+        
+        # 与应用马赛克时一样先在图片坐标系中切分为互不相交的矩形，预览的块网格与最终结果一致
+        rects = coalesce_rects(self.image_label.get_selection_rects())
+        if not self.preview_enabled or self.preview_params is None or not rects:
+            self.image_label.set_overlay(None)
+            return
+        
+        # 块大小按显示比例缩放，使预览中的块与最终结果在屏幕上大小一致
+        block_size, intensity, mode, anchored = self.preview_params
+        zoom = self.image_label.get_zoom()
+        preview_block_size = max(1, round(block_size * zoom))
+        visible = self.image_label.get_visible_display_rect()
+        display_rects = []
+        for rect in rects:
+            display_rect = self.image_label.map_rect_to_display(rect)
+            clipped = display_rect.intersected(visible)
+            if clipped.isEmpty():
+                continue
+            # 裁剪后的起点退回到块网格上，平移时块的位置保持不变
+            origin_x, origin_y = (0, 0) if anchored else (display_rect.left(), display_rect.top())
+            clipped.setLeft(origin_x + (clipped.left() - origin_x) // preview_block_size * preview_block_size)
+            clipped.setTop(origin_y + (clipped.top() - origin_y) // preview_block_size * preview_block_size)
+            display_rects.append(clipped)
+        if not display_rects:
+            self.image_label.set_overlay(None)
+            return
+        
+        # 底图包含模糊等核需要读取的选区外像素；网格锚定时底图扩展到完整的块（块颜色取整块的平均）
+        margin = get_read_margin(mode, preview_block_size)
+        bounds = QRect()
+        for rect in display_rects:
+            bounds = bounds.united(rect)
+        bounds = bounds.adjusted(-margin, -margin, margin, margin)
+        if anchored:
+            bounds = QRect(QPoint(bounds.left() // preview_block_size * preview_block_size,
+                                  bounds.top() // preview_block_size * preview_block_size),
+                           QPoint((bounds.right() // preview_block_size + 1) * preview_block_size - 1,
+                                  (bounds.bottom() // preview_block_size + 1) * preview_block_size - 1))
+        bounds = bounds.intersected(QRect(QPoint(0, 0), self.image_label.get_display_size()))
+        frame = self.tile_cache.compose(zoom, bounds)
+        preview = apply_mosaic_batch(frame, [rect.translated(-bounds.topLeft()) for rect in display_rects],
+                                     preview_block_size, intensity, engine=get_preview_engine(), mode=mode,
+                                     workers=1, anchored=anchored)
+        self.image_label.set_overlay(preview, bounds.topLeft(), display_rects)
     
     def on_selection_completed(self, rect):
         """选择完成处理"""
@@ -178,8 +337,7 @@ class ImageViewer(QWidget):
         return 0, 0
     
     def resizeEvent(self, event):
-        """窗口大小改变时重新调整图片大小"""
+        """窗口大小改变时合并连续的调整，停止后再重新适应窗口"""
         super().resizeEvent(event)
-        # 如果有图片，重新显示以适应新的大小
-        if self.has_image() and self.current_image:
-            self.display_image(self.current_image)
\ No newline at end of file
+        if self.has_image():
+            self.resize_settle_timer.start()
\ No newline at end of file
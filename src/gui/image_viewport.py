@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+图像视口模块 - 可缩放、平移的分块图像显示与框选
+"""
+import math
+import time
+from PySide6.QtCore import Qt, Signal, QRect, QPoint, QSize, QTimer
+from PySide6.QtGui import QPainter, QPixmap, QRegion
+from src.utils.selectable_label import SelectableLabel
+from src.constants.config import (
+    IMAGE_VIEWER_MAX_ZOOM, IMAGE_VIEWER_ZOOM_STEP, IMAGE_VIEWER_PREFETCH_TILES, IMAGE_VIEWER_PAINT_BUDGET_MS
+)
+
+
+class ImageViewport(SelectableLabel):
+    """
+    可缩放、平移的图像视口。
+
+    图片由 DisplayTileCache 按屏幕像素分块显示，绘制时只取可见范围内的瓦片；
+    一次重绘中生成瓦片超过时间预算后，其余瓦片先快速缩放显示，空闲时再逐个生成并重绘，
+    同时预先生成可见范围外一圈的瓦片。选区保存在图片坐标系中，任意缩放比例下都指向同一块像素。
+    滚轮以光标位置为中心缩放，按住中键拖动平移；适应窗口模式下随控件大小自动缩放。
+    """
+
+    # 信号定义
+    zoom_changed = Signal(float)  # 缩放比例改变（屏幕像素 / 图片像素）
+    view_changed = Signal()  # 缩放或平移后发出（预览需要按新的可见范围重新渲染）
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tiles = None
+        self.image_size = QSize()
+        self.zoom = 1.0
+        self.offset = QPoint(0, 0)  # 图片左上角在控件中的位置
+        self.fit_mode = True
+        self.pan_origin = None  # 中键拖动平移的上一个位置
+        # 实时预览图层：(显示坐标系中的位置, QPixmap, 裁剪区域)，绘制在瓦片之上
+        self.overlay = None
+
+        # 预先生成瓦片：空闲时每次生成一个，不阻塞交互
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(0)
+        self.prefetch_timer.timeout.connect(self.prefetch_tile)
+
+    def set_tile_source(self, tiles, image_size, keep_view=False):
+        """
+        设置显示的瓦片来源
+        Args:
+            tiles: 当前图片的 DisplayTileCache，None 表示没有图片
+            image_size: 图片尺寸
+            keep_view: 是否保持当前的缩放比例与位置（同尺寸的图片被编辑或撤销/重做时）
+        """
+        self.tiles = tiles
+        self.image_size = QSize(image_size)
+        self.overlay = None
+        if tiles is None:
+            self.prefetch_timer.stop()
+        elif not keep_view:
+            self.fit_to_window()
+            return
+        self.update()
+
+    def update_image_rect(self, rect):
+        """
+        图片被编辑后只重绘变化区域对应的控件范围（变化区域的瓦片已由 DisplayTileCache 丢弃）
+        Args:
+            rect: 图片坐标系中发生变化的区域（QRect 或 QRegion）
+        """
+        if self.tiles is None:
+            return
+        region = QRegion(rect) if isinstance(rect, QRect) else rect
+        for changed in region:
+            self.update(self.tiles.map_dirty_rect(self.zoom, changed).translated(self.offset))
+
+    def get_zoom(self):
+        """获取当前缩放比例（屏幕像素 / 图片像素）"""
+        return self.zoom
+
+    def is_fit_mode(self):
+        """检查是否处于适应窗口模式"""
+        return self.fit_mode
+
+    def get_fit_zoom(self):
+        """获取使整张图片恰好显示在控件内的缩放比例"""
+        if self.image_size.isEmpty():
+            return 1.0
+        return min(self.width() / self.image_size.width(), self.height() / self.image_size.height())
+
+    def fit_to_window(self):
+        """缩放到适应窗口并居中，之后随控件大小自动缩放"""
+        self.fit_mode = True
+        self.apply_zoom(self.get_fit_zoom(), None)
+
+    def set_zoom(self, zoom, anchor=None):
+        """
+        设置缩放比例（退出适应窗口模式）
+        Args:
+            zoom: 新的缩放比例，限制在 [min(适应窗口, 1), IMAGE_VIEWER_MAX_ZOOM] 之间
+            anchor: 缩放前后保持不动的控件坐标（QPoint），None 表示控件中心
+        """
+        if self.tiles is None:
+            return
+        self.fit_mode = False
+        zoom = max(min(self.get_fit_zoom(), 1.0), min(zoom, IMAGE_VIEWER_MAX_ZOOM))
+        self.apply_zoom(zoom, anchor if anchor is not None else self.rect().center())
+
+    def zoom_by(self, factor, anchor=None):
+        """按倍数缩放（factor > 1 放大）"""
+        self.set_zoom(self.zoom * factor, anchor)
+
+    def apply_zoom(self, zoom, anchor):
+        """应用缩放比例；anchor 为 None 时居中，否则保持 anchor 下的图片像素不动"""
+        if anchor is None:
+            offset = QPoint(0, 0)
+        else:
+            # anchor 下的图片坐标在缩放前后保持不变
+            image_x = (anchor.x() - self.offset.x()) / self.zoom
+            image_y = (anchor.y() - self.offset.y()) / self.zoom
+            offset = QPoint(round(anchor.x() - image_x * zoom), round(anchor.y() - image_y * zoom))
+        changed = zoom != self.zoom
+        self.zoom = zoom
+        if changed:
+            self.overlay = None
+        self.set_offset(offset)
+        if changed:
+            self.zoom_changed.emit(zoom)
+
+    def pan_by(self, dx, dy):
+        """平移视图（dx/dy 为屏幕像素）"""
+        self.set_offset(self.offset + QPoint(dx, dy))
+
+    def set_offset(self, offset):
+        """设置图片左上角在控件中的位置（限制在有效范围内：图片小于控件时居中，否则不露出空白）并重绘"""
+        display = self.get_display_size()
+        x, y = offset.x(), offset.y()
+        if display.width() <= self.width():
+            x = (self.width() - display.width()) // 2
+        else:
+            x = min(0, max(self.width() - display.width(), x))
+        if display.height() <= self.height():
+            y = (self.height() - display.height()) // 2
+        else:
+            y = min(0, max(self.height() - display.height(), y))
+        self.offset = QPoint(x, y)
+        self.update()
+        self.view_changed.emit()
+
+    def get_display_size(self):
+        """获取当前缩放比例下图片的显示尺寸"""
+        if self.tiles is None:
+            return QSize()
+        return self.tiles.get_display_size(self.zoom)
+
+    def get_visible_display_rect(self):
+        """获取可见范围（显示坐标系：缩放后的图片，原点为图片左上角）"""
+        return self.rect().translated(-self.offset).intersected(QRect(QPoint(0, 0), self.get_display_size()))
+
+    def map_rect_to_display(self, rect):
+        """将图片坐标系中的矩形转换为显示坐标系（向外取整到整屏幕像素）"""
+        left, top = math.floor(rect.left() * self.zoom), math.floor(rect.top() * self.zoom)
+        right = math.ceil((rect.right() + 1) * self.zoom) - 1
+        bottom = math.ceil((rect.bottom() + 1) * self.zoom) - 1
+        return QRect(QPoint(left, top), QPoint(right, bottom))
+
+    def map_rect_to_widget(self, rect):
+        """将图片坐标系中的矩形转换为控件坐标"""
+        return self.map_rect_to_display(rect.normalized()).translated(self.offset)
+
+    def get_image_relative_pos(self, pos):
+        """
+        将控件坐标转换为图片坐标
+        Args:
+            pos: 控件中的坐标
+        Returns:
+            QPoint: 图片坐标（所在的图片像素），不在图片区域内时返回 None
+        """
+        if self.tiles is None or self.text():
+            return None
+        x = math.floor((pos.x() - self.offset.x()) / self.zoom)
+        y = math.floor((pos.y() - self.offset.y()) / self.zoom)
+        if x < 0 or y < 0 or x >= self.image_size.width() or y >= self.image_size.height():
+            return None
+        return QPoint(x, y)
+
+    def get_image_display_rect(self):
+        """获取图片在控件中的显示区域（可能超出控件），没有图片时返回空矩形"""
+        if self.tiles is None:
+            return QRect()
+        return QRect(self.offset, self.get_display_size())
+
+    def set_overlay(self, image=None, position=None, rects=None):
+        """
+        设置实时预览图层
+        Args:
+            image: 预览图像（QImage），None 表示移除
+            position: 预览图像左上角在显示坐标系中的位置
+            rects: 显示坐标系中需要显示预览的区域（选区），图层只在其中绘制
+        """
+        # 只重绘旧图层与新图层所在的范围
+        dirty = self.overlay[2] if self.overlay is not None else QRegion()
+        if image is None:
+            self.overlay = None
+        else:
+            clip = QRegion()
+            for rect in rects:
+                clip += rect
+            self.overlay = (QPoint(position), QPixmap.fromImage(image), clip)
+            dirty += clip
+        if not dirty.isEmpty():
+            self.update(dirty.translated(self.offset))
+
+    def paintEvent(self, event):
+        """
+        重绘事件：只绘制重绘区域内的瓦片，然后绘制预览图层与选区矩形。
+        """
+        # 父类绘制背景与占位提示（加载期间显示提示，不显示图片）
+        super(SelectableLabel, self).paintEvent(event)
+        if self.tiles is None or self.text():
+            return
+        painter = QPainter(self)
+        # 按重绘区域中的各个矩形取瓦片（拖动选区时只有新旧边框的细长区域需要重绘）
+        tiles = set()
+        for rect in event.region():
+            tile_range = self.tiles.get_tile_range(self.zoom, rect.translated(-self.offset))
+            if tile_range is not None:
+                first_column, last_column, first_row, last_row = tile_range
+                tiles.update((column, row) for row in range(first_row, last_row + 1)
+                             for column in range(first_column, last_column + 1))
+        tile_size = self.tiles.tile_size
+        deadline = time.perf_counter() + IMAGE_VIEWER_PAINT_BUDGET_MS / 1000
+        for column, row in sorted(tiles, key=lambda tile: (tile[1], tile[0])):
+            position = self.offset + QPoint(column * tile_size, row * tile_size)
+            if self.tiles.has_tile(self.zoom, column, row) or time.perf_counter() < deadline:
+                painter.drawPixmap(position, self.tiles.get_tile(self.zoom, column, row))
+            else:
+                self.tiles.draw_fast(painter, self.zoom, column, row, position)
+        if self.overlay is not None:
+            position, pixmap, clip = self.overlay
+            painter.save()
+            painter.setClipRegion(clip.translated(self.offset))
+            painter.drawPixmap(position + self.offset, pixmap)
+            painter.restore()
+        self.paint_selection(painter)
+        painter.end()
+        self.prefetch_timer.start()
+
+    def prefetch_tile(self):
+        """空闲时生成一个尚未缓存的瓦片（先可见范围内，再附近一圈）并重绘该处，还有未生成的瓦片时继续"""
+        if self.tiles is None or self.text():
+            return
+        tile_size = self.tiles.tile_size
+        margin = IMAGE_VIEWER_PREFETCH_TILES * tile_size
+        tile_range = self.tiles.get_tile_range(
+            self.zoom, self.get_visible_display_rect().adjusted(-margin, -margin, margin, margin))
+        if tile_range is None:
+            return
+        visible_range = self.tiles.get_tile_range(self.zoom, self.get_visible_display_rect())
+        first_column, last_column, first_row, last_row = tile_range
+        # 附近的瓦片超过缓存容量时只生成可见的瓦片，以免淘汰可见的瓦片
+        if (last_column - first_column + 1) * (last_row - first_row + 1) > self.tiles.get_capacity():
+            tile_range = visible_range
+        for first_column, last_column, first_row, last_row in (visible_range, tile_range):
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    if not self.tiles.has_tile(self.zoom, column, row):
+                        self.tiles.get_tile(self.zoom, column, row)
+                        self.update(self.tiles.get_tile_rect(self.zoom, column, row).translated(self.offset))
+                        self.prefetch_timer.start()
+                        return
+
+    def mousePressEvent(self, event):
+        """鼠标按下事件：中键开始平移，其它按键交给框选处理"""
+        if event.button() == Qt.MiddleButton and self.tiles is not None:
+            self.pan_origin = event.position().toPoint()
+            self.setCursor(Qt.ClosedHandCursor)
+            return
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        """鼠标移动事件：平移视图或更新框选区域"""
+        if self.pan_origin is not None:
+            position = event.position().toPoint()
+            delta = position - self.pan_origin
+            self.pan_origin = position
+            self.pan_by(delta.x(), delta.y())
+            return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        """鼠标释放事件：结束平移或完成框选"""
+        if event.button() == Qt.MiddleButton and self.pan_origin is not None:
+            self.pan_origin = None
+            self.unsetCursor()
+            return
+        super().mouseReleaseEvent(event)
+
+    def wheelEvent(self, event):
+        """滚轮事件：以光标位置为中心缩放"""
+        steps = event.angleDelta().y() / 120
+        if self.tiles is None or steps == 0:
+            super().wheelEvent(event)
+            return
+        self.zoom_by(IMAGE_VIEWER_ZOOM_STEP ** steps, event.position().toPoint())
+        event.accept()
+
+    def resizeEvent(self, event):
+        """控件大小改变时保持缩放比例，只重新限制位置（适应窗口由 ImageViewer 在调整结束后进行）"""
+        super().resizeEvent(event)
+        if self.tiles is not None:
+            self.set_offset(self.offset)
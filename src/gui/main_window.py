@@ -5,9 +5,10 @@
 """
 
 from PySide6.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QSplitter, QMessageBox)
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QIcon
+from PySide6.QtCore import Qt, QThreadPool
+from PySide6.QtGui import QIcon, QKeySequence, QShortcut
 import os
+import random
 
 from src.localization import tr, set_language, LANGUAGES
 from src.gui.ui_components import ControlPanel
@@ -17,8 +18,12 @@ from src.gui.image_viewer import ImageViewer
 from src.gui.ui_state_manager import UIStateManager
 from src.features.file_manager import FileManager
 from src.features.edit_history import EditHistory
+from src.features.operation_history import OperationHistory, MosaicOperation, save_operation_log
+from src.features.mosaic_task import MosaicTask
+from src.features.pixel_formats import get_format_name
 from src.constants.config import (
-    MAIN_WINDOW_WIDTH, MAIN_WINDOW_HEIGHT, MAIN_WINDOW_MIN_WIDTH, MAIN_WINDOW_MIN_HEIGHT, UI_CONTROL_PANEL_WIDTH
+    MAIN_WINDOW_WIDTH, MAIN_WINDOW_HEIGHT, MAIN_WINDOW_MIN_WIDTH, MAIN_WINDOW_MIN_HEIGHT, UI_CONTROL_PANEL_WIDTH,
+    EDIT_HISTORY_MODE, OPERATION_LOG_SUFFIX, OPERATION_LOG_SAVE
 )
 
 
@@ -31,7 +36,13 @@ class MainWindow(QMainWindow):
         # 初始化所有管理器 - 它们将处理具体的业务逻辑
         self.ui_state_manager = UIStateManager(self)
         self.file_manager = FileManager(self)
-        self.history = EditHistory()
+        self.history = OperationHistory() if EDIT_HISTORY_MODE == "operations" else EditHistory()
+        self.source_path = None  # 当前图片的原始文件路径（随操作记录保存）
+        
+        # 正在后台运行的马赛克任务及其操作参数
+        self.mosaic_task = None
+        self.mosaic_generation = 0
+        self.mosaic_operation = None
         
         # UI组件将在init_ui中创建
         self.control_panel = None
@@ -134,6 +145,14 @@ class MainWindow(QMainWindow):
                                            self.ui_state_manager.get_history_state()[1], 
                                            has_selection))
         
+        # 后台处理期间禁用保存、撤销、重做与应用马赛克
+        self.ui_state_manager.busy_state_changed.connect(self.control_panel.set_busy)
+        self.ui_state_manager.busy_state_changed.connect(self.menu_bar.set_busy)
+        
+        # Esc 取消正在进行的马赛克处理
+        self.cancel_shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self)
+        self.cancel_shortcut.activated.connect(self.cancel_background_tasks)
+        
         # 连接控制面板的用户操作到业务逻辑
         self.control_panel.open_image_clicked.connect(self.handle_open_image)
         self.control_panel.save_image_clicked.connect(self.handle_save_image)
@@ -144,6 +163,15 @@ class MainWindow(QMainWindow):
         self.control_panel.apply_mosaic_clicked.connect(self.handle_apply_mosaic)
         self.control_panel.block_size_changed.connect(self.ui_state_manager.set_block_size)
         self.control_panel.intensity_changed.connect(self.ui_state_manager.set_intensity)
+        self.control_panel.mosaic_mode_changed.connect(self.ui_state_manager.set_mosaic_mode)
+        
+        # 参数变化时刷新实时预览
+        self.control_panel.block_size_changed.connect(self.update_preview)
+        self.control_panel.intensity_changed.connect(self.update_preview)
+        self.control_panel.mosaic_mode_changed.connect(self.update_preview)
+        self.control_panel.preview_toggled.connect(self.update_preview)
+        self.control_panel.grid_anchor_toggled.connect(self.update_preview)
+        self.update_preview()
         
         # 连接菜单栏的用户操作
         self.menu_bar.open_image_triggered.connect(self.handle_open_image)
@@ -152,6 +180,10 @@ class MainWindow(QMainWindow):
         self.menu_bar.redo_triggered.connect(self.handle_redo)
         self.menu_bar.clear_triggered.connect(self.handle_clear_selection)
         self.menu_bar.apply_mosaic_triggered.connect(self.handle_apply_mosaic)
+        self.menu_bar.zoom_in_triggered.connect(self.image_viewer.zoom_in)
+        self.menu_bar.zoom_out_triggered.connect(self.image_viewer.zoom_out)
+        self.menu_bar.fit_to_window_triggered.connect(self.image_viewer.fit_to_window)
+        self.menu_bar.actual_size_triggered.connect(self.image_viewer.zoom_actual_size)
         self.menu_bar.language_changed.connect(self.handle_language_change)
         self.menu_bar.theme_settings_triggered.connect(self.show_theme_settings)
         self.menu_bar.about_triggered.connect(self.show_about)
@@ -159,10 +191,15 @@ class MainWindow(QMainWindow):
         
         # 连接文件管理器的信号
         self.file_manager.image_opened.connect(self.on_image_opened)
+        self.file_manager.load_started.connect(self.on_image_load_started)
+        self.file_manager.load_progress.connect(self.status_bar.show_load_progress)
+        self.file_manager.load_cancelled.connect(self.on_image_load_cancelled)
+        self.file_manager.load_failed.connect(self.on_image_load_failed)
         
         # 连接图像查看器的信号
         self.image_viewer.selection_made.connect(self.handle_selection_made)
         self.image_viewer.image_loaded.connect(self.handle_image_loaded)
+        self.image_viewer.zoom_changed.connect(self.show_zoom)
         
         # 初始化状态
         self.update_ui_state()
@@ -212,23 +249,85 @@ class MainWindow(QMainWindow):
         """处理打开图像 - 使用FileManager"""
         self.file_manager.open_image_file()
     
-    def on_image_opened(self, image, file_path):
-        """处理图像打开完成 - 加载到图像查看器"""
-        self.image_viewer.load_image(file_path)
+    def on_image_load_started(self, file_path):
+        """后台开始加载图像 - 显示占位提示与进度，界面保持可操作"""
+        self.image_viewer.show_loading(file_path)
+        self.status_bar.show_load_progress(0)
+    
+    def on_image_load_cancelled(self):
+        """后台加载被取消 - 恢复显示当前图像"""
+        self.image_viewer.hide_loading()
+        self.status_bar.show_load_cancelled()
+    
+    def on_image_load_failed(self, file_path):
+        """后台加载失败 - 恢复显示当前图像（错误提示由 FileManager 显示）"""
+        self.image_viewer.hide_loading()
+        self.status_bar.hide_progress()
+        self.status_bar.update_status(
+            has_image=self.image_viewer.has_image(),
+            can_undo=self.history.can_undo(),
+            can_redo=self.history.can_redo()
+        )
+    
+    def on_image_opened(self, image, file_path, source_format, large_image):
+        """处理图像打开完成 - 图像查看器直接采用后台解码的图像，不再重新读取文件"""
+        self.cancel_mosaic_task()
+        self.status_bar.hide_progress()
+        self.image_viewer.set_image(image, file_path, source_format, large_image)
         
     def handle_save_image(self):
         """处理保存图像 - 使用FileManager"""
         current_image = self.image_viewer.get_current_image()
         if current_image:
-            self.file_manager.save_image_file(current_image, self)
+            large_image = self.image_viewer.get_large_image()
+            operations = self.history.get_operations() if large_image is not None else None
+            if self.file_manager.save_image_file(current_image, self, large_image, operations):
+                self.save_operation_log(self.file_manager.get_current_file_path())
         else:
             QMessageBox.warning(self, tr("warning"), tr("no_image_to_save"))
         
+    def get_copy_stats(self):
+        """
+        获取整图复制统计（撤销/重做等操作前后各取一次，差值即该操作产生的复制次数）
+        Returns:
+            dict: history_copies（编辑历史的整图复制次数）/pixmap_conversions（显示时转换为 QPixmap 的次数）
+        """
+        return {
+            "history_copies": self.history.stats()["image_copies"],
+            "pixmap_conversions": self.image_viewer.get_pixmap_conversions(),
+        }
+    
+    def save_operation_log(self, image_path):
+        """
+        把得到当前图片的操作记录（全部操作参数，原图坐标）保存在图片旁边。
+        操作记录暴露了打码区域的位置，只在配置为操作记录模式或启用 OPERATION_LOG_SAVE 时写出；
+        超大图片为按原分辨率保存而临时使用操作记录历史时，操作只保留在内存中。
+        """
+        if not (EDIT_HISTORY_MODE == "operations" or OPERATION_LOG_SAVE):
+            return
+        if not isinstance(self.history, OperationHistory) or not image_path:
+            return
+        operations = self.history.get_operations()
+        if operations:
+            source = os.path.basename(self.source_path) if self.source_path else None
+            large_image = self.image_viewer.get_large_image()
+            if large_image is not None:
+                # 预览图上记录的操作换算到原图坐标，与保存的结果对应
+                operations = [large_image.to_full_operation(operation) for operation in operations]
+            try:
+                save_operation_log(image_path + OPERATION_LOG_SUFFIX, operations, source)
+            except OSError as e:
+                self.status_bar.show_message(
+                    tr("operation_log_save_failed", "Failed to save operation log: {}").format(e))
+        
     def handle_undo(self):
         """处理撤销 - 使用EditHistory"""
+        if self.ui_state_manager.is_busy():
+            return
         previous_image = self.history.undo()
         if previous_image:
-            self.image_viewer.update_image(previous_image)
+            # 只有被撤销的区域发生了变化，显示只刷新这部分
+            self.image_viewer.update_image(previous_image, self.history.get_last_change_rect())
             # 更新UI状态
             self.ui_state_manager.set_history_state(self.history.can_undo(), self.history.can_redo())
             self.control_panel.update_button_states(
@@ -251,9 +350,11 @@ class MainWindow(QMainWindow):
         
     def handle_redo(self):
         """处理重做 - 使用EditHistory"""
+        if self.ui_state_manager.is_busy():
+            return
         next_image = self.history.redo()
         if next_image:
-            self.image_viewer.update_image(next_image)
+            self.image_viewer.update_image(next_image, self.history.get_last_change_rect())
             # 更新UI状态
             self.ui_state_manager.set_history_state(self.history.can_undo(), self.history.can_redo())
             self.control_panel.update_button_states(
@@ -280,6 +381,8 @@ class MainWindow(QMainWindow):
     
     def handle_clear_image(self):
         """处理清除图像 - 清空当前图片"""
+        self.cancel_background_tasks()
+        
         # 清除图像查看器中的图像
         self.image_viewer.clear_image()
         
@@ -295,48 +398,115 @@ class MainWindow(QMainWindow):
         self.status_bar.show_message(tr('image_cleared', "Image cleared"))
     
     def handle_apply_mosaic(self):
-        """处理应用马赛克 - 使用ImageMosaic功能"""
+        """处理应用马赛克 - 在后台线程中执行MosaicTask"""
+        if self.ui_state_manager.is_busy():
+            return
+        
         if not self.image_viewer.has_image():
             QMessageBox.warning(self, tr("warning"), tr("no_image_loaded"))
             return
         
-        selection_rect = self.image_viewer.get_selection_rect()
-        if not selection_rect or not selection_rect.isValid():
+        selection_rects = self.image_viewer.get_selection_rects()
+        if not selection_rects:
             QMessageBox.warning(self, tr("warning"), tr("select_area_first"))
             return
         
-        try:
-            from src.features.image_mosaic import apply_mosaic
-            current_image = self.image_viewer.get_current_image()
-            block_size = self.control_panel.get_block_size()
-            
-            # 应用马赛克
-            intensity = self.control_panel.get_intensity() / 10.0  # 将1-10转换为0.0-1.0
-            processed_image = apply_mosaic(current_image, selection_rect, block_size, intensity)
-            
-            # 更新显示
-            self.image_viewer.update_image(processed_image)
-            
-            # 添加到历史记录
-            self.history.add_state(processed_image.copy())
-            
-            # 更新历史状态
-            self.ui_state_manager.set_history_state(self.history.can_undo(), self.history.can_redo())
-            
-            # 清除选择
-            self.image_viewer.clear_selection()
-            
-            # 显示完成消息
-            self.status_bar.show_mosaic_applied()
-            
-        except Exception as e:
-            QMessageBox.critical(self, tr("error"), f"{tr('apply_mosaic_failed')}: {str(e)}")
-    
-    def on_block_size_changed(self, value):
-        """块大小改变处理"""
-        self.block_size = value
-        self.ui_state_manager.set_block_size(value)
-        self.status_bar.show_message(tr('block_size_changed').format(value))
+        current_image = self.image_viewer.get_current_image()
+        block_size = self.control_panel.get_block_size()
+        intensity = self.control_panel.get_intensity() / 10.0  # 将1-10转换为0.0-1.0
+        mode = self.control_panel.get_mosaic_mode()
+        # 记录完整的操作参数（含随机种子），操作记录历史据此精确重放
+        operation = MosaicOperation(mode, selection_rects, block_size, intensity,
+                                    anchored=self.control_panel.is_grid_anchored(), seed=random.getrandbits(31))
+        
+        # 全部选区在一次处理中完成：只复制一次图片，只记录一条历史
+        task = MosaicTask(current_image, selection_rects, block_size, intensity, mode,
+                          cache=self.image_viewer.get_integral_cache(),
+                          anchored=operation.anchored,
+                          color_cache=self.image_viewer.get_block_color_cache(),
+                          seed=operation.seed,
+                          engine=operation.engine)
+        task.signals.progress.connect(self.status_bar.show_mosaic_progress)
+        task.signals.finished.connect(self.on_mosaic_finished)
+        task.signals.cancelled.connect(self.on_mosaic_cancelled)
+        task.signals.failed.connect(self.on_mosaic_failed)
+        self.mosaic_task = task
+        self.mosaic_operation = operation
+        self.mosaic_generation = self.image_viewer.get_image_generation()
+        
+        self.ui_state_manager.set_busy(True)
+        self.status_bar.show_mosaic_progress(0)
+        QThreadPool.globalInstance().start(task)
+    
+    def cancel_background_tasks(self):
+        """取消正在进行的后台任务（Esc）：马赛克处理与图片加载"""
+        self.cancel_mosaic_task()
+        self.file_manager.cancel_loading()
+    
+    def cancel_mosaic_task(self):
+        """取消正在进行的马赛克处理（结果由 on_mosaic_cancelled 收尾）"""
+        if self.mosaic_task is not None:
+            self.mosaic_task.cancel()
+    
+    def is_current_mosaic_task(self):
+        """检查发出信号的是否为当前任务（被取消后才结束的旧任务信号直接忽略）"""
+        return self.mosaic_task is not None and self.sender() is self.mosaic_task.signals
+    
+    def finish_mosaic_task(self):
+        """结束当前马赛克任务并恢复UI状态"""
+        self.mosaic_task = None
+        self.status_bar.hide_progress()
+        self.ui_state_manager.set_busy(False)
+    
+    def on_mosaic_finished(self, processed_image, selection_rects):
+        """处理后台马赛克完成"""
+        if not self.is_current_mosaic_task():
+            return
+        cancelled = self.mosaic_task.is_cancelled()
+        self.finish_mosaic_task()
+        if cancelled or self.image_viewer.get_image_generation() != self.mosaic_generation:
+            # 处理期间图片已被替换或清除，结果作废
+            self.status_bar.show_mosaic_cancelled()
+            return
+        
+        # 更新显示（只有选区内的像素发生了变化）
+        self.image_viewer.update_image(processed_image, self.mosaic_operation.get_dirty_region())
+        
+        # 添加到历史记录
+        self.history.add_operation(self.mosaic_operation, processed_image)
+        
+        # 更新历史状态
+        self.ui_state_manager.set_history_state(self.history.can_undo(), self.history.can_redo())
+        
+        # 清除选择
+        self.image_viewer.clear_selection()
+        
+        # 显示完成消息
+        self.status_bar.show_mosaic_applied()
+    
+    def on_mosaic_cancelled(self):
+        """处理后台马赛克被取消"""
+        if not self.is_current_mosaic_task():
+            return
+        self.finish_mosaic_task()
+        self.status_bar.show_mosaic_cancelled()
+    
+    def on_mosaic_failed(self, error_message):
+        """处理后台马赛克出错"""
+        if not self.is_current_mosaic_task():
+            return
+        self.finish_mosaic_task()
+        QMessageBox.critical(self, tr("error"), f"{tr('apply_mosaic_failed')}: {error_message}")
+    
+    def update_preview(self, *args):
+        """将控制面板的当前参数同步到图像查看器的实时预览"""
+        self.image_viewer.set_preview_enabled(self.control_panel.is_preview_enabled())
+        self.image_viewer.set_preview_params(
+            self.control_panel.get_block_size(),
+            self.control_panel.get_intensity() / 10.0,  # 将1-10转换为0.0-1.0
+            self.control_panel.get_mosaic_mode(),
+            self.control_panel.is_grid_anchored()
+        )
     
     def handle_language_change(self, language_code):
         """处理语言切换 - 使用Translator类"""
@@ -353,18 +523,58 @@ class MainWindow(QMainWindow):
             has_selection=rect.isValid() if rect else False
         )
         
+        # 多个选区时提示选区数量
+        selection_count = len(self.image_viewer.get_selection_rects())
+        if selection_count > 1:
+            self.status_bar.show_message(tr("selection_count", "{} areas selected").format(selection_count))
+        
     def handle_image_loaded(self, image_path):
         """处理图像加载 - 使用UIStateManager"""
+        self.source_path = image_path
+        # 超大图片的预览图需要操作记录才能在保存时以原分辨率重放，改用操作记录历史
+        use_operations = EDIT_HISTORY_MODE == "operations" or self.image_viewer.get_large_image() is not None
+        if use_operations != isinstance(self.history, OperationHistory):
+            self.history.clear()
+            self.history = OperationHistory() if use_operations else EditHistory()
         # 将当前图像添加到历史记录
         current_image = self.image_viewer.get_current_image()
         if current_image:
-            self.history.add_state(current_image.copy())
+            self.history.add_state(current_image)
         
         self.ui_state_manager.set_image_state(True)
         # 重置选择状态并更新历史记录状态
         self.ui_state_manager.set_history_state(self.history.can_undo(), self.history.can_redo())
         # 显示加载完成消息
         self.status_bar.show_image_loaded()
+        self.show_image_info()
+    
+    def show_image_info(self):
+        """在状态栏显示图像尺寸与工作格式（加载时发生格式转换则同时显示原始格式）"""
+        width, height = self.image_viewer.get_image_size()
+        large_image = self.image_viewer.get_large_image()
+        if large_image is not None:
+            width, height = large_image.get_full_size().width(), large_image.get_full_size().height()
+        source_format, working_format = self.image_viewer.get_format_info()
+        if working_format is None:
+            self.status_bar.clear_image_info()
+            return
+        if source_format is not None and source_format != working_format:
+            format_text = tr("format_converted", "{} → {}").format(
+                get_format_name(source_format), get_format_name(working_format))
+        else:
+            format_text = get_format_name(working_format)
+        if large_image is not None:
+            format_text += "  " + tr("large_image_preview", "(preview {}%)").format(
+                max(1, round(large_image.get_preview_scale() * 100)))
+        self.status_bar.show_image_info(width, height, format_text)
+        self.show_zoom(self.image_viewer.get_zoom())
+    
+    def show_zoom(self, zoom):
+        """在状态栏显示缩放比例（超大图片的预览图换算为相对原图的比例）"""
+        large_image = self.image_viewer.get_large_image()
+        if large_image is not None:
+            zoom *= large_image.get_preview_scale()
+        self.status_bar.show_zoom(zoom)
     
     def change_language(self, language_code):
         """切换语言 - 使用Translator类"""
@@ -391,6 +601,12 @@ class MainWindow(QMainWindow):
         # 更新状态
         self.update_ui_state()
     
+    def closeEvent(self, event):
+        """关闭窗口前取消并等待后台马赛克任务结束"""
+        self.cancel_background_tasks()
+        QThreadPool.globalInstance().waitForDone()
+        super().closeEvent(event)
+    
     def dragEnterEvent(self, event):
         """拖拽进入事件 - 使用FileManager验证文件"""
         if event.mimeData().hasUrls():
@@ -19,6 +19,10 @@ class AppMenuBar(QMenuBar):
     redo_triggered = Signal()
     clear_triggered = Signal()
     apply_mosaic_triggered = Signal()
+    zoom_in_triggered = Signal()
+    zoom_out_triggered = Signal()
+    fit_to_window_triggered = Signal()
+    actual_size_triggered = Signal()
     language_changed = Signal(str)
     about_triggered = Signal()
     exit_triggered = Signal()
@@ -26,6 +30,8 @@ class AppMenuBar(QMenuBar):
     
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.busy = False
+        self.menu_states = (False, False, False, False)
         self.init_menus()
     
     def init_menus(self):
@@ -36,6 +42,9 @@ class AppMenuBar(QMenuBar):
         # 编辑菜单
         self.create_edit_menu()
         
+        # 视图菜单
+        self.create_view_menu()
+        
         # 设置菜单
         self.create_settings_menu()
         
@@ -51,6 +60,9 @@ class AppMenuBar(QMenuBar):
         # 重新填充语言菜单（需要重新设置当前语言）
         from src.localization import get_current_language, get_available_languages
         self.populate_language_menu(get_available_languages(), get_current_language())
+        
+        # 菜单重建后恢复菜单项状态
+        self.update_menu_states(*self.menu_states)
     
     def create_file_menu(self):
         """创建文件菜单"""
@@ -116,6 +128,39 @@ class AppMenuBar(QMenuBar):
         self.clear_action = clear_action
         self.apply_mosaic_action = apply_mosaic_action
     
+    def create_view_menu(self):
+        """创建视图菜单"""
+        view_menu = self.addMenu(tr("view", "View"))
+        
+        # 放大
+        zoom_in_action = QAction(tr("zoom_in", "Zoom In"), self)
+        zoom_in_action.setShortcut(QKeySequence.ZoomIn)
+        zoom_in_action.triggered.connect(self.zoom_in_triggered.emit)
+        view_menu.addAction(zoom_in_action)
+        
+        # 缩小
+        zoom_out_action = QAction(tr("zoom_out", "Zoom Out"), self)
+        zoom_out_action.setShortcut(QKeySequence.ZoomOut)
+        zoom_out_action.triggered.connect(self.zoom_out_triggered.emit)
+        view_menu.addAction(zoom_out_action)
+        
+        view_menu.addSeparator()
+        
+        # 适应窗口
+        fit_action = QAction(tr("fit_to_window", "Fit to Window"), self)
+        fit_action.setShortcut(QKeySequence("Ctrl+0"))
+        fit_action.triggered.connect(self.fit_to_window_triggered.emit)
+        view_menu.addAction(fit_action)
+        
+        # 实际像素
+        actual_size_action = QAction(tr("actual_size", "Actual Size"), self)
+        actual_size_action.setShortcut(QKeySequence("Ctrl+1"))
+        actual_size_action.triggered.connect(self.actual_size_triggered.emit)
+        view_menu.addAction(actual_size_action)
+        
+        # 保存引用以便后续更新状态
+        self.view_actions = [zoom_in_action, zoom_out_action, fit_action, actual_size_action]
+    
     def create_settings_menu(self):
         """创建设置菜单"""
         settings_menu = self.addMenu(tr("settings", "Settings"))
@@ -143,13 +188,21 @@ class AppMenuBar(QMenuBar):
         self.help_menu = help_menu
     
     def update_menu_states(self, has_image=False, can_undo=False, can_redo=False, has_selection=False):
-        """更新菜单项状态"""
+        """更新菜单项状态（后台处理期间保存、撤销、重做与应用马赛克保持禁用）"""
+        self.menu_states = (has_image, can_undo, can_redo, has_selection)
         self.open_action.setEnabled(True)  # 总是可以打开
-        self.save_action.setEnabled(has_image)
-        self.undo_action.setEnabled(can_undo)
-        self.redo_action.setEnabled(can_redo)
+        self.save_action.setEnabled(has_image and not self.busy)
+        self.undo_action.setEnabled(can_undo and not self.busy)
+        self.redo_action.setEnabled(can_redo and not self.busy)
         self.clear_action.setEnabled(has_image)
-        self.apply_mosaic_action.setEnabled(has_image and has_selection)
+        for action in self.view_actions:
+            action.setEnabled(has_image)
+        self.apply_mosaic_action.setEnabled(has_image and has_selection and not self.busy)
+    
+    def set_busy(self, busy):
+        """设置后台处理状态，并按最近一次的菜单状态重新启用/禁用菜单项"""
+        self.busy = busy
+        self.update_menu_states(*self.menu_states)
     
     def populate_language_menu(self, languages, current_language):
         """填充语言菜单"""
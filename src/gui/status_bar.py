@@ -2,8 +2,9 @@
 """
 状态栏组件模块 - 包含应用程序的状态栏
 """
-from PySide6.QtWidgets import QStatusBar, QLabel
+from PySide6.QtWidgets import QStatusBar, QLabel, QProgressBar
 from src.localization import tr
+from src.constants.config import STATUS_PROGRESS_WIDTH
 
 
 class AppStatusBar(QStatusBar):
@@ -23,6 +24,18 @@ class AppStatusBar(QStatusBar):
         self.info_label = QLabel("")
         self.addPermanentWidget(self.info_label)
         
+        # 缩放比例标签
+        self.zoom_label = QLabel("")
+        self.addPermanentWidget(self.zoom_label)
+        
+        # 后台处理进度条（仅在处理期间显示）
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setMaximumWidth(STATUS_PROGRESS_WIDTH)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.hide()
+        self.addPermanentWidget(self.progress_bar)
+        
         # 设置初始状态
         self.show_message(tr("ready", "Ready"))
     
@@ -39,6 +52,10 @@ class AppStatusBar(QStatusBar):
             tr("image_loaded_redo", "Image loaded - Redo available"): tr("image_loaded_redo", "Image loaded - Redo available"),
             tr("image_loaded_only", "Image loaded"): tr("image_loaded_only", "Image loaded"),
             tr("mosaic_applied", "Mosaic applied"): tr("mosaic_applied", "Mosaic applied"),
+            tr("applying_mosaic", "Applying mosaic... (Esc to cancel)"): tr("applying_mosaic", "Applying mosaic... (Esc to cancel)"),
+            tr("mosaic_cancelled", "Mosaic cancelled"): tr("mosaic_cancelled", "Mosaic cancelled"),
+            tr("loading_image_progress", "Loading image... (Esc to cancel)"): tr("loading_image_progress", "Loading image... (Esc to cancel)"),
+            tr("image_load_cancelled", "Image loading cancelled"): tr("image_load_cancelled", "Image loading cancelled"),
         }
         
         # 如果当前状态在翻译映射中，则更新为新的翻译
@@ -62,17 +79,59 @@ class AppStatusBar(QStatusBar):
         """显示马赛克应用完成的消息"""
         self.show_message(tr("mosaic_applied", "Mosaic applied"))
     
+    def show_mosaic_progress(self, percent):
+        """显示马赛克后台处理进度"""
+        if self.progress_bar.isHidden():
+            self.show_message(tr("applying_mosaic", "Applying mosaic... (Esc to cancel)"))
+            self.progress_bar.show()
+        self.progress_bar.setValue(percent)
+    
+    def show_load_progress(self, percent):
+        """显示图片后台加载进度（percent 为 -1 时显示忙碌状态）"""
+        if self.progress_bar.isHidden():
+            self.show_message(tr("loading_image_progress", "Loading image... (Esc to cancel)"))
+            self.progress_bar.show()
+        if percent < 0:
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(percent)
+    
+    def show_load_cancelled(self):
+        """显示图片加载已取消的消息"""
+        self.hide_progress()
+        self.show_message(tr("image_load_cancelled", "Image loading cancelled"))
+    
+    def hide_progress(self):
+        """隐藏进度条"""
+        self.progress_bar.hide()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.reset()
+    
+    def show_mosaic_cancelled(self):
+        """显示马赛克已取消的消息"""
+        self.hide_progress()
+        self.show_message(tr("mosaic_cancelled", "Mosaic cancelled"))
+    
     def show_error(self, error_message):
         """显示错误消息"""
         self.show_message(tr("error", f"Error: {error_message}"))
     
-    def show_image_info(self, width, height):
-        """显示图片信息"""
-        self.info_label.setText(f"{width} × {height}")
+    def show_image_info(self, width, height, format_text=""):
+        """显示图片信息（尺寸与像素格式）"""
+        text = f"{width} × {height}"
+        if format_text:
+            text += f"  {format_text}"
+        self.info_label.setText(text)
     
     def clear_image_info(self):
         """清除图片信息"""
         self.info_label.setText("")
+        self.zoom_label.setText("")
+    
+    def show_zoom(self, zoom):
+        """显示缩放比例（相对原图分辨率）"""
+        self.zoom_label.setText(f"{zoom * 100:.0f}%" if zoom >= 0.01 else f"{zoom * 100:.1f}%")
     
     def update_status(self, has_image=False, can_undo=False, can_redo=False):
         """更新状态信息"""
@@ -3,15 +3,16 @@
 UI组件模块 - 包含MosaicTool的用户界面组件
 """
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                                QSpinBox, QSlider, QLabel, QGroupBox, QComboBox, QDoubleSpinBox)
+                                QSpinBox, QSlider, QLabel, QGroupBox, QComboBox, QDoubleSpinBox, QCheckBox)
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QIcon
 from src.localization import tr
 from src.constants.config import (
     UI_CONTROL_PANEL_WIDTH, UI_BLOCK_SIZE_SPIN_RANGE, UI_BLOCK_SIZE_SLIDER_RANGE,
     UI_BLOCK_SIZE_DEFAULT, UI_INTENSITY_SPIN_RANGE, UI_INTENSITY_SLIDER_RANGE,
-    UI_INTENSITY_DEFAULT, UI_LAYOUT_SPACING, UI_LAYOUT_MARGIN
+    UI_INTENSITY_DEFAULT, UI_MOSAIC_MODE_DEFAULT, UI_LIVE_PREVIEW_DEFAULT, UI_GRID_ANCHORED_DEFAULT, UI_LAYOUT_SPACING, UI_LAYOUT_MARGIN
 )
+from src.features.image_mosaic import available_kernels, get_kernel
 
 
 class ControlPanel(QWidget):
@@ -27,9 +28,14 @@ class ControlPanel(QWidget):
     apply_mosaic_clicked = Signal()
     block_size_changed = Signal(int)
     intensity_changed = Signal(int)
+    mosaic_mode_changed = Signal(str)
+    preview_toggled = Signal(bool)
+    grid_anchor_toggled = Signal(bool)
     
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.busy = False
+        self.button_states = (False, False, False, False)
         self.init_ui()
     
     def init_ui(self):
@@ -159,6 +165,32 @@ class ControlPanel(QWidget):
         self.intensity_slider.valueChanged.connect(self.on_intensity_slider_changed)
         layout.addWidget(self.intensity_slider)
         
+        # 马赛克核（取色模式）选择
+        mode_layout = QHBoxLayout()
+        self.mosaic_mode_label = QLabel(tr("mosaic_mode", "Mode"))
+        mode_layout.addWidget(self.mosaic_mode_label)
+        
+        self.mosaic_mode_combo = QComboBox()
+        self.populate_mosaic_modes()
+        self.mosaic_mode_combo.setCurrentIndex(self.mosaic_mode_combo.findData(UI_MOSAIC_MODE_DEFAULT))
+        self.mosaic_mode_combo.currentIndexChanged.connect(self.on_mosaic_mode_changed)
+        mode_layout.addWidget(self.mosaic_mode_combo)
+        
+        layout.addLayout(mode_layout)
+        
+        # 块网格锚定开关
+        self.grid_anchor_check = QCheckBox(tr("align_grid", "Align Grid to Image"))
+        self.grid_anchor_check.setChecked(UI_GRID_ANCHORED_DEFAULT)
+        self.grid_anchor_check.toggled.connect(self.grid_anchor_toggled.emit)
+        layout.addWidget(self.grid_anchor_check)
+        
+        # 实时预览开关
+        self.preview_check = QCheckBox(tr("live_preview", "Live Preview"))
+        self.preview_check.setChecked(UI_LIVE_PREVIEW_DEFAULT)
+        self.preview_check.toggled.connect(self.preview_toggled.emit)
+        layout.addWidget(self.preview_check)
+        
+        self.update_block_size_state()
         group.setLayout(layout)
         return group
     
@@ -172,14 +204,46 @@ class ControlPanel(QWidget):
         self.intensity_spin.setValue(value)
         self.intensity_changed.emit(value)
     
+    def populate_mosaic_modes(self):
+        """按注册顺序填充可用的马赛克核列表（保持当前选择）"""
+        current_mode = self.mosaic_mode_combo.currentData()
+        self.mosaic_mode_combo.blockSignals(True)
+        self.mosaic_mode_combo.clear()
+        for kernel in available_kernels():
+            self.mosaic_mode_combo.addItem(tr(kernel.title_key, kernel.title), kernel.name)
+        if current_mode:
+            self.mosaic_mode_combo.setCurrentIndex(self.mosaic_mode_combo.findData(current_mode))
+        self.mosaic_mode_combo.blockSignals(False)
+    
+    def on_mosaic_mode_changed(self, index):
+        """取色模式变化处理"""
+        mode = self.mosaic_mode_combo.itemData(index)
+        self.update_block_size_state()
+        if mode:
+            self.mosaic_mode_changed.emit(mode)
+    
+    def update_block_size_state(self):
+        """按当前马赛克核是否使用块大小、是否按块网格处理，启用/禁用块大小控件与网格锚定开关"""
+        mode = self.mosaic_mode_combo.currentData()
+        kernel = get_kernel(mode) if mode else None
+        self.block_size_spin.setEnabled(kernel is None or kernel.uses_block_size)
+        self.block_size_slider.setEnabled(kernel is None or kernel.uses_block_size)
+        self.grid_anchor_check.setEnabled(kernel is None or kernel.block_aligned)
+    
     def update_button_states(self, has_image=False, can_undo=False, can_redo=False, has_selection=False):
-        """更新按钮状态"""
-        self.save_btn.setEnabled(has_image)
-        self.undo_btn.setEnabled(can_undo)
-        self.redo_btn.setEnabled(can_redo)
+        """更新按钮状态（后台处理期间保存、撤销、重做与应用马赛克保持禁用）"""
+        self.button_states = (has_image, can_undo, can_redo, has_selection)
+        self.save_btn.setEnabled(has_image and not self.busy)
+        self.undo_btn.setEnabled(can_undo and not self.busy)
+        self.redo_btn.setEnabled(can_redo and not self.busy)
         self.clear_btn.setEnabled(has_image)
         self.clear_image_btn.setEnabled(has_image)
-        self.apply_mosaic_btn.setEnabled(has_image and has_selection)
+        self.apply_mosaic_btn.setEnabled(has_image and has_selection and not self.busy)
+    
+    def set_busy(self, busy):
+        """设置后台处理状态，并按最近一次的按钮状态重新启用/禁用按钮"""
+        self.busy = busy
+        self.update_button_states(*self.button_states)
     
     def get_block_size(self):
         """获取块大小"""
@@ -189,6 +253,18 @@ class ControlPanel(QWidget):
         """获取强度值"""
         return self.intensity_spin.value()
 
+    def get_mosaic_mode(self):
+        """获取马赛克核名称"""
+        return self.mosaic_mode_combo.currentData()
+
+    def is_preview_enabled(self):
+        """检查是否开启实时预览"""
+        return self.preview_check.isChecked()
+    
+    def is_grid_anchored(self):
+        """检查块网格是否锚定到图片原点"""
+        return self.grid_anchor_check.isChecked()
+
     def retranslate_ui(self):
         """重新翻译UI文本"""
         # 文件操作组
@@ -223,6 +299,11 @@ class ControlPanel(QWidget):
                     child.setText(tr("block_size", "Block Size"))
                 elif child.text() and ("Intensity" in child.text() or "强度" in child.text()):
                     child.setText(tr("intensity", "Intensity"))
+        
+        self.mosaic_mode_label.setText(tr("mosaic_mode", "Mode"))
+        self.populate_mosaic_modes()
+        self.preview_check.setText(tr("live_preview", "Live Preview"))
+        self.grid_anchor_check.setText(tr("align_grid", "Align Grid to Image"))
 
 
 class LanguageSelector(QWidget):
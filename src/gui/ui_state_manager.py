@@ -2,7 +2,7 @@
 UI状态管理模块 - 管理应用程序的UI状态
 """
 from PySide6.QtCore import QObject, Signal
-from src.constants.config import UI_BLOCK_SIZE_DEFAULT, UI_INTENSITY_DEFAULT
+from src.constants.config import UI_BLOCK_SIZE_DEFAULT, UI_INTENSITY_DEFAULT, UI_MOSAIC_MODE_DEFAULT
 
 
 class UIStateManager(QObject):
@@ -12,6 +12,7 @@ class UIStateManager(QObject):
     image_state_changed = Signal(bool)  # 图像加载状态变化
     history_state_changed = Signal(bool, bool)  # 撤销/重做状态变化 (can_undo, can_redo)
     selection_state_changed = Signal(bool)  # 选择状态变化
+    busy_state_changed = Signal(bool)  # 后台处理状态变化
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -19,8 +20,10 @@ class UIStateManager(QObject):
         self.can_undo = False
         self.can_redo = False
         self.has_selection = False
+        self.busy = False
         self.block_size = UI_BLOCK_SIZE_DEFAULT
         self.intensity = UI_INTENSITY_DEFAULT
+        self.mosaic_mode = UI_MOSAIC_MODE_DEFAULT
     
     def set_image_state(self, has_image):
         """设置图像状态"""
@@ -41,6 +44,12 @@ class UIStateManager(QObject):
             self.has_selection = has_selection
             self.selection_state_changed.emit(has_selection)
     
+    def set_busy(self, busy):
+        """设置后台处理状态"""
+        if self.busy != busy:
+            self.busy = busy
+            self.busy_state_changed.emit(busy)
+    
     def set_block_size(self, block_size):
         """设置块大小"""
         self.block_size = block_size
@@ -49,6 +58,10 @@ class UIStateManager(QObject):
         """设置强度"""
         self.intensity = intensity
     
+    def set_mosaic_mode(self, mosaic_mode):
+        """设置取色模式"""
+        self.mosaic_mode = mosaic_mode
+    
     def get_image_state(self):
         """获取图像状态"""
         return self.has_image
@@ -61,6 +74,10 @@ class UIStateManager(QObject):
         """获取选择状态"""
         return self.has_selection
     
+    def is_busy(self):
+        """检查是否有后台处理正在进行"""
+        return self.busy
+    
     def get_block_size(self):
         """获取块大小"""
         return self.block_size
@@ -69,6 +86,10 @@ class UIStateManager(QObject):
         """获取强度值"""
         return self.intensity
     
+    def get_mosaic_mode(self):
+        """获取取色模式"""
+        return self.mosaic_mode
+    
     def update_all_states(self, has_image=None, can_undo=None, can_redo=None, has_selection=None):
         """批量更新状态"""
         if has_image is not None:
@@ -9,16 +9,20 @@ SelectableLabel 模块
     被 MosaicTool 作为图片显示控件使用，实现框选实时可视化。
 """
 from PySide6.QtWidgets import QLabel
-from PySide6.QtGui import QPainter, QPen, QColor, QMouseEvent
-from PySide6.QtCore import Qt, QRect, Signal, QPoint
-from src.constants.config import SELECTION_BORDER_COLOR, SELECTION_BORDER_WIDTH
+from PySide6.QtGui import QPainter, QPen, QColor, QMouseEvent, QRegion
+from PySide6.QtCore import Qt, QRect, Signal, QPoint, QTimer
+from src.constants.config import SELECTION_BORDER_COLOR, SELECTION_BORDER_WIDTH, PREVIEW_INTERVAL_MS
 
 class SelectableLabel(QLabel):
     """
     可绘制选区的 QLabel。
 
+    按住 Shift 或 Ctrl 拖动可追加多个选区，直接拖动则重新开始选择。
+    拖动时的鼠标移动按屏幕刷新率合并，每帧最多更新一次选区，且只重绘新旧选区边框所在的范围。
+
     属性：
-        selection_rect (QRect): 当前选区矩形（控件坐标系）
+        selection_rect (QRect): 当前选区矩形（图片相对坐标系，由 get_image_relative_pos 定义）
+        selection_rects (list[QRect]): 之前已完成的其它选区矩形
         is_selecting (bool): 是否处于正在框选状态，用于确定笔样式（虚线/实线）。
     """
 
@@ -29,10 +33,22 @@ class SelectableLabel(QLabel):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.selection_rect: QRect | None = None
+        self.selection_rects: list[QRect] = []
         self.is_selecting: bool = False
         self.setAlignment(Qt.AlignCenter)
         self.setMouseTracking(True)  # 启用鼠标跟踪
 
+        # 选区边框的笔只创建一次（已完成的选区用实线，正在框选的选区用虚线）
+        color = QColor(*SELECTION_BORDER_COLOR)
+        self.solid_pen = QPen(color, SELECTION_BORDER_WIDTH, Qt.SolidLine)
+        self.dash_pen = QPen(color, SELECTION_BORDER_WIDTH, Qt.DashLine)
+
+        # 拖动时的鼠标移动合并：定时器运行期间只记录最新位置，每帧处理一次
+        self.pending_pos: QPoint | None = None
+        self.move_timer = QTimer(self)
+        self.move_timer.setSingleShot(True)
+        self.move_timer.timeout.connect(self.apply_pending_move)
+
     def set_selection(self, rect: QRect | None, selecting: bool):
         """
         设置选区并刷新显示。
@@ -40,34 +56,68 @@ class SelectableLabel(QLabel):
             rect (QRect | None): 选区矩形，None 表示清除
             selecting (bool): True 表示正在框选（虚线），False 表示框选完成（实线）
         """
+        # 只重绘旧选区与新选区的边框
+        dirty = self.get_border_region(self.selection_rect)
         self.selection_rect = rect
         self.is_selecting = selecting
-        self.update()
+        self.update(dirty + self.get_border_region(rect))
+
+    def get_border_region(self, rect: QRect | None):
+        """
+        获取选区边框在控件中占据的区域（含笔宽）。
+        参数：
+            rect (QRect | None): 选区矩形（图片相对坐标系）
+        返回：
+            QRegion: 控件坐标系中的边框区域，没有选区时为空
+        """
+        if rect is None or rect.isNull() or self.get_image_display_rect().isNull():
+            return QRegion()
+        widget_rect = self.map_rect_to_widget(rect)
+        margin = SELECTION_BORDER_WIDTH + 1
+        outer = widget_rect.adjusted(-margin, -margin, margin, margin)
+        inner = widget_rect.adjusted(margin, margin, -margin, -margin)
+        if inner.isEmpty():
+            return QRegion(outer)
+        return QRegion(outer) - QRegion(inner)
+
+    def get_frame_interval(self):
+        """
+        获取屏幕一帧的时长（毫秒），用于合并拖动时的鼠标移动。
+        返回：
+            int: 帧间隔，无法获取屏幕刷新率时使用预览刷新间隔
+        """
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None else 0
+        return max(1, int(1000 / rate)) if rate > 0 else PREVIEW_INTERVAL_MS
 
     def paintEvent(self, event):
         """
         重绘事件：先调用父类绘制图片，再绘制选区矩形。
         """
         super().paintEvent(event)
-        if self.selection_rect and not self.selection_rect.isNull():
+        if self.selection_rects or (self.selection_rect and not self.selection_rect.isNull()):
             painter = QPainter(self)
-            pen_style = Qt.DashLine if self.is_selecting else Qt.SolidLine
-            pen = QPen(QColor(*SELECTION_BORDER_COLOR), SELECTION_BORDER_WIDTH, pen_style)
-            painter.setPen(pen)
-            
-            # 将图片相对坐标转换为标签控件坐标进行绘制
-            image_display_rect = self.get_image_display_rect()
-            if not image_display_rect.isNull():
-                # 计算偏移量
-                offset_x = image_display_rect.x()
-                offset_y = image_display_rect.y()
-                
-                # 创建绘制矩形（相对于标签控件）
-                draw_rect = self.selection_rect.translated(offset_x, offset_y)
-                painter.drawRect(draw_rect)
-            
+            self.paint_selection(painter)
             painter.end()
 
+    def paint_selection(self, painter: QPainter):
+        """
+        绘制全部选区矩形（已完成的选区用实线，正在框选的选区用虚线）。
+        参数：
+            painter (QPainter): 在本控件上绘制的 QPainter
+        """
+        if self.get_image_display_rect().isNull():
+            return
+        # 已完成的选区用实线绘制
+        painter.setPen(self.solid_pen)
+        for rect in self.selection_rects:
+            painter.drawRect(self.map_rect_to_widget(rect))
+
+        # 当前选区
+        if self.selection_rect and not self.selection_rect.isNull():
+            painter.setPen(self.dash_pen if self.is_selecting else self.solid_pen)
+            painter.drawRect(self.map_rect_to_widget(self.selection_rect))
+
     def mousePressEvent(self, event: QMouseEvent):
         """
         鼠标按下事件：开始框选。
@@ -76,6 +126,15 @@ class SelectableLabel(QLabel):
             # 获取相对于图片实际显示区域的坐标
             image_pos = self.get_image_relative_pos(event.pos())
             if image_pos:
+                if event.modifiers() & (Qt.ShiftModifier | Qt.ControlModifier):
+                    # 追加选区：保留已完成的选区
+                    if self.selection_rect and not self.selection_rect.isNull():
+                        self.selection_rects.append(self.selection_rect)
+                else:
+                    self.update_selection_borders(self.selection_rects)
+                    self.selection_rects = []
+                self.move_timer.stop()
+                self.pending_pos = None
                 self.start_point = image_pos
                 self.is_selecting = True
                 self.set_selection(QRect(self.start_point, self.start_point), True)
@@ -86,10 +145,24 @@ class SelectableLabel(QLabel):
         鼠标移动事件：更新框选区域。
         """
         if self.is_selecting and hasattr(self, 'start_point'):
-            # 获取相对于图片实际显示区域的坐标
-            image_pos = self.get_image_relative_pos(event.pos())
-            if image_pos:
-                current_rect = QRect(self.start_point, image_pos)
+            # 一帧内的多次移动只处理最新位置：定时器未运行时立即处理，运行期间的移动在定时器到期时处理
+            self.pending_pos = event.pos()
+            if not self.move_timer.isActive():
+                self.apply_pending_move()
+
+    def apply_pending_move(self):
+        """
+        按最新的鼠标位置更新框选区域，并在一帧后处理期间的后续移动。
+        """
+        if self.pending_pos is None or not self.is_selecting:
+            return
+        # 获取相对于图片实际显示区域的坐标
+        image_pos = self.get_image_relative_pos(self.pending_pos)
+        self.pending_pos = None
+        self.move_timer.start(self.get_frame_interval())
+        if image_pos:
+            current_rect = QRect(self.start_point, image_pos)
+            if current_rect != self.selection_rect:
                 self.set_selection(current_rect, True)
                 self.selection_changed.emit(self.selection_rect)
 
@@ -98,6 +171,10 @@ class SelectableLabel(QLabel):
         鼠标释放事件：完成框选。
         """
         if event.button() == Qt.LeftButton and self.is_selecting:
+            # 先处理尚未处理的最后一次移动
+            self.move_timer.stop()
+            self.apply_pending_move()
+            self.move_timer.stop()
             self.is_selecting = False
             if self.selection_rect and not self.selection_rect.isNull():
                 self.set_selection(self.selection_rect, False)
@@ -111,13 +188,38 @@ class SelectableLabel(QLabel):
         """
         return self.selection_rect if self.selection_rect else QRect()
 
+    def get_selection_rects(self):
+        """
+        获取全部选择区域矩形（已完成的选区在前，当前选区在后）。
+        返回：
+            list[QRect]: 选择区域矩形列表，没有选择时为空列表
+        """
+        rects = list(self.selection_rects)
+        if self.selection_rect and not self.selection_rect.isNull():
+            rects.append(self.selection_rect)
+        return rects
+
     def clear_selection(self):
         """
-        清除选择区域。
+        清除全部选择区域。
         """
+        self.update_selection_borders(self.selection_rects)
+        self.selection_rects = []
         self.set_selection(None, False)
         self.selection_changed.emit(QRect())
 
+    def update_selection_borders(self, rects):
+        """
+        重绘多个选区的边框（选区被移除时调用）。
+        参数：
+            rects (list[QRect]): 选区矩形列表（图片相对坐标系）
+        """
+        dirty = QRegion()
+        for rect in rects:
+            dirty += self.get_border_region(rect)
+        if not dirty.isEmpty():
+            self.update(dirty)
+
     def get_image_relative_pos(self, pos):
         """
         将标签控件坐标转换为图片相对坐标
@@ -172,4 +274,15 @@ class SelectableLabel(QLabel):
         offset_x = (label_size.width() - scaled_size.width()) // 2
         offset_y = (label_size.height() - scaled_size.height()) // 2
         
-        return QRect(offset_x, offset_y, scaled_size.width(), scaled_size.height())
\ No newline at end of file
+        return QRect(offset_x, offset_y, scaled_size.width(), scaled_size.height())
+
+    def map_rect_to_widget(self, rect):
+        """
+        将图片相对坐标系中的矩形转换为标签控件坐标（get_image_relative_pos 的逆变换）
+        参数：
+            rect (QRect): 图片相对坐标系中的矩形
+        返回：
+            QRect: 标签控件坐标系中的矩形
+        """
+        display_rect = self.get_image_display_rect()
+        return rect.translated(display_rect.x(), display_rect.y())
\ No newline at end of file
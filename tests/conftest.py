@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共配置
+
+用途：
+    把项目根目录加入导入路径，以无窗口平台创建 QApplication，并提供生成随机测试图片的工具。
+"""
+import os
+import random
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtGui import QImage  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def qapp():
+    """整个测试会话共用一个 QApplication（QPainter、QRegion 等需要）"""
+    return QApplication.instance() or QApplication([])
+
+
+def random_image(width, height, fmt=QImage.Format_RGB32, seed=0):
+    """
+    生成随机像素的图片。
+    参数：
+        width (int): 宽度
+        height (int): 高度
+        fmt (QImage.Format): 像素格式（先生成带随机透明度的 ARGB32，再转换）
+        seed (int): 随机种子
+    返回：
+        QImage: 图片
+    """
+    rng = random.Random(seed)
+    image = QImage(width, height, QImage.Format_ARGB32)
+    for y in range(height):
+        for x in range(width):
+            image.setPixel(x, y, rng.getrandbits(32))
+    return image.convertToFormat(fmt)
+
+
+def pixel_bytes(image):
+    """获取图片各行有效像素的字节（忽略行尾对齐填充），用于逐像素比较"""
+    row_bytes = image.width() * image.depth() // 8
+    bits = image.constBits()
+    return b"".join(bytes(bits[y * image.bytesPerLine():y * image.bytesPerLine() + row_bytes])
+                    for y in range(image.height()))
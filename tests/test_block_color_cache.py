@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""块颜色缓存测试：重复处理命中已缓存的单元，编辑后只重新计算脏区域内的单元，图片被替换时整体作废"""
+import pytest
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.features.block_color_cache import BlockColorCache
+from src.features.image_mosaic import apply_mosaic, MODE_MEAN, MODE_SAMPLE
+
+pytest.importorskip("numpy")
+
+BLOCK_SIZE = 6
+
+
+def anchored(image, rect, mode, color_cache=None):
+    """网格锚定的马赛克"""
+    return apply_mosaic(image, rect, BLOCK_SIZE, 1.0, mode=mode, anchored=True, color_cache=color_cache)
+
+
+@pytest.mark.parametrize("mode", [MODE_SAMPLE, MODE_MEAN])
+def test_cache_hits_and_invalidation_on_edit(mode):
+    """同一图片状态复用已缓存的单元；推进编辑代数后脏区域内的单元重新计算，结果与不使用缓存一致"""
+    image = random_image(48, 40, seed=1)
+    cache = BlockColorCache()
+    cache.bind(image, 0)
+    rect = QRect(0, 0, 48, 40)
+    cells = 8 * 7
+
+    assert pixel_bytes(anchored(image, rect, mode, cache)) == pixel_bytes(anchored(image, rect, mode))
+    assert cache.stats()["misses"] == cells
+    anchored(image, QRect(5, 5, 20, 20), mode, cache)
+    assert cache.stats()["misses"] == cells
+
+    # 脏区域 [0, 13) × [0, 13) 与 3 × 3 个单元相交
+    dirty = QRect(0, 0, 13, 13)
+    edited = apply_mosaic(image, dirty, 4, 1.0, mode=MODE_MEAN)
+    cache.advance(edited, 1, dirty)
+    assert cache.stats()["generation"] == 1
+    assert pixel_bytes(anchored(edited, rect, mode, cache)) == pixel_bytes(anchored(edited, rect, mode))
+    assert cache.stats()["misses"] == cells + 3 * 3
+
+
+def test_replaced_image_invalidates_cache():
+    """缓存未被告知的图片（cacheKey 不同）不会读到旧图片的单元颜色"""
+    image = random_image(48, 40, seed=1)
+    cache = BlockColorCache()
+    cache.bind(image, 0)
+    anchored(image, image.rect(), MODE_MEAN, cache)
+    other = random_image(48, 40, seed=2)
+    assert pixel_bytes(anchored(other, other.rect(), MODE_MEAN, cache)) == \
+        pixel_bytes(anchored(other, other.rect(), MODE_MEAN))
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""整图复制统计测试：打码、撤销、重做都不产生额外的整图复制，显示只重新转换变化区域的瓦片"""
+import time
+
+import pytest
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.features.edit_history import EditHistory
+from src.features.image_mosaic import apply_mosaic
+
+
+@pytest.fixture
+def window(monkeypatch, tmp_path):
+    """显示一张随机图片的主窗口（工作目录切到临时目录，避免写入项目目录）"""
+    monkeypatch.chdir(tmp_path)
+    from src.gui.main_window import MainWindow
+    main_window = MainWindow()
+    main_window.resize(800, 600)
+    main_window.show()
+    main_window.image_viewer.set_image(random_image(600, 400), str(tmp_path / "image.png"))
+    QApplication.processEvents()
+    yield main_window
+    main_window.history.clear()
+    main_window.close()
+
+
+def copies_during(window, action):
+    """执行 action 并处理完界面事件，返回期间各项统计的增量"""
+    before = window.get_copy_stats()
+    action()
+    QApplication.processEvents()
+    after = window.get_copy_stats()
+    return {key: after[key] - before[key] for key in after}
+
+
+def apply_selection(window):
+    """对当前选区打码并等待后台任务完成"""
+    window.handle_apply_mosaic()
+    while window.ui_state_manager.is_busy():
+        QApplication.processEvents()
+        time.sleep(0.001)
+
+
+def test_apply_undo_redo_make_no_image_copies(window):
+    """差异块历史在与界面共享的图像上原地交换像素：打码、撤销、重做都不复制整图"""
+    assert isinstance(window.history, EditHistory)
+    displayed = window.get_copy_stats()["pixmap_conversions"]
+    window.image_viewer.image_label.set_selection(QRect(100, 100, 50, 50), False)
+
+    applied = copies_during(window, lambda: apply_selection(window))
+    undone = copies_during(window, window.handle_undo)
+    redone = copies_during(window, window.handle_redo)
+
+    for stats in (applied, undone, redone):
+        assert stats["history_copies"] == 0
+        # 只有选区所在的瓦片重新转换为 QPixmap，远少于首次显示整个视口
+        assert 0 < stats["pixmap_conversions"] < displayed
+
+
+def test_shared_snapshot_is_counted_as_copy():
+    """基准图像被外部快照共享时，撤销的原地写入会先复制整图，统计能发现这次复制"""
+    image = random_image(32, 32)
+    history = EditHistory()
+    history.add_state(image)
+    edited = apply_mosaic(image, QRect(0, 0, 16, 16), 4, 1.0)
+    history.add_state(edited, QRect(0, 0, 16, 16))
+    expected = pixel_bytes(edited)
+    snapshot = history.get_current_state()
+    history.undo()
+    assert history.stats()["image_copies"] == 1
+    # 快照保持撤销前的内容
+    assert pixel_bytes(snapshot) == expected
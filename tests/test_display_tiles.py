@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""显示瓦片缓存测试：编辑后只丢弃与脏区域相交的瓦片，重新生成的瓦片与新建缓存的结果一致"""
+import pytest
+from PySide6.QtCore import QRect, QPoint
+
+from conftest import random_image, pixel_bytes
+from src.features.display_tiles import DisplayTileCache
+from src.features.image_mosaic import apply_mosaic, MODE_MEAN
+from src.features.image_pyramid import ImagePyramid
+
+ZOOMS = [1.0, 0.5, 2.0, 0.3]
+
+
+def create_cache(image):
+    """为图片创建金字塔与显示瓦片缓存（瓦片边长 64）"""
+    pyramid = ImagePyramid()
+    pyramid.bind(image)
+    tiles = DisplayTileCache(pyramid, tile_size=64)
+    tiles.bind(image)
+    return pyramid, tiles
+
+
+def compose_all(tiles, zoom):
+    """拼合整张图片在 zoom 倍下的显示"""
+    return tiles.compose(zoom, QRect(QPoint(0, 0), tiles.get_display_size(zoom)))
+
+
+def test_dirty_rect_drops_only_intersecting_tiles():
+    """编辑后各缩放比例下与脏区域相交的瓦片被丢弃，其余瓦片保留；重新生成后与新建缓存的显示一致"""
+    image = random_image(300, 200, seed=1)
+    pyramid, tiles = create_cache(image)
+    for zoom in ZOOMS:
+        compose_all(tiles, zoom)
+    before = dict(tiles.tiles)
+
+    dirty = QRect(100, 60, 12, 10)
+    edited = apply_mosaic(image, dirty, 4, 1.0, mode=MODE_MEAN)
+    pyramid.advance(edited, 1, dirty)
+    tiles.advance(edited, 1, dirty)
+
+    for (zoom, column, row), pixmap in before.items():
+        touched = tiles.get_tile_rect(zoom, column, row).intersects(tiles.map_dirty_rect(zoom, dirty))
+        assert tiles.has_tile(zoom, column, row) != touched
+        if not touched:
+            assert tiles.tiles[(zoom, column, row)].cacheKey() == pixmap.cacheKey()
+    assert 0 < len(tiles.tiles) < len(before)
+
+    _fresh_pyramid, fresh = create_cache(edited)
+    for zoom in ZOOMS:
+        assert pixel_bytes(compose_all(tiles, zoom)) == pixel_bytes(compose_all(fresh, zoom))
+
+
+@pytest.mark.parametrize("zoom", ZOOMS)
+def test_tile_range_covers_display(zoom):
+    """瓦片范围恰好覆盖显示区域，最后一列/行的瓦片裁剪到显示尺寸"""
+    _pyramid, tiles = create_cache(random_image(300, 200))
+    size = tiles.get_display_size(zoom)
+    first_column, last_column, first_row, last_row = tiles.get_tile_range(zoom, QRect(QPoint(0, 0), size))
+    assert (first_column, first_row) == (0, 0)
+    corner = tiles.get_tile_rect(zoom, last_column, last_row)
+    assert corner.right() == size.width() - 1 and corner.bottom() == size.height() - 1
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""差异块历史测试：撤销/重做逐步还原每个状态（未压缩、压缩、转存三种存放方式），小图片不写入临时文件"""
+import pytest
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.features.edit_history import EditHistory
+from src.features.image_mosaic import apply_mosaic, MODE_MEAN
+
+RECTS = [QRect(0, 0, 20, 20), QRect(10, 10, 30, 15), QRect(-5, 30, 70, 10), QRect(25, 0, 8, 48)]
+
+
+def build_history(history, fmt=QImage.Format_RGB32):
+    """依次打码并记录到历史中，返回每个状态的像素字节"""
+    image = random_image(48, 48, fmt, seed=1)
+    history.add_state(image)
+    states = [pixel_bytes(image)]
+    for block_size, rect in enumerate(RECTS, start=3):
+        image = apply_mosaic(image, rect, block_size, 1.0, mode=MODE_MEAN)
+        states.append(pixel_bytes(image))
+        history.add_state(image, rect)
+    history.wait_for_compression()
+    return states
+
+
+def assert_round_trip(history, states):
+    """撤销到最初状态、再重做到最新状态，每一步都与记录时一致"""
+    for expected in reversed(states[:-1]):
+        assert pixel_bytes(history.undo()) == expected
+        history.wait_for_compression()
+    assert not history.can_undo()
+    for expected in states[1:]:
+        assert pixel_bytes(history.redo()) == expected
+        history.wait_for_compression()
+    assert not history.can_redo()
+
+
+@pytest.mark.parametrize("fmt", [QImage.Format_RGB32, QImage.Format_Grayscale8, QImage.Format_RGBA64])
+def test_round_trip_in_memory(fmt):
+    """默认配置：较远的差异块压缩在内存中"""
+    history = EditHistory(raw_steps=1)
+    states = build_history(history, fmt)
+    assert history.stats()["compressed"] > 0
+    assert_round_trip(history, states)
+
+
+def test_round_trip_spilled():
+    """内存上限为 0 时，已压缩的差异块转存到临时文件，撤销/重做仍然逐步还原"""
+    history = EditHistory(raw_steps=0, ram_bytes=0)
+    states = build_history(history)
+    assert history.stats()["spilled"] > 0
+    assert_round_trip(history, states)
+    history.clear()
+
+
+def test_small_history_never_spills():
+    """差异块的内存占用远低于转存阈值时不创建临时文件"""
+    history = EditHistory(raw_steps=0)
+    build_history(history)
+    assert history.stats()["spilled"] == 0
+    assert history.scratch is None
+
+
+def test_redo_branch_discarded_after_new_edit():
+    """撤销后再编辑，后续的重做记录被丢弃"""
+    history = EditHistory()
+    states = build_history(history)
+    history.undo()
+    history.undo()
+    image = apply_mosaic(history.get_current_state(), QRect(5, 5, 10, 10), 4, 1.0)
+    history.add_state(image, QRect(5, 5, 10, 10))
+    assert not history.can_redo()
+    assert pixel_bytes(history.undo()) == states[-3]
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+马赛克处理测试：numpy 引擎与逐像素参考实现的结果一致，qt 引擎的误差在文档说明的范围内，选区切分只覆盖并集；
+fill/noise 核只修改选区内的像素，noise 指定种子时可重复，未安装 NumPy 时两者不可用；
+模糊核与逐像素计算的多次盒式模糊一致，按条带并行处理与单线程结果一致；
+网格锚定时块颜色与选区的位置无关
+"""
+import importlib.util
+import sys
+
+import pytest
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.constants.config import MOSAIC_BLUR_PASSES
+from src.features import image_mosaic
+from src.features.image_mosaic import (
+    apply_mosaic, apply_mosaic_batch, coalesce_rects, get_default_engine, available_kernels,
+    ENGINE_NUMPY, ENGINE_PYTHON, ENGINE_QT, MODE_SAMPLE, MODE_MEAN, MODE_BLUR, MODE_FILL, MODE_NOISE, _blur_radii
+)
+from src.features.pixel_formats import channel_array
+
+np = pytest.importorskip("numpy")
+
+FORMATS = [
+    QImage.Format_RGB32,
+    QImage.Format_ARGB32_Premultiplied,
+    QImage.Format_Grayscale8,
+    QImage.Format_Grayscale16,
+    QImage.Format_RGBA64_Premultiplied,
+]
+
+# 完整的块、被选区与图片边界裁剪的块、超出图片左上角的选区
+RECTS = [QRect(3, 2, 30, 20), QRect(20, 15, 40, 40), QRect(-5, -4, 17, 13)]
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+@pytest.mark.parametrize("mode", [MODE_SAMPLE, MODE_MEAN])
+@pytest.mark.parametrize("intensity", [0.5, 1.0])
+def test_numpy_engine_matches_python_reference(fmt, mode, intensity):
+    """numpy 引擎与 python 参考实现逐像素一致"""
+    image = random_image(41, 33, fmt)
+    for rect in RECTS:
+        expected = apply_mosaic(image, rect, 7, intensity, engine=ENGINE_PYTHON, mode=mode)
+        actual = apply_mosaic(image, rect, 7, intensity, engine=ENGINE_NUMPY, mode=mode)
+        assert actual.format() == expected.format()
+        assert pixel_bytes(actual) == pixel_bytes(expected)
+
+
+@pytest.mark.parametrize("mode", [MODE_SAMPLE, MODE_MEAN])
+def test_qt_engine_within_documented_tolerance(mode):
+    """qt 引擎与参考实现每通道最多相差 2"""
+    image = random_image(41, 33)
+    expected = apply_mosaic(image, RECTS[1], 7, 0.5, engine=ENGINE_PYTHON, mode=mode)
+    actual = apply_mosaic(image, RECTS[1], 7, 0.5, engine=ENGINE_QT, mode=mode)
+    difference = np.abs(np.frombuffer(pixel_bytes(actual), np.uint8).astype(int)
+                        - np.frombuffer(pixel_bytes(expected), np.uint8).astype(int))
+    assert difference.max() <= 2
+
+
+def test_default_engine_is_exact():
+    """默认引擎总是与参考实现结果一致的引擎"""
+    assert get_default_engine() in (ENGINE_NUMPY, ENGINE_PYTHON)
+
+
+def test_coalesce_rects_covers_exact_union():
+    """相交的选区切分为互不相交的矩形，只覆盖选区的并集（交叉的两条横竖选区不包含四个角）"""
+    rects = coalesce_rects([QRect(0, 40, 100, 20), QRect(40, 0, 20, 100)])
+    assert sum(rect.width() * rect.height() for rect in rects) == 100 * 20 + 20 * 100 - 20 * 20
+    assert not any(a.intersects(b) for index, a in enumerate(rects) for b in rects[index + 1:])
+    assert not any(rect.contains(0, 0) or rect.contains(99, 99) for rect in rects)
+    # 结果再次切分保持不变，互不相交的输入原样返回
+    assert coalesce_rects(rects) == rects
+    assert coalesce_rects([QRect(0, 0, 10, 10), QRect(0, 0, 10, 10)]) == [QRect(0, 0, 10, 10)]
+
+
+def test_batch_leaves_pixels_outside_selections_untouched():
+    """批量处理交叉的选区时，选区以外的像素保持不变"""
+    image = random_image(100, 100)
+    result = apply_mosaic_batch(image, [QRect(0, 40, 100, 20), QRect(40, 0, 20, 100)], 15, 1.0, mode=MODE_MEAN)
+    for x, y in [(0, 0), (99, 0), (0, 99), (99, 99), (39, 39), (60, 60)]:
+        assert result.pixel(x, y) == image.pixel(x, y)
+
+
+def outside_unchanged(result, image, rect):
+    """选区（裁剪到图片内）以外的像素与原图相同"""
+    before, after = channel_array(image), channel_array(result)
+    outside = np.ones(before.shape[:2], dtype=bool)
+    clipped = rect.intersected(image.rect())
+    outside[clipped.top():clipped.bottom() + 1, clipped.left():clipped.right() + 1] = False
+    return np.array_equal(before[outside], after[outside])
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_fill_writes_constant_color_inside_rect(fmt):
+    """fill 核在选区内写入同一个颜色（不透明黑色），选区以外不变"""
+    image = random_image(41, 33, fmt)
+    for rect in RECTS:
+        result = apply_mosaic(image, rect, 7, 1.0, mode=MODE_FILL)
+        clipped = rect.intersected(image.rect())
+        inside = channel_array(result)[clipped.top():clipped.bottom() + 1, clipped.left():clipped.right() + 1]
+        assert (inside == inside[0, 0]).all()
+        assert result.pixelColor(clipped.topLeft()).rgba() == 0xFF000000
+        assert outside_unchanged(result, image, rect)
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_seeded_noise_is_reproducible(fmt):
+    """noise 核指定种子时每次结果相同（与线程数无关），选区以外不变；不同种子结果不同"""
+    image = random_image(41, 33, fmt)
+    for rect in RECTS:
+        first = apply_mosaic(image, rect, 7, 1.0, mode=MODE_NOISE, seed=42, workers=1)
+        again = apply_mosaic(image, rect, 7, 1.0, mode=MODE_NOISE, seed=42, workers=4, progress=lambda _: None)
+        other = apply_mosaic(image, rect, 7, 1.0, mode=MODE_NOISE, seed=43, workers=1)
+        assert pixel_bytes(first) == pixel_bytes(again)
+        assert pixel_bytes(first) != pixel_bytes(other)
+        assert outside_unchanged(first, image, rect)
+
+
+def test_fill_and_noise_unavailable_without_numpy(monkeypatch):
+    """未安装 NumPy 时 fill/noise 不在可用的核列表中，按名称使用时报告未知模式"""
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    spec = importlib.util.spec_from_file_location("image_mosaic_without_numpy", image_mosaic.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    names = [kernel.name for kernel in module.available_kernels()]
+    assert MODE_FILL not in names and MODE_NOISE not in names
+    assert MODE_SAMPLE in names and MODE_MEAN in names
+    for mode in (MODE_FILL, MODE_NOISE):
+        with pytest.raises(ValueError):
+            module.apply_mosaic(random_image(8, 8), QRect(0, 0, 4, 4), 2, 1.0, mode=mode)
+    # 安装了 NumPy 的当前环境中两者可用
+    assert {MODE_FILL, MODE_NOISE} <= {kernel.name for kernel in available_kernels()}
+
+
+# 贴着图片四边、超出图片范围、比模糊邻域还小的选区
+BLUR_RECTS = [QRect(-3, -2, 12, 10), QRect(30, 20, 20, 20), QRect(10, 0, 15, 33), QRect(18, 12, 3, 2)]
+
+
+def naive_blur(values, radii):
+    """逐位置对截断在图片边界内的窗口求平均（四舍五入），每次先水平、后垂直，作为模糊核的参考"""
+    values = values.astype(np.int64)
+    for radius in radii:
+        for axis in (1, 0):
+            length = values.shape[axis]
+            output = np.empty_like(values)
+            for index in range(length):
+                low, high = max(index - radius, 0), min(index + radius + 1, length)
+                total = np.take(values, range(low, high), axis=axis).sum(axis=axis)
+                count = high - low
+                if axis == 1:
+                    output[:, index] = (total + count // 2) // count
+                else:
+                    output[index] = (total + count // 2) // count
+            values = output
+    return values
+
+
+@pytest.mark.parametrize("fmt", [QImage.Format_RGB32, QImage.Format_ARGB32_Premultiplied, QImage.Format_Grayscale16])
+@pytest.mark.parametrize("block_size", [4, 12])
+@pytest.mark.parametrize("intensity", [0.6, 1.0])
+@pytest.mark.parametrize("numpy_available", [True, False])
+def test_blur_matches_naive_box_blur(monkeypatch, fmt, block_size, intensity, numpy_available):
+    """滑动窗口和的模糊（NumPy 与纯 Python 实现）与逐位置求平均的多次盒式模糊一致，包括贴着图片边界的选区"""
+    if not numpy_available:
+        monkeypatch.setattr(image_mosaic, "np", None)
+    image = random_image(41, 33, fmt)
+    original = channel_array(image)
+    blurred = naive_blur(original, _blur_radii(block_size, MOSAIC_BLUR_PASSES))
+    blended = (original * (1 - intensity) + blurred * intensity).astype(original.dtype)
+    for rect in BLUR_RECTS:
+        result = apply_mosaic(image, rect, block_size, intensity, mode=MODE_BLUR)
+        clipped = rect.intersected(image.rect())
+        rows = slice(clipped.top(), clipped.bottom() + 1)
+        columns = slice(clipped.left(), clipped.right() + 1)
+        assert np.array_equal(channel_array(result)[rows, columns], blended[rows, columns])
+        assert outside_unchanged(result, image, rect)
+
+
+@pytest.mark.parametrize("mode", [MODE_BLUR, MODE_MEAN])
+def test_parallel_stripes_match_single_worker(monkeypatch, mode):
+    """大选区切分为多个条带在线程池中并行处理，结果与 workers=1 逐像素一致"""
+    monkeypatch.setattr(image_mosaic, "MOSAIC_PARALLEL_MIN_PIXELS", 0)
+    image = random_image(64, 90, seed=7)
+    rect = QRect(3, -5, 58, 91)
+    expected = apply_mosaic(image, rect, 9, 0.7, mode=mode, workers=1)
+    # 报告进度时切分为 MOSAIC_PROGRESS_STEPS 个条带
+    actual = apply_mosaic(image, rect, 9, 0.7, mode=mode, workers=4, progress=lambda _: None)
+    assert pixel_bytes(actual) == pixel_bytes(expected)
+
+
+# 与锚定网格错开不同偏移的选区，包括超出图片左边与下边的选区
+ANCHORED_RECTS = [QRect(1, 2, 13, 9), QRect(7, 5, 20, 20), QRect(-3, 30, 60, 15), QRect(0, 0, 6, 6)]
+
+
+@pytest.mark.parametrize("mode", [MODE_SAMPLE, MODE_MEAN])
+@pytest.mark.parametrize("intensity", [0.5, 1.0])
+@pytest.mark.parametrize("numpy_available", [True, False])
+def test_anchored_grid_ignores_selection_offset(monkeypatch, mode, intensity, numpy_available):
+    """网格锚定到图片原点时，任意偏移的选区内每个像素都与整图处理的结果相同，选区以外不变"""
+    if not numpy_available:
+        monkeypatch.setattr(image_mosaic, "np", None)
+    image = random_image(50, 40, seed=3)
+    # channel_array 是图片缓冲区的视图，图片须保持引用
+    whole_image = apply_mosaic(image, image.rect(), 6, intensity, mode=mode, anchored=True)
+    whole = channel_array(whole_image)
+    for rect in ANCHORED_RECTS:
+        result = apply_mosaic(image, rect, 6, intensity, mode=mode, anchored=True)
+        clipped = rect.intersected(image.rect())
+        rows = slice(clipped.top(), clipped.bottom() + 1)
+        columns = slice(clipped.left(), clipped.right() + 1)
+        assert np.array_equal(channel_array(result)[rows, columns], whole[rows, columns])
+        assert outside_unchanged(result, image, rect)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""图像金字塔测试：缓存的级别始终不超过内存上限，超出上限的级别按需生成且与缓存的结果一致"""
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.features.image_mosaic import apply_mosaic
+from src.features.image_pyramid import ImagePyramid
+
+
+def build_levels(pyramid, levels):
+    """依次取用各级别，返回每级的像素字节（各级由最近的已缓存级别生成，取整结果与缓存状态有关）"""
+    return {level: pixel_bytes(pyramid.get_level(level)) for level in levels}
+
+
+def test_cache_never_exceeds_max_bytes():
+    """缓存新级别前先淘汰旧级别，任何时刻都不超出上限"""
+    image = random_image(128, 96)
+    level_one_bytes = 64 * 48 * 4
+    pyramid = ImagePyramid(max_bytes=level_one_bytes)
+    pyramid.bind(image)
+    for level in (2, 3, 1, 2, 1, 3):
+        pyramid.get_level(level)
+        assert pyramid.stats()["bytes"] <= pyramid.max_bytes
+    assert pyramid.stats()["evictions"] > 0
+
+
+def test_over_budget_level_is_rendered_on_demand():
+    """单个级别就超出上限时不缓存，按需生成的结果与有足够内存时缓存的结果一致"""
+    image = random_image(128, 96, seed=5)
+    cached = ImagePyramid(max_bytes=1 << 20)
+    cached.bind(image)
+    limited = ImagePyramid(max_bytes=32 * 24 * 4)
+    limited.bind(image)
+    # 两者的第 1 级都直接由原图生成
+    assert build_levels(limited, (1,)) == build_levels(cached, (1,))
+    stats = limited.stats()
+    assert stats["uncached_builds"] == 1 and stats["levels"] == 0
+    assert stats["bytes"] <= limited.max_bytes
+
+    # 编辑后按需生成的级别同样反映最新的像素
+    rect = QRect(10, 10, 40, 30)
+    edited = apply_mosaic(image, rect, 6, 1.0)
+    cached.advance(edited, 1, rect)
+    limited.advance(edited, 1, rect)
+    assert build_levels(limited, (1,)) == build_levels(cached, (1,))
+    assert limited.stats()["uncached_builds"] == 2
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""图像视口测试：各缩放比例与平移位置下，控件坐标与图片坐标互相转换后指向同一个图片像素"""
+import math
+
+import pytest
+from PySide6.QtCore import QRect, QPoint
+
+from conftest import random_image
+from src.features.display_tiles import DisplayTileCache
+from src.features.image_pyramid import ImagePyramid
+from src.gui.image_viewport import ImageViewport
+
+IMAGE_POINTS = [QPoint(0, 0), QPoint(799, 599), QPoint(123, 456), QPoint(400, 1), QPoint(5, 300)]
+
+
+@pytest.fixture
+def viewport():
+    """显示 800×600 图片、大小为 400×300 的视口（适应窗口时缩放 0.5）"""
+    image = random_image(800, 600)
+    pyramid = ImagePyramid()
+    pyramid.bind(image)
+    tiles = DisplayTileCache(pyramid)
+    tiles.bind(image)
+    widget = ImageViewport()
+    widget.resize(400, 300)
+    widget.set_tile_source(tiles, image.size())
+    yield widget
+    widget.deleteLater()
+
+
+def widget_point(viewport, point):
+    """图片像素中心在控件中的位置"""
+    zoom = viewport.get_zoom()
+    return QPoint(math.floor((point.x() + 0.5) * zoom), math.floor((point.y() + 0.5) * zoom)) + viewport.offset
+
+
+@pytest.mark.parametrize("zoom", [0.5, 1.0, 2.0, 3.7])
+def test_widget_points_map_to_image_pixels(viewport, zoom):
+    """
+    像素中心所在的控件位置映射回的像素，其控件范围包含该位置；放大时即为原来的像素，
+    缩小时一个屏幕像素覆盖多个图片像素，映射到其中距离不超过 1 / zoom 的一个。平移后仍然成立
+    """
+    viewport.set_zoom(zoom)
+    assert viewport.get_zoom() == zoom
+    for pan in (QPoint(0, 0), QPoint(-37, 21)):
+        viewport.pan_by(pan.x(), pan.y())
+        for point in IMAGE_POINTS:
+            position = widget_point(viewport, point)
+            mapped = viewport.get_image_relative_pos(position)
+            assert viewport.map_rect_to_widget(QRect(mapped, mapped)).contains(position)
+            assert viewport.map_rect_to_widget(QRect(point, point)).contains(position)
+            if zoom >= 1:
+                assert mapped == point
+            else:
+                assert abs(mapped.x() - point.x()) < 1 / zoom and abs(mapped.y() - point.y()) < 1 / zoom
+
+
+def test_points_outside_image_are_rejected(viewport):
+    """适应窗口时图片居中，图片以外的控件位置不对应任何像素"""
+    viewport.set_zoom(0.5)
+    display = viewport.get_image_display_rect()
+    assert viewport.get_image_relative_pos(display.topLeft() - QPoint(1, 1)) is None
+    assert viewport.get_image_relative_pos(display.bottomRight() + QPoint(1, 1)) is None
+    assert viewport.get_image_relative_pos(display.center()) is not None
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""积分图缓存测试：重复处理命中已缓存的分块，编辑后只重新计算与脏区域相交的分块，块平均结果始终与不使用缓存一致"""
+import pytest
+from PySide6.QtGui import QImage, QPainter, QColor
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.features.image_mosaic import apply_mosaic, MODE_MEAN
+from src.features.integral_cache import IntegralImageCache
+
+pytest.importorskip("numpy")
+
+
+def mean_mosaic(image, cache=None):
+    """对整张图片做块平均马赛克"""
+    return apply_mosaic(image, image.rect(), 7, 1.0, mode=MODE_MEAN, cache=cache)
+
+
+@pytest.mark.parametrize("fmt", [QImage.Format_RGB32, QImage.Format_RGBA64_Premultiplied])
+def test_hits_and_recompute_after_edit(fmt):
+    """同一图片状态复用已缓存的分块；推进编辑代数后脏区域所在的分块重新计算，平均颜色与不使用缓存一致"""
+    image = random_image(64, 48, fmt, seed=1)
+    cache = IntegralImageCache(tile_size=16)
+    cache.bind(image, 0)
+    tiles = 4 * 3
+
+    assert pixel_bytes(mean_mosaic(image, cache)) == pixel_bytes(mean_mosaic(image))
+    assert cache.stats()["misses"] == tiles
+    mean_mosaic(image, cache)
+    assert cache.stats()["misses"] == tiles
+    assert cache.stats()["hits"] >= tiles
+
+    # 脏区域 [0, 20) × [0, 20) 与 2 × 2 个分块相交
+    dirty = QRect(0, 0, 20, 20)
+    edited = apply_mosaic(image, dirty, 5, 1.0, mode=MODE_MEAN)
+    cache.advance(edited, 1, dirty)
+    assert cache.stats()["tiles"] == tiles - 4
+    assert pixel_bytes(mean_mosaic(edited, cache)) == pixel_bytes(mean_mosaic(edited))
+    assert cache.stats()["misses"] == tiles + 4
+
+
+def test_in_place_edit_without_advance_is_recomputed():
+    """图片被原地修改而缓存未被告知时，cacheKey 变化使缓存整体作废，不会用旧的积分图求平均"""
+    image = random_image(64, 48, seed=2)
+    cache = IntegralImageCache(tile_size=16)
+    cache.bind(image, 0)
+    mean_mosaic(image, cache)
+
+    painter = QPainter(image)
+    painter.fillRect(QRect(10, 10, 30, 20), QColor(255, 0, 0))
+    painter.end()
+    assert pixel_bytes(mean_mosaic(image, cache)) == pixel_bytes(mean_mosaic(image))
+    assert cache.stats()["misses"] == 2 * 4 * 3
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""超大图片测试：打开与保存按预计峰值检查内存预算，分条带保存的结果与整图处理一致"""
+import os
+import tracemalloc
+
+import pytest
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QRect, QSize
+
+from conftest import random_image, pixel_bytes
+from src.constants.config import LARGE_IMAGE_MIN_STRIPE_ROWS
+from src.features.image_loader import load_image, get_decoded_bytes, MemoryBudgetError
+from src.features.image_mosaic import MODE_MEAN, MODE_BLUR, MODE_SAMPLE, get_scratch_bytes
+from src.features.large_image import LargeImageSource, plan_stripes, _PngStripeWriter
+from src.features.operation_history import MosaicOperation
+from src.features.pixel_formats import to_working_format
+
+WIDTH, HEIGHT = 120, 400
+FULL_BYTES = WIDTH * HEIGHT * 4
+
+
+def stripe_budget(mode, rows):
+    """保存为 PNG 时容纳 rows 行条带的预算：PNG 写出的常驻内存，加上每行三份副本与核的临时数据"""
+    return (_PngStripeWriter.get_resident_bytes(QSize(WIDTH, HEIGHT))
+            + (WIDTH * 4 * 3 + get_scratch_bytes(mode, 4) * WIDTH) * rows)
+
+
+@pytest.fixture
+def jpeg_source(tmp_path):
+    """完整解码超出预算、只能以预览图打开的 JPEG 文件"""
+    path = str(tmp_path / "large.jpg")
+    assert random_image(WIDTH, HEIGHT, seed=4).save(path, quality=95)
+    preview = load_image(path, normalize=False, max_bytes=FULL_BYTES // 4)
+    source = LargeImageSource.for_image(path, preview)
+    assert source is not None
+    return source
+
+
+def test_png_over_budget_is_refused(tmp_path):
+    """PNG 只能完整解码：超出预算时拒绝打开，而不是先完整解码再缩小"""
+    path = str(tmp_path / "large.png")
+    random_image(WIDTH, HEIGHT).save(path)
+    with pytest.raises(MemoryBudgetError) as info:
+        load_image(path, max_bytes=FULL_BYTES // 4)
+    assert info.value.required_bytes == get_decoded_bytes(QImage(path).size(), QImage(path).format())
+    assert load_image(path, max_bytes=FULL_BYTES * 2) is not None
+
+
+def test_jpeg_over_budget_opens_as_preview(jpeg_source):
+    """JPEG 按预览尺寸直接解码"""
+    assert jpeg_source.preview_size.width() < WIDTH
+
+
+def test_png_save_matches_whole_image(jpeg_source, tmp_path):
+    """分多个条带保存的 PNG 与在完整原图上应用同样的操作逐像素一致"""
+    # 操作在预览图坐标系中记录（预览图为原图的一半）
+    operations = [
+        MosaicOperation(MODE_MEAN, [QRect(0, 0, 25, 150)], 3, 1.0),
+        MosaicOperation("blur", [QRect(5, 30, 20, 15)], 2, 0.8),
+    ]
+    path = str(tmp_path / "saved.png")
+    # 预算只够容纳少量行，保存时切分为多个条带
+    assert jpeg_source.save(path, operations, max_bytes=stripe_budget(MODE_MEAN, LARGE_IMAGE_MIN_STRIPE_ROWS * 2))
+
+    expected = to_working_format(QImage(jpeg_source.file_path))
+    for operation in operations:
+        expected = jpeg_source.to_full_operation(operation).apply(expected)
+    saved = QImage(path).convertToFormat(expected.format())
+    assert pixel_bytes(saved) == pixel_bytes(expected)
+
+
+def test_anchored_stripes_align_with_grid(jpeg_source, tmp_path):
+    """网格锚定的操作只在各块大小的公倍数行切分，条带内的网格与整图一致，保存结果与整图处理相同"""
+    operations = [
+        MosaicOperation(MODE_MEAN, [QRect(0, 0, 60, 200)], 3, 1.0, anchored=True),
+        MosaicOperation(MODE_SAMPLE, [QRect(5, 10, 40, 150)], 2, 0.6, anchored=True),
+    ]
+    full_operations = [jpeg_source.to_full_operation(operation) for operation in operations]
+    # 原图坐标的块大小为 6 与 4，公倍数 12
+    stripes = plan_stripes(full_operations, HEIGHT, 50)
+    assert len(stripes) > 1
+    assert all(top % 12 == 0 for top, _bottom in stripes)
+
+    path = str(tmp_path / "saved.png")
+    assert jpeg_source.save(path, operations, max_bytes=stripe_budget(MODE_MEAN, LARGE_IMAGE_MIN_STRIPE_ROWS * 2))
+    expected = to_working_format(QImage(jpeg_source.file_path))
+    for operation in full_operations:
+        expected = operation.apply(expected)
+    assert pixel_bytes(QImage(path).convertToFormat(expected.format())) == pixel_bytes(expected)
+
+
+@pytest.mark.parametrize("mode, rects", [
+    # 覆盖整个预览图（原图的一半），块对齐的核可在任意块行之间切分
+    (MODE_MEAN, [QRect(0, 0, WIDTH // 2, HEIGHT // 2)]),
+    # 模糊的邻域内不能切分，两个选区之间留出切分的位置
+    (MODE_BLUR, [QRect(0, 0, WIDTH // 2, 40), QRect(0, 120, WIDTH // 2, 40)]),
+])
+def test_kernel_scratch_counts_against_budget(jpeg_source, tmp_path, mode, rects):
+    """条带行数扣除核的临时数据：保存期间 NumPy 临时数组与压缩缓冲的峰值不超出预算，结果与整图处理一致"""
+    max_bytes = stripe_budget(mode, LARGE_IMAGE_MIN_STRIPE_ROWS * 2)
+    operations = [MosaicOperation(mode, rects, 4, 0.7)]
+    path = str(tmp_path / "saved.png")
+    tracemalloc.start()
+    try:
+        assert jpeg_source.save(path, operations, max_bytes=max_bytes)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= max_bytes
+
+    expected = jpeg_source.to_full_operation(operations[0]).apply(to_working_format(QImage(jpeg_source.file_path)))
+    assert pixel_bytes(QImage(path).convertToFormat(expected.format())) == pixel_bytes(expected)
+
+    # 只够容纳条带副本、不够容纳临时数据的预算被拒绝
+    with pytest.raises(MemoryBudgetError):
+        jpeg_source.save(str(tmp_path / "refused.png"), operations,
+                         max_bytes=max_bytes - get_scratch_bytes(mode, 4) * WIDTH * LARGE_IMAGE_MIN_STRIPE_ROWS * 2)
+
+
+def test_jpeg_save_over_budget_creates_no_file(jpeg_source, tmp_path):
+    """保存为 JPEG 需要完整的结果图：超出预算时在创建文件之前失败"""
+    path = str(tmp_path / "saved.jpg")
+    with pytest.raises(MemoryBudgetError):
+        jpeg_source.save(path, [], max_bytes=FULL_BYTES)
+    assert not os.path.exists(path)
+
+
+def test_reserved_bytes_over_budget_are_refused(jpeg_source):
+    """调用方占用的内存已超出预算时不再按最少行数继续处理"""
+    with pytest.raises(MemoryBudgetError):
+        jpeg_source.render_stripes([], max_bytes=FULL_BYTES, reserved_bytes=FULL_BYTES)
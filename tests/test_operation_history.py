@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""操作记录历史测试：撤销/重做从检查点重放得到与记录时相同的图像，操作按记录的引擎重放"""
+import pytest
+from PySide6.QtCore import QRect
+
+from conftest import random_image, pixel_bytes
+from src.features.image_mosaic import apply_mosaic_batch, ENGINE_QT, MODE_MEAN, MODE_SAMPLE
+from src.features.operation_history import MosaicOperation, OperationHistory
+
+OPERATIONS = [
+    MosaicOperation(MODE_MEAN, [QRect(0, 0, 20, 20), QRect(10, 10, 15, 15)], 5, 1.0),
+    MosaicOperation(MODE_SAMPLE, [QRect(-4, 30, 60, 10)], 3, 0.6, anchored=True),
+    MosaicOperation("blur", [QRect(20, 5, 20, 30)], 6, 0.8),
+    MosaicOperation("noise", [QRect(5, 20, 30, 10)], 4, 1.0, seed=1234),
+    MosaicOperation(MODE_MEAN, [QRect(30, 30, 18, 18)], 7, 0.5),
+]
+
+
+def build_history(history):
+    """依次应用操作并记录到历史中，返回每个状态的像素字节"""
+    image = random_image(48, 48, seed=2)
+    history.add_state(image)
+    states = [pixel_bytes(image)]
+    for operation in OPERATIONS:
+        image = operation.apply(image)
+        states.append(pixel_bytes(image))
+        history.add_operation(operation, image)
+    return states
+
+
+@pytest.mark.parametrize("checkpoint_interval", [1, 2, 10])
+def test_round_trip(checkpoint_interval):
+    """撤销到最初状态、再重做到最新状态，每一步都与记录时一致"""
+    history = OperationHistory(checkpoint_interval=checkpoint_interval)
+    states = build_history(history)
+    for expected in reversed(states[:-1]):
+        assert pixel_bytes(history.undo()) == expected
+    assert not history.can_undo()
+    for expected in states[1:]:
+        assert pixel_bytes(history.redo()) == expected
+    assert not history.can_redo()
+
+
+def test_trimmed_history_keeps_operations():
+    """超出最大记录数时最老的状态被移除，剩余状态仍可重建，保存用的操作列表保持完整"""
+    history = OperationHistory(max_history=3, checkpoint_interval=10)
+    states = build_history(history)
+    assert pixel_bytes(history.undo()) == states[-2]
+    assert pixel_bytes(history.undo()) == states[-3]
+    assert not history.can_undo()
+    assert len(history.get_operations()) == len(OPERATIONS) - 2
+
+
+def test_operation_replays_with_recorded_engine():
+    """操作按记录的引擎重放，序列化后引擎与结果保持不变"""
+    image = random_image(40, 40, seed=3)
+    operation = MosaicOperation(MODE_MEAN, [QRect(3, 3, 30, 25)], 6, 0.7, engine=ENGINE_QT)
+    expected = apply_mosaic_batch(image, operation.rects, 6, 0.7, engine=ENGINE_QT, mode=MODE_MEAN)
+    restored = MosaicOperation.from_dict(operation.to_dict())
+    assert restored.engine == ENGINE_QT
+    assert pixel_bytes(restored.apply(image)) == pixel_bytes(expected)
+    assert restored.scaled(2, 2).engine == ENGINE_QT
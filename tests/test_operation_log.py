@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""操作记录文件测试：操作记录暴露打码区域的位置，只在操作记录模式或显式启用时随图片写出"""
+import json
+
+import pytest
+from PySide6.QtCore import QRect
+
+from conftest import random_image
+import src.gui.main_window as main_window_module
+from src.constants.config import OPERATION_LOG_SUFFIX
+from src.features.image_mosaic import MODE_MEAN
+from src.features.operation_history import MosaicOperation, OperationHistory
+
+
+@pytest.fixture
+def window(monkeypatch, tmp_path):
+    """使用操作记录历史（与超大图片预览相同）并已记录一次操作的主窗口"""
+    monkeypatch.chdir(tmp_path)
+    main_window = main_window_module.MainWindow()
+    image = random_image(40, 30)
+    main_window.history = OperationHistory()
+    main_window.history.add_state(image)
+    operation = MosaicOperation(MODE_MEAN, [QRect(2, 3, 20, 10)], 4, 1.0)
+    main_window.history.add_operation(operation, operation.apply(image))
+    yield main_window
+    main_window.close()
+
+
+def test_patches_mode_keeps_operations_in_memory(window, monkeypatch, tmp_path):
+    """差异块历史模式下即使临时使用了操作记录历史，也不写出操作记录文件"""
+    monkeypatch.setattr(main_window_module, "EDIT_HISTORY_MODE", "patches")
+    monkeypatch.setattr(main_window_module, "OPERATION_LOG_SAVE", False)
+    image_path = str(tmp_path / "saved.png")
+    window.save_operation_log(image_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("mode, opt_in", [("operations", False), ("patches", True)])
+def test_log_written_when_enabled(window, monkeypatch, tmp_path, mode, opt_in):
+    """操作记录模式或启用 OPERATION_LOG_SAVE 时写出操作记录"""
+    monkeypatch.setattr(main_window_module, "EDIT_HISTORY_MODE", mode)
+    monkeypatch.setattr(main_window_module, "OPERATION_LOG_SAVE", opt_in)
+    image_path = str(tmp_path / "saved.png")
+    window.save_operation_log(image_path)
+    with open(image_path + OPERATION_LOG_SUFFIX, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["operations"][0]["rects"] == [[2, 3, 20, 10]]
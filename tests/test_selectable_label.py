@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""框选控件测试：一帧内的多次鼠标移动只更新一次选区，选区取最后一次移动的位置，重绘只覆盖选区边框"""
+import pytest
+from PySide6.QtGui import QPixmap, QMouseEvent
+from PySide6.QtCore import Qt, QEvent, QPoint, QPointF, QRect
+from PySide6.QtTest import QTest
+
+from src.utils.selectable_label import SelectableLabel
+
+FRAME_MS = 30
+
+
+@pytest.fixture
+def label(monkeypatch):
+    """显示 200×100 图片的框选控件，帧间隔固定为 FRAME_MS"""
+    widget = SelectableLabel()
+    pixmap = QPixmap(200, 100)
+    pixmap.fill(Qt.white)
+    widget.setPixmap(pixmap)
+    widget.resize(200, 100)
+    monkeypatch.setattr(widget, "get_frame_interval", lambda: FRAME_MS)
+    yield widget
+    widget.deleteLater()
+
+
+def mouse_event(kind, x, y, button=Qt.LeftButton):
+    """构造控件坐标 (x, y) 处的鼠标事件"""
+    position = QPointF(x, y)
+    buttons = Qt.NoButton if kind == QEvent.MouseButtonRelease else Qt.LeftButton
+    return QMouseEvent(kind, position, position, button if kind != QEvent.MouseMove else Qt.NoButton,
+                       buttons, Qt.NoModifier)
+
+
+def test_moves_within_one_frame_emit_once(label):
+    """第一次移动立即更新；同一帧内随后的多次移动在帧结束时合并为一次 selection_changed，选区取最后一次移动"""
+    changes = []
+    label.selection_changed.connect(changes.append)
+    label.mousePressEvent(mouse_event(QEvent.MouseButtonPress, 10, 10))
+    label.mouseMoveEvent(mouse_event(QEvent.MouseMove, 20, 20))
+    assert changes[-1] == QRect(QPoint(10, 10), QPoint(20, 20))
+    count = len(changes)
+
+    for x, y in [(30, 25), (40, 30), (55, 42), (60, 50)]:
+        label.mouseMoveEvent(mouse_event(QEvent.MouseMove, x, y))
+    assert len(changes) == count
+    for _ in range(20):
+        if not label.move_timer.isActive():
+            break
+        QTest.qWait(FRAME_MS)
+    assert not label.move_timer.isActive()
+    assert len(changes) == count + 1
+    assert changes[-1] == label.get_selection_rect() == QRect(QPoint(10, 10), QPoint(60, 50))
+
+
+def test_release_applies_pending_move(label):
+    """帧结束前释放鼠标时先处理最后一次移动，完成的选区与其一致"""
+    completed = []
+    label.selection_completed.connect(completed.append)
+    label.mousePressEvent(mouse_event(QEvent.MouseButtonPress, 10, 10))
+    label.mouseMoveEvent(mouse_event(QEvent.MouseMove, 20, 20))
+    label.mouseMoveEvent(mouse_event(QEvent.MouseMove, 80, 70))
+    label.mouseReleaseEvent(mouse_event(QEvent.MouseButtonRelease, 80, 70))
+    assert completed == [QRect(QPoint(10, 10), QPoint(80, 70))]
+    assert not label.move_timer.isActive()
+
+
+def test_selection_repaints_only_borders(label, monkeypatch):
+    """更新选区时只重绘新旧选区的边框，选区内部不重绘"""
+    regions = []
+    monkeypatch.setattr(label, "update", lambda *args: regions.append(args[0] if args else None))
+    label.set_selection(QRect(10, 10, 100, 60), True)
+    label.set_selection(QRect(10, 10, 120, 70), True)
+    dirty = regions[-1]
+    assert dirty is not None
+    assert dirty.contains(QPoint(10, 10)) and dirty.contains(QPoint(129, 79)) and dirty.contains(QPoint(109, 30))
+    assert not dirty.contains(QPoint(60, 40))